@@ -2,19 +2,18 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import json
 import os
+import queue
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
 import webbrowser
-import pandas as pd
-import sqlite3
 import xlwings as xw
 import csv
-from datetime import datetime as dt
-current_datetime = dt.now()
 
 try:
     from kiteconnect import KiteConnect
+    from kiteconnect.exceptions import TokenException
 except ImportError:
     print("Please install kiteconnect: pip install kiteconnect")
     exit()
@@ -22,6 +21,18 @@ except ImportError:
 import openpyxl
 import os
 
+from instruments import InstrumentIndex, load_instrument_master
+from market_data import MarketDataHub, TickerStream, TieredQuoteFetcher
+from mcx_calendar import MCXCalendar
+from rate_limit import KiteRateLimiter, RateLimitedKite
+from resilience import Backoff, CircuitBreaker, StaleDataWatchdog
+from scheduler import AdaptiveCadence, AlignedScheduler
+from signal_engine import SignalConfig, SignalState, advance_state, check_entry_exit, check_trigger, smiley_status
+from spread_stats import SpreadStatistics
+from storage import (CREATE_DAILY_PERFORMANCE, CREATE_PREVIOUS_DAY_CLOSES, LATEST_PREVIOUS_CLOSE,
+                     SAVE_DAILY_PERFORMANCE, SAVE_PREVIOUS_CLOSE, PerformanceStore, SignalStateStore,
+                     SpreadHistory, TickJournal)
+
 FILE_NAME = 'MCX_Trading_Platform_Data.xlsx'
 
 def create_initial_file():
@@ -42,31 +53,33 @@ def create_initial_file():
     workbook.save(FILE_NAME)
     print(f"Created and saved {FILE_NAME}\n")
 
-def update_existing_file(value_price):
-    #new_row = [current_datetime.date(), current_datetime.time(), ]; 
- 
+def export_readings_to_file(rows, day):
     """
-    Function to open an existing Excel file (created by another function), 
-    modify a cell, and save the changes.
+    Function to write one day's journaled readings into the "Future Readings" sheet.
+    Existing rows for that date are replaced, so exporting again is safe.
     """
-    print(f"--- Updating file: {FILE_NAME} ---")
+    print(f"--- Exporting {len(rows)} readings for {day} to {FILE_NAME} ---")
     if not os.path.exists(FILE_NAME):
-        print(f"Error: {FILE_NAME} not found. Run create_initial_file() first.")
-        return
+        create_initial_file()
 
     # Load the existing workbook
     workbook = openpyxl.load_workbook(FILE_NAME)
     sheet = workbook['Future Readings'] # Access the specific sheet by name
-    
-    # Add a new row of data (optional)
-    next_row = sheet.max_row + 1
-    sheet.cell(row=next_row, column=1, value=current_datetime.date())
-    sheet.cell(row=next_row, column=2, value=current_datetime.time())
-    sheet.cell(row=next_row, column=3, value=value_price)
-    
+
+    # Keep the header and every other day's rows
+    kept_rows = [row for row in sheet.iter_rows(min_row=2, values_only=True)
+                 if row[0] is not None and str(row[0])[:10] != day.isoformat()]
+    sheet.delete_rows(2, sheet.max_row)
+
+    for row in kept_rows:
+        sheet.append(list(row[:3]))
+    for row in rows:
+        tick_time = datetime.fromtimestamp(float(row['timestamp']))
+        sheet.append([tick_time.date(), tick_time.time(), float(row['price_difference'])])
+
     # Save the workbook (overwrites the old one)
     workbook.save(FILE_NAME)
-    print(f"Updated and saved {FILE_NAME}\n")
+    print(f"Exported and saved {FILE_NAME}\n")
 
 
 class ZerodhaTradingApp:
@@ -75,8 +88,35 @@ class ZerodhaTradingApp:
         self.root.title("MCX Trading Platform - Entry/Exit Signals")
         self.root.geometry("1400x900")
         
+        # Worker threads hand view updates to the Tk thread through this queue;
+        # broker and disk I/O never run on the Tk thread
+        self.ui_queue = queue.Queue()
+        self.ui_pump_interval = 25      # ms between queue drains
+        self.ui_pump_budget = 0.008     # seconds of queued work per drain
+        self.io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="io")
+        self.persist_queue = queue.Queue()
+        
+        # Append-only tick journal; exported to the Excel sheet on demand / end of day
+        self.tick_journal = TickJournal()
+        self.export_lock = threading.Lock()  # one writer of the .xlsx at a time (rollover vs button)
+        self.tick_journal.start()
+        self.journal_day = date.today()
+        self.popup_refresh_future = None
+        
+        # Tk event-loop lag measurement
+        self.ui_lag_budget_ms = 20
+        self.ui_lag_probe_interval = 100  # ms
+        self.ui_lag_max_ms = 0.0
+        self.ui_lag_avg_ms = 0.0
+        self.ui_lag_over_budget = 0
+        self.ui_lag_log_interval = 60.0  # seconds between over-budget log lines
+        self.ui_lag_last_logged = None
+        self.ui_lag_unlogged = 0
+        
         # Initialize variables
         self.kite = None
+        self.kite_limiter = KiteRateLimiter()  # every self.kite call is throttled and counted here
+        self.api_stats_interval = 2000  # ms
         self.is_logged_in = False
         self.api_key = ""
         self.access_token = ""
@@ -86,6 +126,8 @@ class ZerodhaTradingApp:
         self.profit_target = 0
         self.total_pnl = 0
         self.instruments_df = None
+        self.instruments_from_cache = False
+        self.instrument_index = InstrumentIndex(None)
         
         # Live data flags
         self.live_data_running = False
@@ -98,13 +140,86 @@ class ZerodhaTradingApp:
         self.next_month_contract = None
         self.comparison_popup = None
         
+        # Streaming (KiteTicker) data source; polling stays as the fallback
+        self.tick_stream = None
+        self.ticker_root = None  # e.g. "ws://127.0.0.1:9000" for a local fake server
+        self.use_streaming = True
+        self.feed_running = False
+        self.feed_lock = threading.Lock()
+        self.poll_scheduler = AlignedScheduler(interval=2.0)  # polling fires on aligned wall-clock slots
+        self.min_poll_interval = 1.0  # Kite allows one quote/ltp request per second
+        
+        # Adaptive polling: faster near entry/exit thresholds or in a fast market
+        self.adaptive_polling = False
+        self.poll_cadence = AdaptiveCadence(min_interval=self.min_poll_interval)
+        self.signal_thresholds = {}  # commodity -> (entry, exit), refreshed on the Tk thread
+        
+        # Rolling spread statistics for the z-score / percentile signal modes, updated on every tick
+        self.spread_statistics = {}  # (commodity, current, next) -> SpreadStatistics, fresh after a roll
+        self.spread_statistics_session = None  # previous session the statistics are measured against
+        self.latest_spread_stats = {}  # commodity -> SpreadStats of its latest tick
+        self.signal_configs = {}     # commodity (None for the main pair) -> SignalConfig published by the Tk thread
+        self.tick_signals = {}       # commodity (None for the main pair) -> signal type of its latest tick
+        self.signal_mode_labels = {"Rupees (₹)": 'rupees', "Z-Score": 'zscore', "Percentile": 'percentile'}
+        
+        # Hysteresis entry/exit state per commodity (None for the main pair): (contracts, SignalState),
+        # advanced by the feed thread on every tick
+        self.signal_states = {}
+        self.signal_state_lock = threading.RLock()
+        self.signal_state_loads = set()  # (commodity, current, next) whose saved state is being loaded
+        self.signal_gating_labels = {"State Machine": 'hysteresis', "Cooldown": 'cooldown'}
+        
+        # Multi-commodity monitor: commodity -> (current, next) watched on the shared hub
+        self.multi_monitor_running = False
+        self.multi_pairs = {}
+        self.multi_settings = {}
+        self.multi_last_signal_time = {}
+        self.multi_last_signal_text = {}
+        self.multi_entry_exit_popups = {}
+        
         # PREVIOUS DAY CLOSING PRICES storage
         self.previous_day_close_prices = {}
+        self.previous_close_sessions = {}  # contract -> session date of its cached close
+        
+        # Exchange sessions and holidays
+        self.mcx_calendar = MCXCalendar()
+        self.market_closed_sleep = 30  # max seconds per sleep while the market is closed
+        
+        # Previous close source: quote ohlc.close (one request) or historical candles
+        self.prev_close_from_quotes = False
+        self.max_prev_close_jump_pct = 10.0  # reject quote closes this far from the last cached close
         self.month_comparison_prices = {}
         
+        # Shared market data: one quote per tick fanned out to every view
+        # Polling uses kite.ltp per tick and a full quote every few minutes / on signals
+        self.quote_fetcher = TieredQuoteFetcher(self.fetch_ltp, self.fetch_quotes)
+        self.market_hub = MarketDataHub(fetch_quotes=self.quote_fetcher,
+                                        prev_closes=self.previous_day_close_prices)
+        self.month_pair_commodity = None
+        
+        # Feed resilience: jittered retry backoff, circuit breaker, stale-data watchdog
+        self.feed_backoff = Backoff(base=1.0, cap=60.0)
+        self.feed_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+        self.feed_watchdog = StaleDataWatchdog(max_age=10.0)
+        self.watchdog_interval = 1000  # ms
+        self.market_hub.subscribe(self.on_feed_snapshot)
+        
         # Daily performance tracking
         self.daily_performance_db = "daily_performance.db"
         
+        # History panel cache: past days are re-queried only on date change / contract reload
+        self.history_commodity = None
+        self.history_day = None
+        self.history_past_rows = []
+        self.history_today_line = None
+        self.performance_store = PerformanceStore(self.daily_performance_db)
+        self.performance_store.start()
+        self.spread_history = SpreadHistory(self.performance_store)
+        self.signal_state_stores = {
+            'main': SignalStateStore(self.performance_store, 'main'),
+            'multi': SignalStateStore(self.performance_store, 'multi'),
+        }
+        
         # NEW: Triggered popup variables
         self.triggered_popup = None
         self.last_trigger_time = None
@@ -129,6 +244,12 @@ class ZerodhaTradingApp:
         
         # Setup GUI
         self.setup_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_app_close)
+        
+        # Start the UI queue pump, lag probe and persistence worker
+        self.root.after(self.ui_pump_interval, self.process_ui_queue)
+        self.root.after(self.ui_lag_probe_interval, self.probe_event_loop_lag, time.perf_counter())
+        threading.Thread(target=self.persistence_worker, daemon=True).start()
         
         # Auto login if credentials exist
         if hasattr(self, 'api_key') and hasattr(self, 'access_token') and self.api_key and self.access_token:
@@ -174,6 +295,9 @@ class ZerodhaTradingApp:
         # Month Comparison Tab (Updated for Previous Day Close)
         self.setup_month_comparison_tab(notebook)
         
+        # Multi-Commodity Spread Monitor Tab
+        self.setup_multi_commodity_tab(notebook)
+        
         # Log message area
         self.log_frame = ttk.LabelFrame(self.root, text="Log Messages")
         self.log_frame.pack(fill='x', padx=10, pady=5)
@@ -237,6 +361,16 @@ class ZerodhaTradingApp:
         
         ttk.Button(market_frame, text="Test Connection", 
                   command=self.test_connection).pack(pady=10)
+        
+        ttk.Button(market_frame, text="Refresh Instruments", 
+                  command=self.refresh_instruments).pack(pady=5)
+        
+        # Broker API budget and call accounting
+        api_frame = ttk.LabelFrame(market_frame, text="Kite API Calls")
+        api_frame.pack(fill='x', padx=10, pady=5)
+        self.api_stats_label = ttk.Label(api_frame, text="No API calls yet", font=('Courier', 9), justify='left')
+        self.api_stats_label.pack(anchor='w', padx=5, pady=5)
+        self.root.after(self.api_stats_interval, self.update_api_stats_display)
 
     def setup_month_comparison_tab(self, notebook):
         """Setup month comparison tab using PREVIOUS DAY CLOSING prices"""
@@ -290,6 +424,34 @@ class ZerodhaTradingApp:
         ttk.Button(config_frame, text="Load Current & Next Month", 
                   command=self.load_month_contracts).grid(row=1, column=0, columnspan=2, pady=10)
         
+        # Data source selection (streaming with polling fallback)
+        ttk.Label(config_frame, text="Data Source:").grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        self.month_data_source = ttk.Combobox(config_frame, values=["Streaming (WebSocket)", "Polling (REST)"],
+                                              state='readonly')
+        self.month_data_source.grid(row=2, column=1, padx=5, pady=5, sticky='ew')
+        self.month_data_source.set("Streaming (WebSocket)")
+        
+        # Polling period (aligned to wall-clock multiples of the interval)
+        ttk.Label(config_frame, text="Poll Interval (sec):").grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        self.poll_interval_var = tk.StringVar(value="2")
+        poll_interval_entry = ttk.Entry(config_frame, textvariable=self.poll_interval_var, width=10)
+        poll_interval_entry.grid(row=3, column=1, padx=5, pady=5, sticky='w')
+        poll_interval_entry.bind('<Return>', self.apply_poll_interval)
+        poll_interval_entry.bind('<FocusOut>', self.apply_poll_interval)
+        self.adaptive_poll_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(config_frame, text="Adaptive (interval = slowest)", variable=self.adaptive_poll_var,
+                        command=self.apply_poll_interval).grid(row=4, column=0, columnspan=2, padx=5, pady=2, sticky='w')
+        
+        # Data older than this is flagged stale and entry/exit popups are held back
+        ttk.Label(config_frame, text="Stale After (sec):").grid(row=5, column=0, padx=5, pady=5, sticky='w')
+        self.stale_after_var = tk.StringVar(value="10")
+        ttk.Entry(config_frame, textvariable=self.stale_after_var, width=10).grid(row=5, column=1, padx=5, pady=5, sticky='w')
+        
+        # WebSocket root override, e.g. ws://127.0.0.1:9000 for fake_ticker.py (blank = Kite)
+        ttk.Label(config_frame, text="WebSocket Root:").grid(row=6, column=0, padx=5, pady=5, sticky='w')
+        self.ticker_root_var = tk.StringVar(value=os.environ.get('KITE_TICKER_ROOT', ''))
+        ttk.Entry(config_frame, textvariable=self.ticker_root_var, width=24).grid(row=6, column=1, padx=5, pady=5, sticky='ew')
+        
         # PREVIOUS DAY CLOSE settings
         time_frame = ttk.LabelFrame(left_panel, text="Previous Day Close Settings")
         time_frame.pack(fill='x', pady=5)
@@ -304,6 +466,12 @@ class ZerodhaTradingApp:
         ttk.Button(time_frame, text="Set Manually", 
                   command=self.set_manual_previous_close).grid(row=2, column=1, padx=5, pady=5)
         
+        ttk.Label(time_frame, text="Close Source:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        self.prev_close_source = ttk.Combobox(time_frame, values=["Historical Candles", "Quote OHLC (1 request)"],
+                                              state='readonly')
+        self.prev_close_source.grid(row=3, column=1, padx=5, pady=5, sticky='ew')
+        self.prev_close_source.set("Historical Candles")
+        
         # NEW: Entry/Exit Settings Frame
         entry_exit_frame = ttk.LabelFrame(left_panel, text="Entry/Exit Settings")
         entry_exit_frame.pack(fill='x', pady=5)
@@ -329,9 +497,43 @@ class ZerodhaTradingApp:
         self.entry_exit_cooldown_entry.grid(row=2, column=1, padx=5, pady=5)
         ttk.Label(entry_exit_frame, text="minutes").grid(row=2, column=2, padx=5, pady=5)
         
-        # Test Entry/Exit button
+        # Signal mode: fixed rupees, or bands of the spread's own z-score / percentile
+        ttk.Label(entry_exit_frame, text="Signal Mode:").grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        self.signal_mode_combo = ttk.Combobox(entry_exit_frame, values=list(self.signal_mode_labels),
+                                              state='readonly', width=12)
+        self.signal_mode_combo.grid(row=3, column=1, columnspan=2, padx=5, pady=5, sticky='w')
+        self.signal_mode_combo.set("Rupees (₹)")
+        
+        ttk.Label(entry_exit_frame, text="Z-Score Bands:").grid(row=4, column=0, padx=5, pady=5, sticky='w')
+        self.entry_z_var = tk.StringVar(value="-2.0")
+        ttk.Entry(entry_exit_frame, textvariable=self.entry_z_var, width=10).grid(row=4, column=1, padx=5, pady=5)
+        self.exit_z_var = tk.StringVar(value="2.0")
+        ttk.Entry(entry_exit_frame, textvariable=self.exit_z_var, width=10).grid(row=4, column=2, padx=5, pady=5)
+        
+        ttk.Label(entry_exit_frame, text="Percentile Bands:").grid(row=5, column=0, padx=5, pady=5, sticky='w')
+        self.entry_percentile_var = tk.StringVar(value="5")
+        ttk.Entry(entry_exit_frame, textvariable=self.entry_percentile_var, width=10).grid(row=5, column=1, padx=5, pady=5)
+        self.exit_percentile_var = tk.StringVar(value="95")
+        ttk.Entry(entry_exit_frame, textvariable=self.exit_percentile_var, width=10).grid(row=5, column=2, padx=5, pady=5)
+        
+        # Gating: hysteresis state machine (FLAT -> ENTERED -> EXITED) or the wall-clock cooldown
+        ttk.Label(entry_exit_frame, text="Signal Gating:").grid(row=6, column=0, padx=5, pady=5, sticky='w')
+        self.signal_gating_combo = ttk.Combobox(entry_exit_frame, values=list(self.signal_gating_labels),
+                                                state='readonly', width=12)
+        self.signal_gating_combo.grid(row=6, column=1, columnspan=2, padx=5, pady=5, sticky='w')
+        self.signal_gating_combo.set("State Machine")
+        
+        ttk.Label(entry_exit_frame, text="Re-arm Band / Debounce:").grid(row=7, column=0, padx=5, pady=5, sticky='w')
+        self.rearm_band_var = tk.StringVar(value="0.5")
+        ttk.Entry(entry_exit_frame, textvariable=self.rearm_band_var, width=10).grid(row=7, column=1, padx=5, pady=5)
+        self.debounce_var = tk.StringVar(value="3")
+        ttk.Entry(entry_exit_frame, textvariable=self.debounce_var, width=10).grid(row=7, column=2, padx=5, pady=5)
+        
+        # Test Entry/Exit and reset state buttons
         ttk.Button(entry_exit_frame, text="Test Entry/Exit Popup", 
-                  command=self.test_entry_exit_popup).grid(row=3, column=0, columnspan=3, pady=10)
+                  command=self.test_entry_exit_popup).grid(row=8, column=0, columnspan=2, pady=10)
+        ttk.Button(entry_exit_frame, text="Reset State", 
+                  command=self.reset_signal_state).grid(row=8, column=2, pady=10)
         
         # Control buttons
         control_frame = ttk.Frame(left_panel)
@@ -361,6 +563,23 @@ class ZerodhaTradingApp:
         self.history_text.pack(fill='both', expand=True, padx=5, pady=5)
         self.history_text.insert(tk.END, "Load contracts and start monitoring to see history")
         
+        # Configure text colors
+        self.history_text.tag_config("dark_green", foreground="dark green")
+        self.history_text.tag_config("green", foreground="green")
+        self.history_text.tag_config("dark_red", foreground="dark red")
+        self.history_text.tag_config("red", foreground="red")
+        self.history_text.tag_config("orange", foreground="orange")
+        self.history_text.tag_config("gray", foreground="gray")
+        
+        # Tick journal export
+        journal_frame = ttk.LabelFrame(left_panel, text="Tick Journal")
+        journal_frame.pack(fill='x', pady=5)
+        
+        ttk.Button(journal_frame, text="Export Today to Excel", 
+                  command=self.export_tick_journal_in_background).pack(side='left', padx=5, pady=5)
+        self.journal_status_label = ttk.Label(journal_frame, text="Rows journaled: 0", font=('Arial', 9))
+        self.journal_status_label.pack(side='left', padx=5)
+        
         # Entry/Exit Status Frame
         entry_exit_status_frame = ttk.LabelFrame(left_panel, text="Entry/Exit Status")
         entry_exit_status_frame.pack(fill='x', pady=10)
@@ -373,6 +592,14 @@ class ZerodhaTradingApp:
                                           font=('Arial', 9))
         self.last_signal_label.pack(pady=2)
         
+        self.spread_stats_label = ttk.Label(entry_exit_status_frame, text="Spread Stats: --", 
+                                           font=('Consolas', 9), justify='left')
+        self.spread_stats_label.pack(pady=2)
+        
+        self.signal_state_label = ttk.Label(entry_exit_status_frame, text="Signal State: FLAT", 
+                                           font=('Arial', 9))
+        self.signal_state_label.pack(pady=2)
+        
         # Comparison Display Panel
         display_frame = ttk.LabelFrame(right_panel, text="Current vs Next Month Comparison (vs Prev Day Close)")
         display_frame.pack(fill='both', expand=True)
@@ -453,10 +680,91 @@ class ZerodhaTradingApp:
         self.month_status_label = ttk.Label(right_panel, text="Status: Not Monitoring", foreground='red')
         self.month_status_label.pack(pady=2)
         
+        # Tk event-loop lag
+        self.ui_lag_label = ttk.Label(right_panel, text="UI Lag: -- ms", font=('Arial', 9))
+        self.ui_lag_label.pack(pady=2)
+        
+        # Polling cadence and jitter
+        self.cadence_label = ttk.Label(right_panel, text="Poll Cadence: --", font=('Arial', 9))
+        self.cadence_label.pack(pady=2)
+        self.root.after(self.api_stats_interval, self.update_cadence_display)
+        
+        # Data age and broker feed health
+        self.data_health_label = ttk.Label(right_panel, text="Data: not monitoring", font=('Arial', 9))
+        self.data_health_label.pack(pady=2)
+        self.root.after(self.watchdog_interval, self.check_data_staleness)
+        
         # Comparison result label
         self.month_result_label = ttk.Label(right_panel, text="Comparison: --", font=('Arial', 12, 'bold'))
         self.month_result_label.pack(pady=5)
 
+    def setup_multi_commodity_tab(self, notebook):
+        """Setup tab that monitors current/next spreads for several commodities at once"""
+        multi_frame = ttk.Frame(notebook)
+        notebook.add(multi_frame, text="📊 Multi-Commodity Monitor")
+        
+        # Left panel - per-commodity settings
+        left_panel = ttk.Frame(multi_frame)
+        left_panel.pack(side='left', fill='y', padx=10, pady=10)
+        
+        settings_frame = ttk.LabelFrame(left_panel, text="Commodities & Entry/Exit Settings")
+        settings_frame.pack(fill='x', pady=(0, 10))
+        
+        ttk.Label(settings_frame, text="Monitor", font=('Arial', 9, 'bold')).grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        ttk.Label(settings_frame, text="Entry (₹)", font=('Arial', 9, 'bold')).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Exit (₹)", font=('Arial', 9, 'bold')).grid(row=0, column=2, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Cooldown (min)", font=('Arial', 9, 'bold')).grid(row=0, column=3, padx=5, pady=5)
+        
+        commodities = ["GOLD", "SILVER", "CRUDEOIL", "NATURALGAS", "COPPER", "LEAD", "ZINC"]
+        for row, commodity in enumerate(commodities, start=1):
+            settings = {
+                'selected': tk.BooleanVar(value=commodity in ("CRUDEOIL", "NATURALGAS")),
+                'entry': tk.StringVar(value="-2.0"),
+                'exit': tk.StringVar(value="2.0"),
+                'cooldown': tk.StringVar(value="5"),
+            }
+            self.multi_settings[commodity] = settings
+            
+            ttk.Checkbutton(settings_frame, text=commodity, variable=settings['selected']).grid(row=row, column=0, padx=5, pady=2, sticky='w')
+            ttk.Entry(settings_frame, textvariable=settings['entry'], width=8).grid(row=row, column=1, padx=5, pady=2)
+            ttk.Entry(settings_frame, textvariable=settings['exit'], width=8).grid(row=row, column=2, padx=5, pady=2)
+            ttk.Entry(settings_frame, textvariable=settings['cooldown'], width=8).grid(row=row, column=3, padx=5, pady=2)
+        
+        # Control buttons
+        control_frame = ttk.Frame(left_panel)
+        control_frame.pack(fill='x', pady=10)
+        
+        self.start_multi_btn = ttk.Button(control_frame, text="Start Multi Monitor",
+                                          command=self.start_multi_monitor)
+        self.start_multi_btn.pack(side='left', padx=2)
+        
+        self.stop_multi_btn = ttk.Button(control_frame, text="Stop Multi Monitor",
+                                         command=self.stop_multi_monitor, state='disabled')
+        self.stop_multi_btn.pack(side='left', padx=2)
+        
+        self.multi_status_label = ttk.Label(left_panel, text="Status: Not Monitoring", foreground='red')
+        self.multi_status_label.pack(pady=5)
+        
+        ttk.Label(left_panel, text="All selected legs are fetched in one batched quote per tick.",
+                 font=('Arial', 9, 'italic'), wraplength=300).pack(pady=5)
+        
+        # Right panel - live spreads
+        right_panel = ttk.LabelFrame(multi_frame, text="Current vs Next Month Spreads (vs Prev Day Close)")
+        right_panel.pack(side='right', fill='both', expand=True, padx=10, pady=10)
+        
+        columns = ("commodity", "current", "next", "current_price", "next_price",
+                   "current_change", "next_change", "price_diff", "signal", "last_signal")
+        headings = ("Commodity", "Current", "Next", "Current ₹", "Next ₹",
+                    "Curr Chg ₹", "Next Chg ₹", "Price Diff ₹", "Signal", "Last Signal")
+        self.multi_tree = ttk.Treeview(right_panel, columns=columns, show='headings', height=10)
+        for column, heading in zip(columns, headings):
+            self.multi_tree.heading(column, text=heading)
+            self.multi_tree.column(column, width=100, anchor='center')
+        self.multi_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        self.multi_tree.tag_configure('ENTRY', background='#E8F5E9')
+        self.multi_tree.tag_configure('EXIT', background='#FFEBEE')
+
     def test_entry_exit_popup(self):
         """Test the entry/exit popup display"""
         if not hasattr(self, 'current_month_contract') or not hasattr(self, 'next_month_contract'):
@@ -469,58 +777,288 @@ class ZerodhaTradingApp:
         # Test exit popup after 2 seconds
         self.root.after(2000, lambda: self.show_entry_exit_popup(2.5, "EXIT"))
 
-    def check_entry_exit_condition(self, price_difference):
+    def check_entry_exit_condition(self, price_difference, commodity=None, now=None):
         """
-        Check if price difference triggers entry or exit condition
+        Preview whether a price difference would trigger entry or exit (Tk thread)
+        Live ticks are evaluated on the feed thread by evaluate_tick_signals; a preview
+        never advances the state machine or starts a cooldown.
         Returns: (should_trigger, signal_type, price_difference)
         """
-        try:
-            # Update thresholds from GUI
-            self.entry_threshold = float(self.entry_threshold_var.get())
-            self.exit_threshold = float(self.exit_threshold_var.get())
-            self.entry_exit_cooldown = int(self.entry_exit_cooldown_var.get()) * 60  # Convert to seconds
-            
-            # Check cooldown
-            current_time = time.time()
-            if self.last_entry_exit_trigger_time is not None and \
-               (current_time - self.last_entry_exit_trigger_time) < self.entry_exit_cooldown:
-                return False, None, price_difference
-            
-            # Check conditions
-            if price_difference < self.entry_threshold:
-                return True, "ENTRY", price_difference
-            elif price_difference > self.exit_threshold:
-                return True, "EXIT", price_difference
-            
+        # Never signal off stale data
+        if self.feed_watchdog.is_stale():
             return False, None, price_difference
+        
+        now = time.time() if now is None else now
+        config = self.refresh_signal_config(commodity)
+        stats = self.latest_spread_stats.get(commodity or self.month_pair_commodity)
+        
+        # Same rules as the headless signal engine and backtests
+        if config.gating == 'hysteresis':
+            state = self.get_signal_state(commodity) or SignalState()
+            _, signal_type = advance_state(price_difference, config, state, now, stats)
+            return signal_type is not None, signal_type, price_difference
+        return check_entry_exit(price_difference, config, self.last_signal_time(commodity), now, stats)
+
+    def refresh_signal_config(self, commodity=None):
+        """
+        Parse a pair's entry/exit settings (Tk thread) and publish them for the feed thread
+        commodity selects the multi-commodity thresholds and cooldown; the signal
+        mode, its z-score / percentile bands and the gating are shared by all commodities.
+        Returns: SignalConfig
+        """
+        try:
+            if commodity is None:
+                # Update thresholds from GUI
+                config = SignalConfig.parse(entry_threshold=self.entry_threshold_var.get(),
+                                            exit_threshold=self.exit_threshold_var.get(),
+                                            cooldown_minutes=self.entry_exit_cooldown_var.get(),
+                                            **self.get_signal_settings())
+                self.entry_threshold, self.exit_threshold = config.entry_threshold, config.exit_threshold
+                self.entry_exit_cooldown = config.cooldown
+            else:
+                entry_threshold, exit_threshold, cooldown = self.get_multi_thresholds(commodity)
+                config = SignalConfig.parse(**self.get_signal_settings())
+                config = config._replace(entry_threshold=entry_threshold, exit_threshold=exit_threshold,
+                                         cooldown=cooldown)
             
         except ValueError:
-            # If invalid thresholds, use defaults
-            if price_difference < -2.0:
-                return True, "ENTRY", price_difference
-            elif price_difference > 2.0:
-                return True, "EXIT", price_difference
-            return False, None, price_difference
+            # If invalid thresholds, use defaults with no cooldown
+            config = SignalConfig(cooldown=0)
+        
+        self.signal_configs[commodity] = config
+        return config
+
+    def last_signal_time(self, commodity=None):
+        """Start of a pair's entry/exit cooldown (cooldown gating)"""
+        if commodity is None:
+            return self.last_entry_exit_trigger_time
+        return self.multi_last_signal_time.get(commodity)
 
-    def show_entry_exit_popup(self, price_difference, signal_type):
-        """Show entry/exit popup based on price difference"""
+    def evaluate_tick_signals(self, snapshot, tick_stats):
+        """
+        Entry/exit for every monitored pair once per published tick (feed thread)
+        Uses the tick's own statistics, like SignalEngine.on_spread in the daemon, so
+        coalesced UI refreshes never skip a tick of the debounce / re-arm logic. Only
+        the resulting signals go to the Tk thread.
+        """
+        monitored = []
+        if self.month_comparison_running and self.month_pair_commodity:
+            monitored.append((None, self.month_pair_commodity))
+        if self.multi_monitor_running:
+            monitored.extend((commodity, commodity) for commodity in list(self.multi_pairs))
+        
+        for key, commodity in monitored:
+            spread = snapshot.spreads.get(commodity)
+            config = self.signal_configs.get(key)
+            if spread is None or config is None:
+                continue
+            try:
+                stats = tick_stats.get(commodity)
+                self.publish_cadence_thresholds(commodity, config, stats)
+                signal_type = self.advance_tick_signal(key, config, spread, stats)
+                self.tick_signals[key] = signal_type
+                if signal_type is not None:
+                    self.post_to_ui(self.on_entry_exit_signal, spread.price_difference, signal_type, key)
+            except Exception as e:
+                print(f"Error evaluating {commodity} entry/exit: {e}")
+
+    def advance_tick_signal(self, commodity, config, spread, stats):
+        """One tick of a pair's state machine or cooldown check (feed thread); returns the signal type or None"""
+        if config.gating == 'hysteresis':
+            with self.signal_state_lock:
+                state = self.get_signal_state(commodity)
+                if state is None:
+                    # Saved state still loading (normally done when the contracts were loaded)
+                    return None
+                state, signal_type = advance_state(spread.price_difference, config, state, spread.timestamp, stats)
+                self.set_signal_state(commodity, state)
+            return signal_type
+        
+        should_trigger, signal_type, _ = check_entry_exit(spread.price_difference, config,
+                                                          self.last_signal_time(commodity), spread.timestamp, stats)
+        if not should_trigger:
+            return None
+        # Start the cooldown here: ticks before the popup shows must not repeat the signal
+        if commodity is None:
+            self.last_entry_exit_trigger_time = spread.timestamp
+        else:
+            self.multi_last_signal_time[commodity] = spread.timestamp
+        return signal_type
+
+    def publish_cadence_thresholds(self, commodity, config, stats):
+        """
+        Latest thresholds in ₹ for the adaptive poll cadence; z-score bands are mapped back
+        to rupees around the EWMA mean. Percentile bands (and z-score bands while the
+        statistics warm up) have no ₹ level: None polls at the floor
+        """
+        thresholds = None
+        if config.mode == 'rupees':
+            thresholds = (config.entry_threshold, config.exit_threshold)
+        elif config.mode == 'zscore' and stats is not None and stats.std > 0:
+            thresholds = (stats.mean + config.entry_z * stats.std, stats.mean + config.exit_z * stats.std)
+        self.signal_thresholds[commodity] = thresholds
+
+    def on_entry_exit_signal(self, price_difference, signal_type, commodity=None):
+        """Show an entry/exit signal raised on the feed thread (Tk thread)"""
+        if commodity is None:
+            if not self.month_comparison_running:
+                return
+            self.update_signal_state_display()
+        elif not self.multi_monitor_running or commodity not in self.multi_pairs:
+            return
+        self.show_entry_exit_popup(price_difference, signal_type, commodity)
+
+    def get_signal_settings(self):
+        """Signal mode, bands and gating from the Entry/Exit Settings (as text for SignalConfig.parse)"""
+        return {
+            'mode': self.signal_mode_labels.get(self.signal_mode_combo.get(), 'rupees'),
+            'entry_z': self.entry_z_var.get(),
+            'exit_z': self.exit_z_var.get(),
+            'entry_percentile': self.entry_percentile_var.get(),
+            'exit_percentile': self.exit_percentile_var.get(),
+            'gating': self.signal_gating_labels.get(self.signal_gating_combo.get(), 'hysteresis'),
+            'rearm_band': self.rearm_band_var.get(),
+            'debounce': self.debounce_var.get(),
+        }
+
+    def signal_state_key(self, commodity):
+        """(state store, commodity name, current contract, next contract) for a monitored pair"""
+        if commodity is None:
+            return (self.signal_state_stores['main'], self.month_pair_commodity,
+                    getattr(self, 'current_month_contract', None), getattr(self, 'next_month_contract', None))
+        current_contract, next_contract = self.multi_pairs.get(commodity, (None, None))
+        return self.signal_state_stores['multi'], commodity, current_contract, next_contract
+
+    def get_signal_state(self, commodity=None):
+        """
+        Hysteresis state of a pair from memory, or None while its saved state is loading
+        (a load starts in the background the first time, and after a contract roll)
+        """
+        _, _, current_contract, next_contract = self.signal_state_key(commodity)
+        with self.signal_state_lock:
+            contracts, state = self.signal_states.get(commodity, (None, None))
+        if state is not None and contracts == (current_contract, next_contract):
+            return state
+        self.load_signal_state(commodity)
+        return None
+
+    def load_signal_state(self, commodity=None):
+        """Read a pair's saved hysteresis state on the I/O pool, once per contract pair"""
+        store, name, current_contract, next_contract = self.signal_state_key(commodity)
+        pending = (commodity, current_contract, next_contract)
+        with self.signal_state_lock:
+            contracts, state = self.signal_states.get(commodity, (None, None))
+            if pending in self.signal_state_loads or (state is not None and
+                                                      contracts == (current_contract, next_contract)):
+                return
+            self.signal_state_loads.add(pending)
+        
+        def load():
+            state = SignalState()
+            if name and current_contract and next_contract:
+                try:
+                    saved = store.load(name, current_contract, next_contract)
+                    if saved is not None:
+                        saved_state, armed, changed_at = saved
+                        state = SignalState(state=saved_state, armed=armed, changed_at=changed_at)
+                        self.log_message(f"Resuming {name} signal state {saved_state}")
+                except Exception as e:
+                    print(f"Error loading signal state: {e}")
+            with self.signal_state_lock:
+                # A reset while loading wins over the saved state
+                contracts, current = self.signal_states.get(commodity, (None, None))
+                if current is None or contracts != (current_contract, next_contract):
+                    self.signal_states[commodity] = ((current_contract, next_contract), state)
+                self.signal_state_loads.discard(pending)
+        
+        self.run_in_background(load, lambda _: self.update_signal_state_display() if commodity is None else None)
+
+    def set_signal_state(self, commodity, state):
+        """Keep a pair's new hysteresis state, queueing a save when the position or arming changes"""
+        store, name, current_contract, next_contract = self.signal_state_key(commodity)
+        with self.signal_state_lock:
+            contracts, previous = self.signal_states.get(commodity, (None, None))
+            self.signal_states[commodity] = ((current_contract, next_contract), state)
+        if contracts != (current_contract, next_contract):
+            previous = None
+        if not name or (previous is not None and (state.state, state.armed) == (previous.state, previous.armed)):
+            return
+        try:
+            store.save(name, current_contract, next_contract, state.state, state.armed, state.changed_at)
+        except Exception as e:
+            print(f"Error saving signal state: {e}")
+
+    def reset_signal_state(self):
+        """Put the main pair's state machine back to FLAT (e.g. after closing the trade by hand)"""
+        self.set_signal_state(None, SignalState(changed_at=time.time()))
+        self.update_signal_state_display()
+        self.log_message("Entry/exit signal state reset to FLAT")
+
+    def update_signal_state_display(self):
+        """Show the main pair's hysteresis state in the Entry/Exit Status frame"""
+        try:
+            gating = self.signal_gating_labels.get(self.signal_gating_combo.get(), 'hysteresis')
+            if gating != 'hysteresis':
+                self.signal_state_label.config(text="Signal State: cooldown gating", foreground='gray')
+                return
+            
+            state = self.get_signal_state()
+            if state is None:
+                self.signal_state_label.config(text="Signal State: loading...", foreground='gray')
+                return
+            text = f"Signal State: {state.state}"
+            if state.changed_at is not None:
+                text += f" since {datetime.fromtimestamp(state.changed_at).strftime('%H:%M:%S')}"
+            text += "" if state.armed else " (re-arming)"
+            color = {'ENTERED': 'green', 'EXITED': 'red'}.get(state.state, 'black')
+            self.signal_state_label.config(text=text, foreground=color)
+            
+        except Exception as e:
+            print(f"Error updating signal state display: {e}")
+
+    def get_multi_thresholds(self, commodity):
+        """Entry threshold, exit threshold and cooldown (seconds) for one commodity"""
+        settings = self.multi_settings[commodity]
+        return (float(settings['entry'].get()),
+                float(settings['exit'].get()),
+                int(settings['cooldown'].get()) * 60)
+
+    def show_entry_exit_popup(self, price_difference, signal_type, commodity=None):
+        """Show entry/exit popup based on price difference (commodity for multi-commodity signals)"""
+        if commodity is None:
+            entry_threshold, exit_threshold = self.entry_threshold, self.exit_threshold
+            cooldown = self.entry_exit_cooldown
+            current_contract, next_contract = self.current_month_contract, self.next_month_contract
+            existing = self.entry_exit_popup
+        else:
+            try:
+                entry_threshold, exit_threshold, cooldown = self.get_multi_thresholds(commodity)
+            except ValueError:
+                entry_threshold, exit_threshold, cooldown = -2.0, 2.0, 300
+            current_contract, next_contract = self.multi_pairs.get(commodity, ("--", "--"))
+            existing = self.multi_entry_exit_popups.get(commodity)
+        
         # Close existing popup if open
-        if self.entry_exit_popup and self.entry_exit_popup.winfo_exists():
-            self.entry_exit_popup.destroy()
+        if existing and existing.winfo_exists():
+            existing.destroy()
+        
+        # Escalate the next poll to a full quote so depth is fresh
+        self.quote_fetcher.request_full()
         
         # Create new popup window
         window = tk.Toplevel(self.root)
+        title_prefix = f"{commodity} " if commodity else ""
         
         # Set window properties based on signal type
         if signal_type == "ENTRY":
-            window.title("🎯 ENTRY SIGNAL - Consider Buying")
+            window.title(f"🎯 {title_prefix}ENTRY SIGNAL - Consider Buying")
             smiley = "😊"
             message = "ENTRY SIGNAL - Consider BUYING"
             bg_color = '#E8F5E9'  # Light green
             text_color = 'dark green'
             urgency = "🔥 STRONG BUY SIGNAL"
         else:  # EXIT
-            window.title("🚪 EXIT SIGNAL - Consider Selling")
+            window.title(f"🚪 {title_prefix}EXIT SIGNAL - Consider Selling")
             smiley = "😢"
             message = "EXIT SIGNAL - Consider SELLING"
             bg_color = '#FFEBEE'  # Light red
@@ -534,13 +1072,15 @@ class ZerodhaTradingApp:
         window.attributes('-topmost', True)
         window.focus_force()
         
-        # Play system beep (multiple times for urgency)
-        for _ in range(3):
-            window.bell()
-            time.sleep(0.1)
+        # Play system beep (multiple times for urgency) without blocking the event loop
+        for i in range(3):
+            window.after(i * 100, window.bell)
         
         # Store reference
-        self.entry_exit_popup = window
+        if commodity is None:
+            self.entry_exit_popup = window
+        else:
+            self.multi_entry_exit_popups[commodity] = window
         
         # Set urgent color
         window.configure(bg=bg_color)
@@ -591,12 +1131,10 @@ class ZerodhaTradingApp:
         
         # Threshold info
         ttk.Label(details_grid, text="Trigger Threshold:", font=('Arial', 11)).grid(row=1, column=0, sticky='w', pady=5)
-        if signal_type == "ENTRY":
-            threshold_text = f"Less than {self.entry_threshold}"
-            threshold_color = 'red'
-        else:
-            threshold_text = f"More than {self.exit_threshold}"
-            threshold_color = 'green'
+        # The band in the mode that fired (₹, z-score or percentile)
+        config = self.signal_configs.get(commodity) or SignalConfig(entry_threshold, exit_threshold, cooldown)
+        threshold_text = config.describe_band(signal_type)
+        threshold_color = 'red' if signal_type == "ENTRY" else 'green'
         
         threshold_label = ttk.Label(details_grid,
                                    text=threshold_text,
@@ -606,16 +1144,24 @@ class ZerodhaTradingApp:
         
         # Contract names
         ttk.Label(details_grid, text="Current Contract:", font=('Arial', 10)).grid(row=2, column=0, sticky='w', pady=5)
-        ttk.Label(details_grid, text=self.current_month_contract, font=('Arial', 10)).grid(row=2, column=1, sticky='w', pady=5, padx=10)
+        ttk.Label(details_grid, text=current_contract, font=('Arial', 10)).grid(row=2, column=1, sticky='w', pady=5, padx=10)
         
         ttk.Label(details_grid, text="Next Contract:", font=('Arial', 10)).grid(row=3, column=0, sticky='w', pady=5)
-        ttk.Label(details_grid, text=self.next_month_contract, font=('Arial', 10)).grid(row=3, column=1, sticky='w', pady=5, padx=10)
+        ttk.Label(details_grid, text=next_contract, font=('Arial', 10)).grid(row=3, column=1, sticky='w', pady=5, padx=10)
         
         # Time of trigger
         trigger_time = datetime.now().strftime("%H:%M:%S")
         ttk.Label(details_grid, text="Signal Time:", font=('Arial', 9)).grid(row=4, column=0, sticky='w', pady=5)
         ttk.Label(details_grid, text=trigger_time, font=('Arial', 9)).grid(row=4, column=1, sticky='w', pady=5, padx=10)
         
+        # Top of book from the latest full quote, re-rendered as escalated quotes arrive
+        book_labels = {}
+        for row, contract in ((5, current_contract), (6, next_contract)):
+            ttk.Label(details_grid, text=f"{contract} Bid / Ask:", font=('Arial', 9)).grid(row=row, column=0, sticky='w', pady=2)
+            book_labels[contract] = ttk.Label(details_grid, text=self.format_top_of_book(contract), font=('Arial', 9))
+            book_labels[contract].grid(row=row, column=1, sticky='w', pady=2, padx=10)
+        self.watch_popup_depth(window, book_labels)
+        
         # Market interpretation
         interpretation_frame = ttk.Frame(main_frame)
         interpretation_frame.pack(fill='x', pady=10)
@@ -657,26 +1203,32 @@ class ZerodhaTradingApp:
         
         # Acknowledge button
         ttk.Button(button_frame, text="Acknowledge Signal",
-                  command=lambda: self.acknowledge_entry_exit_signal(window, signal_type)).pack(side='right', padx=5)
+                  command=lambda: self.acknowledge_entry_exit_signal(window, signal_type, commodity)).pack(side='right', padx=5)
         
-        # Mute button
-        ttk.Button(button_frame, text=f"Mute for {self.entry_exit_cooldown//60} min",
-                  command=lambda: self.mute_entry_exit_signals(window)).pack(side='right', padx=5)
+        # Mute button (the state machine never repeats a signal, so only the cooldown needs one)
+        if config.gating == 'cooldown':
+            ttk.Button(button_frame, text=f"Mute for {cooldown//60} min",
+                      command=lambda: self.mute_entry_exit_signals(window, commodity)).pack(side='right', padx=5)
         
         # Log this signal
-        self.log_message(f"🚨 {signal_type} SIGNAL: Price difference {price_difference:+.2f} (Threshold: {self.entry_threshold if signal_type == 'ENTRY' else self.exit_threshold})")
-        
-        # Update last trigger time
-        self.last_entry_exit_trigger_time = time.time()
+        self.log_message(f"🚨 {title_prefix}{signal_type} SIGNAL: Price difference {price_difference:+.2f} (Threshold: {threshold_text})")
         
-        # Update status label
-        self.last_signal_label.config(text=f"Last Signal: {signal_type} at {trigger_time}")
-        
-        # Update signal display in main window
-        self.update_signal_display(signal_type, price_difference)
+        if commodity is None:
+            # Update last trigger time
+            self.last_entry_exit_trigger_time = time.time()
+            
+            # Update status label
+            self.last_signal_label.config(text=f"Last Signal: {signal_type} at {trigger_time}")
+            
+            # Update signal display in main window
+            self.update_signal_display(signal_type, price_difference)
+        else:
+            # Independent cooldown per commodity
+            self.multi_last_signal_time[commodity] = time.time()
+            self.multi_last_signal_text[commodity] = f"{signal_type} at {trigger_time}"
         
         # Handle window close
-        window.protocol("WM_DELETE_WINDOW", lambda: self.acknowledge_entry_exit_signal(window, signal_type))
+        window.protocol("WM_DELETE_WINDOW", lambda: self.acknowledge_entry_exit_signal(window, signal_type, commodity))
         
         # Flash the window for attention
         self.flash_window(window, 5)
@@ -699,9 +1251,13 @@ class ZerodhaTradingApp:
         
         flash(times)
 
-    def acknowledge_entry_exit_signal(self, window, signal_type):
+    def acknowledge_entry_exit_signal(self, window, signal_type, commodity=None):
         """Acknowledge and close entry/exit popup"""
         window.destroy()
+        if commodity is not None:
+            self.multi_entry_exit_popups.pop(commodity, None)
+            self.log_message(f"{commodity} {signal_type} signal acknowledged")
+            return
         self.entry_exit_popup = None
         self.entry_exit_status_label.config(text=f"Status: {signal_type} Acknowledged", foreground='orange')
         
@@ -711,8 +1267,16 @@ class ZerodhaTradingApp:
             foreground='green'
         ))
 
-    def mute_entry_exit_signals(self, window):
+    def mute_entry_exit_signals(self, window, commodity=None):
         """Mute entry/exit signals for specified time"""
+        if commodity is not None:
+            # Multi-commodity: restart only this commodity's cooldown
+            self.multi_last_signal_time[commodity] = time.time()
+            window.destroy()
+            self.multi_entry_exit_popups.pop(commodity, None)
+            self.log_message(f"🔕 {commodity} entry/exit signals muted for its cooldown")
+            return
+        
         try:
             minutes = int(self.entry_exit_cooldown_var.get())
             self.entry_exit_cooldown = minutes * 60
@@ -772,34 +1336,34 @@ class ZerodhaTradingApp:
             messagebox.showerror("Error", "Please load contracts first")
             return
         
+        # Use a fresh shared snapshot; otherwise fetch one off the Tk thread
+        latest = self.market_hub.latest
+        spread = None
+        if latest is not None and time.time() - latest.timestamp < 2:
+            spread = latest.spreads.get(self.month_pair_commodity)
+        if spread is not None:
+            self.build_price_difference_popup(spread)
+        else:
+            self.run_in_background(self.get_month_spread, self.build_price_difference_popup,
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to get current prices: {e}"))
+
+    def build_price_difference_popup(self, spread):
+        """Create the price difference popup from a spread snapshot"""
+        if spread is None:
+            messagebox.showerror("Error", "Failed to get current prices for the loaded contracts")
+            return
+        
         # Close existing popup if open
         if self.price_diff_popup and self.price_diff_popup.winfo_exists():
             self.price_diff_popup.destroy()
         
-        # Get current data
-        try:
-            contracts = [self.current_month_contract, self.next_month_contract]
-            instruments = [f"MCX:{contract}" for contract in contracts]
-            quote_data = self.kite.quote(instruments)
-            
-            current_price = quote_data[f"MCX:{self.current_month_contract}"]['last_price']
-            next_price = quote_data[f"MCX:{self.next_month_contract}"]['last_price']
-            
-            # Get PREVIOUS DAY CLOSE prices
-            current_prev = self.previous_day_close_prices.get(self.current_month_contract, current_price)
-            next_prev = self.previous_day_close_prices.get(self.next_month_contract, next_price)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to get current prices: {e}")
-            return
-        
-        # Calculate changes in rupees
-        current_change_rupees = current_price - current_prev
-        next_change_rupees = next_price - next_prev
-        
-        # Calculate price difference using the formula:
-        # change difference in rs = current month (Current Price - Previous Close) - next month (Current Price - Previous Close)
-        price_difference = current_change_rupees - next_change_rupees
+        current_price = spread.current_price
+        next_price = spread.next_price
+        current_prev = spread.current_prev_close
+        next_prev = spread.next_prev_close
+        current_change_rupees = spread.current_change_rupees
+        next_change_rupees = spread.next_change_rupees
+        price_difference = spread.price_difference
         
         # Create new window
         window = tk.Toplevel(self.root)
@@ -920,7 +1484,7 @@ class ZerodhaTradingApp:
         entry_exit_frame = ttk.Frame(result_frame)
         entry_exit_frame.pack(fill='x', pady=10)
         
-        # Determine signal based on thresholds
+        # Determine signal based on thresholds (a preview: this is not a market tick)
         should_trigger, signal_type, _ = self.check_entry_exit_condition(price_difference)
         
         if should_trigger:
@@ -1020,98 +1584,115 @@ class ZerodhaTradingApp:
 
     def start_price_diff_popup_updates(self, window):
         """Start updating price difference popup window"""
-        def update_popup():
+        self.market_hub.subscribe(self.on_price_diff_popup_snapshot)
+        
+        def refresh_popup():
             if not window.winfo_exists():
                 return
             
-            try:
-                # Get current prices
-                contracts = [self.current_month_contract, self.next_month_contract]
-                instruments = [f"MCX:{contract}" for contract in contracts]
-                quote_data = self.kite.quote(instruments)
-                
-                current_price = quote_data[f"MCX:{self.current_month_contract}"]['last_price']
-                next_price = quote_data[f"MCX:{self.next_month_contract}"]['last_price']
-                
-                # Get PREVIOUS DAY CLOSE prices
-                current_prev = self.previous_day_close_prices.get(self.current_month_contract, current_price)
-                next_prev = self.previous_day_close_prices.get(self.next_month_contract, next_price)
-                
-                # Calculate changes in rupees
-                current_change_rupees = current_price - current_prev
-                next_change_rupees = next_price - next_prev
-                
-                # Calculate price difference using the formula:
-                # change difference in rs = current month (Current Price - Previous Close) - next month (Current Price - Previous Close)
-                price_difference = current_change_rupees - next_change_rupees
-                
-                # Update timestamp
-                self.price_diff_timestamp.config(text=f"Last update: {datetime.now().strftime('%H:%M:%S')}")
-                
-                # Update current month change
-                current_color = 'green' if current_change_rupees >= 0 else 'red'
-                self.price_diff_popup_current.config(
-                    text=f"₹{current_change_rupees:+.2f}",
-                    foreground=current_color
-                )
-                
-                # Update next month change
-                next_color = 'green' if next_change_rupees >= 0 else 'red'
-                self.price_diff_popup_next.config(
-                    text=f"₹{next_change_rupees:+.2f}",
-                    foreground=next_color
-                )
-                
-                # Update result
-                result_color = 'green' if price_difference > 0 else 'red' if price_difference < 0 else 'orange'
-                self.price_diff_popup_result.config(
-                    text=f"Price Difference = ₹{price_difference:+.2f}",
-                    foreground=result_color
-                )
-                
-                # Update interpretation
-                interpretation_frame = window.winfo_children()[0].winfo_children()[-2]  # Get interpretation frame
-                interpretation_label = interpretation_frame.winfo_children()[0]
-                
-                if price_difference > 0:
-                    if current_change_rupees > 0 and next_change_rupees < 0:
-                        interpretation = "📈 Current month UP, Next month DOWN - Strong bullish signal for current month"
-                        bg_color = '#E8F5E9'
-                    elif current_change_rupees > 0 and next_change_rupees > 0:
-                        interpretation = "📈 Both months UP, but Current month rising MORE"
-                        bg_color = '#F1F8E9'
-                    else:
-                        interpretation = "📊 Current month performing better than Next month"
-                        bg_color = '#FFF3E0'
-                elif price_difference < 0:
-                    if current_change_rupees < 0 and next_change_rupees > 0:
-                        interpretation = "📉 Current month DOWN, Next month UP - Strong bearish signal for current month"
-                        bg_color = '#FFEBEE'
-                    elif current_change_rupees < 0 and next_change_rupees < 0:
-                        interpretation = "📉 Both months DOWN, but Next month falling LESS"
-                        bg_color = '#FFE5E5'
-                    else:
-                        interpretation = "📊 Next month performing better than Current month"
-                        bg_color = '#FFF3E0'
-                else:
-                    interpretation = "⚖️ Both months showing equal changes"
-                    bg_color = 'light yellow'
-                
-                interpretation_label.config(text=interpretation, foreground=result_color)
-                window.configure(bg=bg_color)
-                
-            except Exception as e:
-                print(f"Error updating price difference popup: {e}")
+            # While monitoring, the monitor loop already refreshes the hub
+            if not self.month_comparison_running:
+                self.refresh_market_hub_in_background()
             
             # Schedule next update
             if window.winfo_exists():
-                window.after(2000, update_popup)
+                window.after(2000, refresh_popup)
         
         # Start updates
-        window.after(1000, update_popup)
+        window.after(1000, refresh_popup)
+
+    def refresh_market_hub_in_background(self):
+        """Refresh the shared snapshot on the I/O pool (at most one request in flight)"""
+        future = self.popup_refresh_future
+        if future is not None and not future.done():
+            return
+        
+        def refresh():
+            try:
+                self.market_hub.refresh(2)
+            except Exception as e:
+                print(f"Error refreshing market data: {e}")
+        
+        self.popup_refresh_future = self.io_executor.submit(refresh)
+
+    def on_price_diff_popup_snapshot(self, snapshot):
+        """Price difference popup subscriber"""
+        spread = snapshot.spreads.get(self.month_pair_commodity)
+        if spread is not None:
+            self.post_to_ui(self.update_price_diff_popup_display, spread, key='price_diff_popup')
+
+    def update_price_diff_popup_display(self, spread):
+        """Update price difference popup from a spread snapshot"""
+        window = self.price_diff_popup
+        if not window or not window.winfo_exists():
+            return
+        
+        try:
+            current_change_rupees = spread.current_change_rupees
+            next_change_rupees = spread.next_change_rupees
+            price_difference = spread.price_difference
+            
+            # Update timestamp
+            self.price_diff_timestamp.config(text=f"Last update: {datetime.now().strftime('%H:%M:%S')}")
+            
+            # Update current month change
+            current_color = 'green' if current_change_rupees >= 0 else 'red'
+            self.price_diff_popup_current.config(
+                text=f"₹{current_change_rupees:+.2f}",
+                foreground=current_color
+            )
+            
+            # Update next month change
+            next_color = 'green' if next_change_rupees >= 0 else 'red'
+            self.price_diff_popup_next.config(
+                text=f"₹{next_change_rupees:+.2f}",
+                foreground=next_color
+            )
+            
+            # Update result
+            result_color = 'green' if price_difference > 0 else 'red' if price_difference < 0 else 'orange'
+            self.price_diff_popup_result.config(
+                text=f"Price Difference = ₹{price_difference:+.2f}",
+                foreground=result_color
+            )
+            
+            # Update interpretation
+            interpretation_frame = window.winfo_children()[0].winfo_children()[-2]  # Get interpretation frame
+            interpretation_label = interpretation_frame.winfo_children()[0]
+            
+            if price_difference > 0:
+                if current_change_rupees > 0 and next_change_rupees < 0:
+                    interpretation = "📈 Current month UP, Next month DOWN - Strong bullish signal for current month"
+                    bg_color = '#E8F5E9'
+                elif current_change_rupees > 0 and next_change_rupees > 0:
+                    interpretation = "📈 Both months UP, but Current month rising MORE"
+                    bg_color = '#F1F8E9'
+                else:
+                    interpretation = "📊 Current month performing better than Next month"
+                    bg_color = '#FFF3E0'
+            elif price_difference < 0:
+                if current_change_rupees < 0 and next_change_rupees > 0:
+                    interpretation = "📉 Current month DOWN, Next month UP - Strong bearish signal for current month"
+                    bg_color = '#FFEBEE'
+                elif current_change_rupees < 0 and next_change_rupees < 0:
+                    interpretation = "📉 Both months DOWN, but Next month falling LESS"
+                    bg_color = '#FFE5E5'
+                else:
+                    interpretation = "📊 Next month performing better than Current month"
+                    bg_color = '#FFF3E0'
+            else:
+                interpretation = "⚖️ Both months showing equal changes"
+                bg_color = 'light yellow'
+            
+            interpretation_label.config(text=interpretation, foreground=result_color)
+            window.configure(bg=bg_color)
+            
+        except Exception as e:
+            print(f"Error updating price difference popup: {e}")
 
     def on_price_diff_popup_close(self, window):
         """Handle price difference popup window close"""
+        self.market_hub.unsubscribe(self.on_price_diff_popup_snapshot)
         window.destroy()
         self.price_diff_popup = None
 
@@ -1122,49 +1703,115 @@ class ZerodhaTradingApp:
             self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
             self.log_text.see(tk.END)
         
-        self.root.after(0, update_log)
+        self.post_to_ui(update_log)
+
+    def post_to_ui(self, func, *args, key=None):
+        """Queue a view update for the Tk thread; keyed updates keep only the latest"""
+        self.ui_queue.put((key, func, args))
+
+    def process_ui_queue(self):
+        """Drain queued view updates on the Tk thread within a small time budget"""
+        deadline = time.perf_counter() + self.ui_pump_budget
+        pending = {}
+        try:
+            while time.perf_counter() < deadline:
+                key, func, args = self.ui_queue.get_nowait()
+                if key is None:
+                    try:
+                        func(*args)
+                    except Exception as e:
+                        print(f"Error applying view update: {e}")
+                else:
+                    # Coalesce: a newer snapshot replaces an older one
+                    pending[key] = (func, args)
+        except queue.Empty:
+            pass
+        
+        for func, args in pending.values():
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"Error applying view update: {e}")
+        
+        self.root.after(self.ui_pump_interval, self.process_ui_queue)
+
+    def run_in_background(self, work, on_done=None, on_error=None):
+        """Run work() on the I/O pool and deliver the result on the Tk thread"""
+        def task():
+            try:
+                result = work()
+            except Exception as e:
+                if on_error:
+                    self.post_to_ui(on_error, e)
+                else:
+                    self.log_message(f"Background task failed: {e}")
+                return
+            if on_done:
+                self.post_to_ui(on_done, result)
+        
+        return self.io_executor.submit(task)
+
+    def probe_event_loop_lag(self, scheduled_at):
+        """Measure how late Tk runs a timer; this is the event-loop lag"""
+        now = time.perf_counter()
+        lag_ms = max(0.0, (now - scheduled_at) * 1000 - self.ui_lag_probe_interval)
+        
+        self.ui_lag_avg_ms = 0.9 * self.ui_lag_avg_ms + 0.1 * lag_ms
+        self.ui_lag_max_ms = max(self.ui_lag_max_ms, lag_ms)
+        if lag_ms > self.ui_lag_budget_ms:
+            self.ui_lag_over_budget += 1
+            self.ui_lag_unlogged += 1
+            # At most one log line per interval, counting the probes it covers
+            if self.month_comparison_running and (self.ui_lag_last_logged is None
+                                                  or now - self.ui_lag_last_logged >= self.ui_lag_log_interval):
+                self.log_message(f"UI event loop lag {lag_ms:.1f} ms exceeds the {self.ui_lag_budget_ms} ms budget "
+                                 f"({self.ui_lag_unlogged} probe(s) over budget since the last report)")
+                self.ui_lag_last_logged = now
+                self.ui_lag_unlogged = 0
+        
+        self.ui_lag_label.config(
+            text=f"UI Lag: {self.ui_lag_avg_ms:.1f} ms avg, {self.ui_lag_max_ms:.1f} ms max, "
+                 f"{self.ui_lag_over_budget} over {self.ui_lag_budget_ms} ms",
+            foreground='green' if lag_ms <= self.ui_lag_budget_ms else 'red'
+        )
+        
+        self.root.after(self.ui_lag_probe_interval, self.probe_event_loop_lag, time.perf_counter())
+
+    def update_api_stats_display(self):
+        """Refresh the per-endpoint call counters, latencies and remaining budget"""
+        try:
+            self.api_stats_label.config(text="\n".join(self.kite_limiter.summary_lines()))
+        except Exception as e:
+            print(f"Error updating API stats: {e}")
+        self.root.after(self.api_stats_interval, self.update_api_stats_display)
 
     def init_daily_performance_db(self):
         """Initialize SQLite database for daily performance tracking"""
         try:
-            conn = sqlite3.connect(self.daily_performance_db)
-            cursor = conn.cursor()
-            
-            # Create table for daily performance
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS daily_performance (
-                    date DATE,
-                    commodity TEXT,
-                    current_month_contract TEXT,
-                    next_month_contract TEXT,
-                    current_month_close REAL,
-                    next_month_close REAL,
-                    current_performance REAL,
-                    next_performance REAL,
-                    relative_performance REAL,
-                    smiley_status TEXT,
-                    total_sum REAL,
-                    PRIMARY KEY (date, commodity)
-                )
-            ''')
-            
-            # Create table for previous day closes
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS previous_day_closes (
-                    date DATE,
-                    contract_symbol TEXT,
-                    close_price REAL,
-                    volume INTEGER,
-                    PRIMARY KEY (date, contract_symbol)
-                )
-            ''')
+            # Daily performance and previous day close tables
+            self.performance_store.execute(CREATE_DAILY_PERFORMANCE)
+            self.performance_store.execute(CREATE_PREVIOUS_DAY_CLOSES, wait=True)
+            
+            # Intraday tick history and 1/5/15-minute bars
+            self.spread_history.create_tables()
+            
+            # Entry/exit hysteresis state, resumed after a restart
+            self.signal_state_stores['main'].create_table()
             
-            conn.commit()
-            conn.close()
             self.log_message("Daily performance database initialized")
         except Exception as e:
             self.log_message(f"Error initializing database: {e}")
 
+    def on_app_close(self):
+        """Commit pending DB writes and flush the tick journal before exiting"""
+        try:
+            self.tick_journal.flush()
+            self.performance_store.close()
+        except Exception as e:
+            print(f"Error closing storage: {e}")
+        self.io_executor.shutdown(wait=False)
+        self.root.destroy()
+
     def generate_login_url(self):
         """Generate login URL for Zerodha"""
         try:
@@ -1173,7 +1820,7 @@ class ZerodhaTradingApp:
                 messagebox.showerror("Error", "Please enter API Key")
                 return
                 
-            self.kite = KiteConnect(api_key=self.api_key)
+            self.kite = RateLimitedKite(KiteConnect(api_key=self.api_key), self.kite_limiter)
             
             login_url = self.kite.login_url()
             webbrowser.open(login_url)
@@ -1192,7 +1839,7 @@ class ZerodhaTradingApp:
                 messagebox.showerror("Error", "Please fill all fields")
                 return
             
-            self.kite = KiteConnect(api_key=self.api_key)
+            self.kite = RateLimitedKite(KiteConnect(api_key=self.api_key), self.kite_limiter)
             data = self.kite.generate_session(request_token, api_secret=api_secret)
             self.access_token = data['access_token']
             self.kite.set_access_token(self.access_token)
@@ -1218,7 +1865,7 @@ class ZerodhaTradingApp:
                 messagebox.showerror("Error", "No saved credentials found")
                 return
             
-            self.kite = KiteConnect(api_key=self.api_key)
+            self.kite = RateLimitedKite(KiteConnect(api_key=self.api_key), self.kite_limiter)
             self.kite.set_access_token(self.access_token)
             
             # Test connection
@@ -1235,23 +1882,30 @@ class ZerodhaTradingApp:
         except Exception as e:
             messagebox.showerror("Error", f"Auto login failed: {e}")
 
-    def load_instruments(self):
-        """Load MCX instruments"""
+    def load_instruments(self, force_refresh=False):
+        """Load MCX instruments (from today's local cache unless a refresh is forced)"""
         try:
             if self.kite and self.is_logged_in:
-                # Get all instruments
-                all_instruments = self.kite.instruments("MCX")
-                self.instruments_df = pd.DataFrame(all_instruments)
-                
-                # Convert expiry to datetime if it's string
-                if 'expiry' in self.instruments_df.columns and self.instruments_df['expiry'].dtype == 'object':
-                    self.instruments_df['expiry'] = pd.to_datetime(self.instruments_df['expiry']).dt.date
+                start = time.perf_counter()
+                self.instruments_df, self.instruments_from_cache = load_instrument_master(
+                    self.kite, "MCX", force_refresh=force_refresh)
+                self.instrument_index = InstrumentIndex(self.instruments_df)
+                elapsed_ms = (time.perf_counter() - start) * 1000
                 
-                self.log_message(f"Loaded {len(self.instruments_df)} MCX instruments")
+                source = "cache" if self.instruments_from_cache else "download"
+                self.log_message(f"Loaded {len(self.instruments_df)} MCX instruments from {source} in {elapsed_ms:.0f} ms")
                 
         except Exception as e:
             self.log_message(f"Error loading instruments: {e}")
 
+    def refresh_instruments(self):
+        """Re-download the instrument master and replace today's cache"""
+        if not self.is_logged_in:
+            messagebox.showinfo("Not Logged In", "Please login first")
+            return
+        
+        self.run_in_background(lambda: self.load_instruments(force_refresh=True))
+
     def get_monthly_contracts(self, base_symbol):
         """Get current and next month contracts"""
         try:
@@ -1260,30 +1914,14 @@ class ZerodhaTradingApp:
                 if self.instruments_df is None:
                     return []
             
-            # Filter instruments for the base symbol (futures)
-            relevant_instruments = self.instruments_df[
-                (self.instruments_df['tradingsymbol'].str.startswith(base_symbol)) &
-                (self.instruments_df['instrument_type'] == 'FUT')
-            ].copy()
+            # Nearest 2 unexpired futures from the expiry-sorted chain of the underlying
+            futures = self.instrument_index.active_futures(base_symbol, datetime.now().date(), count=2)
             
-            if relevant_instruments.empty:
+            if not futures:
                 self.log_message(f"No FUT contracts found for {base_symbol}")
                 return []
             
-            # Sort by expiry
-            relevant_instruments = relevant_instruments.sort_values('expiry')
-            
-            # Get current date
-            current_date = datetime.now().date()
-            
-            # Filter out expired contracts
-            relevant_instruments = relevant_instruments[relevant_instruments['expiry'] >= current_date]
-            
-            # Get nearest 2 contracts (current and next month)
-            if len(relevant_instruments) >= 2:
-                selected_contracts = relevant_instruments.head(2)['tradingsymbol'].tolist()
-            else:
-                selected_contracts = relevant_instruments['tradingsymbol'].tolist()
+            selected_contracts = [info.tradingsymbol for info in futures]
             
             self.log_message(f"Found {len(selected_contracts)} contracts for {base_symbol}")
             return selected_contracts
@@ -1311,6 +1949,14 @@ class ZerodhaTradingApp:
             self.current_month_contract = contracts[0]
             self.next_month_contract = contracts[1]
             
+            # Watch the pair on the shared market data hub
+            if (self.month_pair_commodity and self.month_pair_commodity != commodity and
+                    self.month_pair_commodity not in self.multi_pairs):
+                self.market_hub.remove_pair(self.month_pair_commodity)
+            self.market_hub.set_pair(commodity, self.current_month_contract, self.next_month_contract)
+            self.month_pair_commodity = commodity
+            self.load_signal_state()
+            
             # Clear existing display
             for widget in self.month_comparison_frame.winfo_children():
                 widget.destroy()
@@ -1380,8 +2026,8 @@ class ZerodhaTradingApp:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load contracts: {e}")
 
-    def fetch_previous_day_closes(self):
-        """Fetch previous day closing prices for the contracts"""
+    def fetch_previous_day_closes(self, on_done=None):
+        """Fetch previous day closing prices for the contracts (broker calls run off the Tk thread)"""
         if not self.is_logged_in:
             messagebox.showerror("Error", "Please login first")
             return
@@ -1390,25 +2036,15 @@ class ZerodhaTradingApp:
             messagebox.showerror("Error", "Please load contracts first")
             return
         
-        try:
-            # Get today and previous trading day
-            today = datetime.now().date()
-            
-            # Try to get data for last 5 days to find a trading day
-            for days_back in range(1, 6):
-                check_date = today - timedelta(days=days_back)
-                
-                # Try to fetch historical data for previous day
-                self.fetch_contract_historical_data(self.current_month_contract, check_date)
-                self.fetch_contract_historical_data(self.next_month_contract, check_date)
-                
-                # Check if we got data for both contracts
-                if (self.current_month_contract in self.previous_day_close_prices and 
-                    self.next_month_contract in self.previous_day_close_prices):
-                    break
-            
+        contracts = [self.current_month_contract, self.next_month_contract]
+        self.prev_close_from_quotes = self.prev_close_source.get().startswith("Quote")
+        
+        def fetched(_):
             # Update display
             self.update_prev_close_display()
+            if on_done:
+                on_done()
+                return
             
             current_prev = self.previous_day_close_prices.get(self.current_month_contract, "Not found")
             next_prev = self.previous_day_close_prices.get(self.next_month_contract, "Not found")
@@ -1417,12 +2053,130 @@ class ZerodhaTradingApp:
                               f"Previous day closing prices fetched:\n"
                               f"Current Month: ₹{current_prev if isinstance(current_prev, (int, float)) else current_prev}\n"
                               f"Next Month: ₹{next_prev if isinstance(next_prev, (int, float)) else next_prev}")
-            
-        except Exception as e:
+        
+        self.log_message(f"Fetching previous day closes for {', '.join(contracts)}...")
+        def failed(e):
+            if not self.month_comparison_running:
+                self.start_month_btn.config(state='normal')
             messagebox.showerror("Error", f"Failed to fetch previous day closes: {e}")
+        
+        self.run_in_background(lambda: self.load_previous_closes(contracts), fetched,
+                               on_error=failed)
+
+    def fetch_previous_closes_for_contracts(self, contracts, lookback_days=10):
+        """
+        One ranged daily-candle request per contract ending at the previous MCX
+        session, all issued concurrently.
+        """
+        # Read-through: memory, then the previous_day_closes table, then the broker
+        missing = self.load_cached_previous_closes(contracts)
+        closes = {contract: self.previous_day_close_prices.get(contract) for contract in contracts}
+        if not missing:
+            return closes
+        contracts = missing
+        
+        # The window ends at the calendar's previous session but reaches back lookback_days, so a
+        # wrong or out-of-range holiday file, or a leg that did not trade that day, still finds a close
+        to_date = self.expected_previous_session()
+        from_date = to_date - timedelta(days=lookback_days)
+        
+        # Own short-lived pool: this may itself run on an io_executor worker
+        with ThreadPoolExecutor(max_workers=min(len(contracts), 8), thread_name_prefix="prev-close") as pool:
+            fetched = pool.map(lambda contract: self.fetch_contract_previous_close(contract, from_date, to_date),
+                               contracts)
+            closes.update(zip(contracts, fetched))
+        return closes
+
+    def expected_previous_session(self, today=None):
+        """Date of the last completed session before today (MCX trading calendar)"""
+        return self.mcx_calendar.previous_session(today or date.today())
+
+    def set_previous_close(self, contract_symbol, session_date, close_price):
+        """Store a previous close in memory and persist it to previous_day_closes"""
+        self.previous_day_close_prices[contract_symbol] = close_price
+        self.previous_close_sessions[contract_symbol] = session_date
+        self.save_previous_day_close_to_db(contract_symbol, session_date, close_price)
+
+    def load_cached_previous_closes(self, contracts):
+        """Fill previous closes for the expected session from memory or the DB; returns the misses"""
+        session = self.expected_previous_session()
+        today = date.today()
+        missing = []
+        
+        for contract in contracts:
+            cached_session = self.previous_close_sessions.get(contract)
+            if cached_session is not None and session <= cached_session < today:
+                continue
+            
+            cached = self.read_cached_previous_close(contract, today, since=session)
+            if cached:
+                self.previous_close_sessions[contract], self.previous_day_close_prices[contract] = cached
+            else:
+                missing.append(contract)
+        
+        return missing
 
-    def fetch_contract_historical_data(self, contract_symbol, date_to_check):
-        """Fetch historical data for a specific contract and date"""
+    def read_cached_previous_close(self, contract, before, since=None):
+        """Latest (session_date, close) in previous_day_closes before a date (optionally not older than since)"""
+        try:
+            rows = self.performance_store.query(LATEST_PREVIOUS_CLOSE, (
+                contract, (since or date.min).isoformat(), before.isoformat()
+            ))
+        except Exception as e:
+            self.log_message(f"Error reading cached previous close for {contract}: {e}")
+            return None
+        
+        if not rows:
+            return None
+        session_str, close_price = rows[0]
+        return date.fromisoformat(str(session_str)[:10]), close_price
+
+    def load_previous_closes(self, contracts):
+        """Previous closes for contracts using the selected source (worker thread)"""
+        if self.prev_close_from_quotes:
+            return self.fetch_previous_closes_from_quotes(contracts)
+        return self.fetch_previous_closes_for_contracts(contracts)
+
+    def fetch_previous_closes_from_quotes(self, contracts):
+        """
+        Previous closes from the quote's ohlc.close: one request for every leg.
+        Closes that are missing or far from the last cached close fall back to historical candles.
+        """
+        missing = self.load_cached_previous_closes(contracts)
+        if not missing:
+            return {contract: self.previous_day_close_prices.get(contract) for contract in contracts}
+        
+        session = self.expected_previous_session()
+        quote_data = self.fetch_quotes([f"MCX:{contract}" for contract in missing])
+        
+        fallback = []
+        for contract in missing:
+            quote = quote_data.get(f"MCX:{contract}") or {}
+            close_price = (quote.get('ohlc') or {}).get('close')
+            if not close_price or close_price <= 0:
+                self.log_message(f"No ohlc.close in quote for {contract}, using historical candles")
+                fallback.append(contract)
+                continue
+            
+            # Sanity check against the last close we have on record
+            last_known = self.read_cached_previous_close(contract, session)
+            if last_known:
+                jump = abs(close_price - last_known[1]) / last_known[1] * 100 if last_known[1] else 0
+                if jump > self.max_prev_close_jump_pct:
+                    self.log_message(f"Quote close ₹{close_price} for {contract} is {jump:.1f}% from "
+                                     f"₹{last_known[1]} on {last_known[0]}, using historical candles")
+                    fallback.append(contract)
+                    continue
+            
+            self.set_previous_close(contract, session, close_price)
+        
+        if fallback:
+            self.fetch_previous_closes_for_contracts(fallback)
+        
+        return {contract: self.previous_day_close_prices.get(contract) for contract in contracts}
+
+    def fetch_contract_previous_close(self, contract_symbol, from_date, to_date):
+        """Fetch daily candles for a contract over a date range and keep the last session's close"""
         try:
             # Get instrument token
             instrument_token = self.get_instrument_token(contract_symbol)
@@ -1430,32 +2184,30 @@ class ZerodhaTradingApp:
                 self.log_message(f"Cannot find instrument token for {contract_symbol}")
                 return None
             
-            # Convert date to string format for Zerodha API
-            from_date = date_to_check.strftime("%Y-%m-%d")
-            to_date = date_to_check.strftime("%Y-%m-%d")
-            
-            # Fetch historical data
             historical_data = self.kite.historical_data(
                 instrument_token=instrument_token,
-                from_date=from_date,
-                to_date=to_date,
+                from_date=from_date.strftime("%Y-%m-%d"),
+                to_date=to_date.strftime("%Y-%m-%d"),
                 interval="day",
                 continuous=False
             )
             
-            if historical_data and len(historical_data) > 0:
-                # Get the last day's closing price
-                last_day_data = historical_data[-1]
+            # Last candle dated on or before the end of the window
+            candles = [(candle['date'].date() if isinstance(candle['date'], datetime) else candle['date'], candle)
+                       for candle in historical_data or []]
+            candles = [(session_date, candle) for session_date, candle in candles if session_date <= to_date]
+            if candles:
+                session_date, last_day_data = candles[-1]
                 close_price = last_day_data['close']
+                if session_date != to_date:
+                    self.log_message(f"{contract_symbol}: no candle for {to_date}, using the {session_date} close")
                 
-                # Store in dictionary
-                self.previous_day_close_prices[contract_symbol] = close_price
-                
-                # Also save to database
-                self.save_previous_day_close_to_db(contract_symbol, date_to_check, close_price)
+                # Store in memory and the database
+                self.set_previous_close(contract_symbol, session_date, close_price)
                 
                 return close_price
             
+            self.log_message(f"No daily candles for {contract_symbol} between {from_date} and {to_date}")
             return None
             
         except Exception as e:
@@ -1469,19 +2221,15 @@ class ZerodhaTradingApp:
                 self.load_instruments()
             
             if self.instruments_df is not None:
-                # Search for the contract
-                contract = self.instruments_df[
-                    (self.instruments_df['tradingsymbol'] == tradingsymbol)
-                ]
-                
-                if not contract.empty:
-                    return int(contract.iloc[0]['instrument_token'])
+                token = self.instrument_index.token(tradingsymbol)
+                if token:
+                    return token
             
-            # Fallback: try to fetch fresh data
-            all_instruments = self.kite.instruments("MCX")
-            for inst in all_instruments:
-                if inst['tradingsymbol'] == tradingsymbol:
-                    return int(inst['instrument_token'])
+            # Fallback: a cached dump may predate a new listing; download once and retry
+            if self.instruments_from_cache:
+                self.load_instruments(force_refresh=True)
+                if self.instruments_df is not None and not self.instruments_from_cache:
+                    return self.get_instrument_token(tradingsymbol)
             
             self.log_message(f"Instrument token not found for {tradingsymbol}")
             return None
@@ -1493,17 +2241,7 @@ class ZerodhaTradingApp:
     def save_previous_day_close_to_db(self, contract_symbol, date_obj, close_price):
         """Save previous day close to database"""
         try:
-            conn = sqlite3.connect(self.daily_performance_db)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO previous_day_closes 
-                (date, contract_symbol, close_price)
-                VALUES (?, ?, ?)
-            ''', (date_obj, contract_symbol, close_price))
-            
-            conn.commit()
-            conn.close()
+            self.performance_store.execute(SAVE_PREVIOUS_CLOSE, (date_obj, contract_symbol, close_price))
             
         except Exception as e:
             self.log_message(f"Error saving previous day close to DB: {e}")
@@ -1561,8 +2299,10 @@ class ZerodhaTradingApp:
                 current_price = float(current_price_entry.get())
                 next_price = float(next_price_entry.get())
                 
-                self.previous_day_close_prices[self.current_month_contract] = current_price
-                self.previous_day_close_prices[self.next_month_contract] = next_price
+                # Persist through the same cache as broker-fetched closes
+                session = self.expected_previous_session()
+                self.set_previous_close(self.current_month_contract, session, current_price)
+                self.set_previous_close(self.next_month_contract, session, next_price)
                 
                 self.update_prev_close_display()
                 dialog.destroy()
@@ -1587,14 +2327,39 @@ class ZerodhaTradingApp:
             messagebox.showerror("Error", "Please load contracts first")
             return
         
+        # Warm start from the cache (memory / previous_day_closes table) before asking the broker;
+        # the DB read runs on the I/O pool
+        self.start_month_btn.config(state='disabled')
+        contracts = [self.current_month_contract, self.next_month_contract]
+        
+        def failed(e):
+            self.start_month_btn.config(state='normal')
+            messagebox.showerror("Error", f"Failed to read cached previous day closes: {e}")
+        
+        self.run_in_background(lambda: self.load_cached_previous_closes(contracts),
+                               self.continue_month_comparison, on_error=failed)
+
+    def continue_month_comparison(self, missing):
+        """Start monitoring once the cached closes are loaded, fetching or asking for any still missing"""
+        self.start_month_btn.config(state='normal')
+        self.update_prev_close_display()
+        
+        # Quote mode needs no confirmation: one quote request fills the closes
+        if missing and self.prev_close_source.get().startswith("Quote"):
+            self.start_month_btn.config(state='disabled')
+            self.fetch_previous_day_closes(on_done=self.begin_month_comparison)
+            return
+        
         # Check if we have previous day closes
-        if (self.current_month_contract not in self.previous_day_close_prices or 
-            self.next_month_contract not in self.previous_day_close_prices):
+        if missing:
             
             response = messagebox.askyesno("Previous Day Close Missing", 
                                          "Previous day closing prices not set. Would you like to fetch them now?")
             if response:
-                self.fetch_previous_day_closes()
+                # Monitoring starts once the closes arrive
+                self.start_month_btn.config(state='disabled')
+                self.fetch_previous_day_closes(on_done=self.begin_month_comparison)
+                return
             else:
                 response2 = messagebox.askyesno("Set Manual", 
                                               "Would you like to set them manually?")
@@ -1603,113 +2368,615 @@ class ZerodhaTradingApp:
                 else:
                     return
         
+        self.begin_month_comparison()
+
+    def begin_month_comparison(self):
+        """Subscribe the main tab to the hub and start the shared feed"""
         self.month_comparison_running = True
         self.start_month_btn.config(state='disabled')
         self.stop_month_btn.config(state='normal')
         self.month_status_label.config(text="Status: Monitoring", foreground='green')
         self.trigger_status_label.config(text="Trigger Status: Ready", foreground='green')
         
-        # Start monitoring thread
-        threading.Thread(target=self.monitor_month_comparison, daemon=True).start()
+        # Settings for the feed thread's per-tick entry/exit before the first tick
+        self.refresh_signal_config()
+        
+        # Main tab and persistence consume every published snapshot
+        self.market_hub.subscribe(self.on_month_snapshot)
+        self.market_hub.subscribe(self.on_month_snapshot_persist)
+        
+        # Start (or join) the shared market data feed
+        self.start_market_feed()
         
         self.log_message(f"Started month comparison monitoring (vs Previous Day Close)")
 
     def stop_month_comparison(self):
         """Stop month comparison monitoring"""
         self.month_comparison_running = False
+        self.market_hub.unsubscribe(self.on_month_snapshot)
+        self.market_hub.unsubscribe(self.on_month_snapshot_persist)
+        self.stop_market_feed_if_idle()
+        
+        # End of session: write the day's journal into the Excel sheet
+        self.export_tick_journal_in_background()
         self.start_month_btn.config(state='normal')
         self.stop_month_btn.config(state='disabled')
         self.month_status_label.config(text="Status: Stopped", foreground='red')
         
         self.log_message("Stopped month comparison monitoring")
 
-    def monitor_month_comparison(self):
-        """Monitor and compare current vs next month contracts vs PREVIOUS DAY CLOSE"""
-        update_interval = 2  # seconds
+    def start_multi_monitor(self):
+        """Start monitoring current/next spreads for every selected commodity"""
+        if not self.is_logged_in:
+            messagebox.showerror("Error", "Please login first")
+            return
         
-        while self.month_comparison_running and self.is_logged_in:
+        commodities = [c for c, settings in self.multi_settings.items() if settings['selected'].get()]
+        if not commodities:
+            messagebox.showerror("Error", "Please select at least one commodity")
+            return
+        
+        try:
+            for commodity in commodities:
+                self.get_multi_thresholds(commodity)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid thresholds and cooldown minutes")
+            return
+        
+        self.start_multi_btn.config(state='disabled')
+        self.multi_status_label.config(text="Status: Loading contracts...", foreground='orange')
+        self.prev_close_from_quotes = self.prev_close_source.get().startswith("Quote")
+        
+        # Contract lookup and previous closes need the broker; keep them off the Tk thread
+        self.run_in_background(lambda: self.load_multi_pairs(commodities), self.begin_multi_monitor,
+                               on_error=self.on_multi_monitor_error)
+
+    def load_multi_pairs(self, commodities):
+        """Resolve current/next contracts and previous closes for each commodity (worker thread)"""
+        pairs = {}
+        for commodity in commodities:
+            contracts = self.get_monthly_contracts(commodity)
+            if len(contracts) < 2:
+                self.log_message(f"Skipping {commodity}: need at least 2 contracts")
+                continue
+            pairs[commodity] = (contracts[0], contracts[1])
+        
+        # Previous closes for every leg: the session-checked cache first, the broker for the misses
+        legs = [contract for pair in pairs.values() for contract in pair]
+        if legs:
+            self.load_previous_closes(legs)
+        
+        return pairs
+
+    def begin_multi_monitor(self, pairs):
+        """Register the loaded pairs on the shared hub and start the feed"""
+        if not pairs:
+            self.start_multi_btn.config(state='normal')
+            self.multi_status_label.config(text="Status: No contracts found", foreground='red')
+            return
+        
+        self.multi_pairs = pairs
+        for commodity, (current_contract, next_contract) in pairs.items():
+            self.refresh_signal_config(commodity)
+            self.load_signal_state(commodity)
+            self.market_hub.set_pair(commodity, current_contract, next_contract)
+        
+        # Fresh tree rows
+        for item in self.multi_tree.get_children():
+            self.multi_tree.delete(item)
+        for commodity, (current_contract, next_contract) in pairs.items():
+            self.multi_tree.insert('', 'end', iid=commodity,
+                                   values=(commodity, current_contract, next_contract) + ("--",) * 7)
+        
+        self.multi_monitor_running = True
+        self.stop_multi_btn.config(state='normal')
+        self.multi_status_label.config(text=f"Status: Monitoring {len(pairs)} commodities", foreground='green')
+        
+        self.market_hub.subscribe(self.on_multi_snapshot)
+        self.market_hub.subscribe(self.on_multi_snapshot_persist)
+        if not self.start_market_feed():
+            # Feed already running for the main tab; streaming needs the new legs
+            self.restart_tick_stream()
+        
+        self.log_message(f"Started multi-commodity monitoring: {', '.join(pairs)}")
+
+    def on_multi_monitor_error(self, error):
+        """Report a failed multi-commodity start"""
+        self.start_multi_btn.config(state='normal')
+        self.multi_status_label.config(text="Status: Error", foreground='red')
+        messagebox.showerror("Error", f"Failed to start multi-commodity monitor: {error}")
+
+    def stop_multi_monitor(self):
+        """Stop multi-commodity monitoring"""
+        self.multi_monitor_running = False
+        self.market_hub.unsubscribe(self.on_multi_snapshot)
+        self.market_hub.unsubscribe(self.on_multi_snapshot_persist)
+        
+        # Keep the main tab's pair on the hub
+        for commodity in self.multi_pairs:
+            if commodity != self.month_pair_commodity:
+                self.market_hub.remove_pair(commodity)
+        self.multi_pairs = {}
+        
+        self.stop_market_feed_if_idle()
+        if self.market_feed_active():
+            self.restart_tick_stream()
+        
+        self.start_multi_btn.config(state='normal')
+        self.stop_multi_btn.config(state='disabled')
+        self.multi_status_label.config(text="Status: Stopped", foreground='red')
+        self.log_message("Stopped multi-commodity monitoring")
+
+    def on_multi_snapshot(self, snapshot):
+        """Multi-commodity tab subscriber"""
+        self.post_to_ui(self.update_multi_display, snapshot, key='multi_display')
+
+    def on_multi_snapshot_persist(self, snapshot):
+        """Persist daily performance for each monitored commodity"""
+        for commodity in self.multi_pairs:
+            # The main tab already persists its own pair
+            if commodity == self.month_pair_commodity and self.month_comparison_running:
+                continue
+            spread = snapshot.spreads.get(commodity)
+            if spread is not None:
+                self.persist_queue.put((spread, False, None))
+
+    def update_multi_display(self, snapshot):
+        """Update the multi-commodity table with each commodity's latest spread and signal (Tk thread)"""
+        if not self.multi_monitor_running:
+            return
+        
+        for commodity in self.multi_pairs:
+            spread = snapshot.spreads.get(commodity)
+            if spread is None or not self.multi_tree.exists(commodity):
+                continue
+            
             try:
-                contracts = [self.current_month_contract, self.next_month_contract]
-                instruments = [f"MCX:{contract}" for contract in contracts]
-                
-                quote_data = self.kite.quote(instruments)
-                
-                current_prices = {}
-                for contract in contracts:
-                    price = quote_data[f"MCX:{contract}"]['last_price']
-                    current_prices[contract] = price
-                
-                # Update GUI with current prices and comparisons vs PREVIOUS DAY CLOSE
-                self.update_month_comparison_display(current_prices)
-                
-                # Update popup window if it exists
-                if self.comparison_popup and self.comparison_popup.winfo_exists():
-                    self.update_comparison_popup_display(
-                        self.comparison_popup,
-                        current_prices[self.current_month_contract],
-                        current_prices[self.next_month_contract],
-                        self.previous_day_close_prices.get(self.current_month_contract, 0),
-                        self.previous_day_close_prices.get(self.next_month_contract, 0)
-                    )
-                
-                # Update price difference popup if it exists
-                if self.price_diff_popup and self.price_diff_popup.winfo_exists():
-                    # Trigger update through the main thread
-                    self.root.after(0, lambda: self.update_price_diff_display())
-                
-                time.sleep(update_interval)
+                # Entry/exit runs per tick on the feed thread; publish the current settings for it
+                self.refresh_signal_config(commodity)
+                signal_type = self.tick_signals.get(commodity)
+                
+                self.multi_tree.item(commodity, values=(
+                    commodity, spread.current_contract, spread.next_contract,
+                    f"{spread.current_price:.2f}", f"{spread.next_price:.2f}",
+                    f"{spread.current_change_rupees:+.2f}", f"{spread.next_change_rupees:+.2f}",
+                    f"{spread.price_difference:+.2f}", signal_type or "--",
+                    self.multi_last_signal_text.get(commodity, "--")
+                ), tags=(signal_type,) if signal_type else ())
                 
             except Exception as e:
-                self.log_message(f"Error in month comparison monitoring: {e}")
-                time.sleep(5)
+                print(f"Error updating {commodity} spread: {e}")
 
-    def update_price_diff_display(self):
-        """Update price difference display in the main window"""
-        try:
-            if not hasattr(self, 'current_month_contract') or not hasattr(self, 'next_month_contract'):
+    def market_feed_active(self):
+        """True while any monitor (single pair or multi-commodity) needs prices"""
+        return self.is_logged_in and (self.month_comparison_running or self.multi_monitor_running)
+
+    def start_market_feed(self):
+        """Start the shared feed for every pair on the hub unless it is already running"""
+        # Read the Tk selection here; the feed threads must not touch widgets
+        self.use_streaming = self.month_data_source.get().startswith("Streaming")
+        self.ticker_root = self.ticker_root_var.get().strip() or None
+        self.apply_poll_interval()
+        
+        with self.feed_lock:
+            if self.feed_running:
+                return False
+            self.feed_running = True
+        
+        threading.Thread(target=self.monitor_month_comparison, daemon=True).start()
+        return True
+
+    def stop_market_feed_if_idle(self):
+        """Stop the shared feed once no monitor needs it (the poll loop exits by itself)"""
+        if self.market_feed_active():
+            return
+        self.poll_scheduler.wake()
+        if self.tick_stream is not None:
+            self.stop_tick_stream()
+            with self.feed_lock:
+                self.feed_running = False
+
+    def monitor_month_comparison(self):
+        """Run the shared feed: KiteTicker streaming, or polling as the fallback"""
+        if not self.wait_for_market_open():
+            with self.feed_lock:
+                self.feed_running = False
+            return
+        
+        if self.use_streaming:
+            if self.start_tick_stream():
+                # Ticks now drive updates from the ticker thread
                 return
-            
-            # Get current prices
-            contracts = [self.current_month_contract, self.next_month_contract]
-            instruments = [f"MCX:{contract}" for contract in contracts]
-            quote_data = self.kite.quote(instruments)
-            
-            current_price = quote_data[f"MCX:{self.current_month_contract}"]['last_price']
-            next_price = quote_data[f"MCX:{self.next_month_contract}"]['last_price']
-            
-            # Get PREVIOUS DAY CLOSE prices
-            current_prev = self.previous_day_close_prices.get(self.current_month_contract, current_price)
-            next_prev = self.previous_day_close_prices.get(self.next_month_contract, next_price)
-            
-            # Calculate changes in rupees
-            current_change_rupees = current_price - current_prev
-            next_change_rupees = next_price - next_prev
-            
-            # Calculate price difference using the formula:
-            # change difference in rs = current month (Current Price - Previous Close) - next month (Current Price - Previous Close)
-            price_difference = current_change_rupees - next_change_rupees
-            
-            print("price_difference: ", price_difference)
-            
-            # # Extract the date part as a date object
-            # current_date = current_datetime.date()
+            self.log_message("Streaming unavailable, falling back to polling")
+        
+        self.poll_month_comparison()
 
-            # # Extract the time part as a time object
-            # current_time = current_datetime.time()
+    def poll_month_comparison(self):
+        """Poll one batched kite.ltp (full quote at a lower cadence) for every watched leg (fallback data source)"""
+        scheduler = self.poll_scheduler
+        
+        try:
+            while self.market_feed_active():
+                try:
+                    # Sleep through closed hours instead of polling 24/7
+                    if not self.mcx_calendar.is_market_open():
+                        self.wait_for_market_open()
+                        continue
+                    
+                    # Degraded: breaker is open, wait for the next trial call
+                    if not self.feed_breaker.allow():
+                        time.sleep(min(1.0, self.feed_breaker.seconds_until_retry()))
+                        continue
+                    
+                    # Fire on the next aligned slot (missed slots are skipped, not queued)
+                    slot = scheduler.wait_next()
+                    if slot is None:
+                        continue
+                    
+                    # One request for every watched leg, stamped with its slot time
+                    snapshot = self.market_hub.poll(timestamp=slot)
+                    scheduler.finish(slot)
+                    
+                    recovered = self.feed_breaker.record_success()
+                    self.feed_backoff.reset()
+                    if recovered is not None:
+                        self.log_message(f"Broker feed recovered after {recovered:.1f} s")
+                    
+                    if self.adaptive_polling and snapshot is not None:
+                        self.adapt_poll_interval(snapshot)
+                    
+                except Exception as e:
+                    self.handle_feed_error(e)
+        finally:
+            with self.feed_lock:
+                self.feed_running = False
+            
+            # A monitor may have been started while this loop was exiting
+            if self.market_feed_active() and self.tick_stream is None:
+                self.start_feed_thread()
+
+    def handle_feed_error(self, error):
+        """Back off after a failed poll; trip the breaker and re-check the session when needed (feed thread)"""
+        tripped = self.feed_breaker.record_failure()
+        delay = self.feed_backoff.next_delay()
+        self.log_message(f"Error in month comparison monitoring: {error} (retry in {delay:.1f} s)")
+        
+        if tripped:
+            self.log_message(f"Broker feed degraded after {self.feed_breaker.failures} failures, "
+                             f"next trial in {self.feed_breaker.reset_timeout:.0f} s")
+        if tripped or isinstance(error, TokenException):
+            self.revalidate_session()
+        
+        time.sleep(delay)
+
+    def revalidate_session(self):
+        """Check the access token with a profile call (worker thread)"""
+        try:
+            self.kite.profile()
+            self.log_message("Session re-validated, broker reachable")
+            return True
+        except TokenException as e:
+            self.log_message(f"Session expired or invalid: {e}. Please log in again.")
+            self.post_to_ui(lambda: self.login_status.config(text="Session expired - please log in again",
+                                                             foreground='red'))
+        except Exception as e:
+            self.log_message(f"Session check failed: {e}")
+        return False
+
+    def on_feed_snapshot(self, snapshot):
+        """Watchdog subscriber: every published tick is a good tick"""
+        stale_for = self.feed_watchdog.mark(snapshot.timestamp)
+        if stale_for is not None:
+            self.log_message(f"Market data live again after {stale_for:.1f} s stale")
+        tick_stats = self.update_spread_statistics(snapshot)
+        self.evaluate_tick_signals(snapshot, tick_stats)
+
+    def update_spread_statistics(self, snapshot):
+        """Fold every spread of a tick into its rolling statistics; returns the tick's SpreadStats per commodity (feed thread)"""
+        tick_stats = {}
+        try:
+            session = self.expected_previous_session()
+            if session != self.spread_statistics_session:
+                # New previous closes re-base every price difference: warm up from scratch
+                for statistics in self.spread_statistics.values():
+                    statistics.reset()
+                self.spread_statistics_session = session
+            
+            for commodity, spread in snapshot.spreads.items():
+                key = (commodity, spread.current_contract, spread.next_contract)
+                statistics = self.spread_statistics.get(key)
+                if statistics is None:
+                    statistics = self.spread_statistics[key] = SpreadStatistics()
+                tick_stats[commodity] = statistics.update(spread.timestamp, spread.price_difference)
+                self.latest_spread_stats[commodity] = tick_stats[commodity]
+        except Exception as e:
+            print(f"Error updating spread statistics: {e}")
+        return tick_stats
 
-            # # Print the results
-            # print(f"Current Date: {current_date}")
-            # print(f"Current Time: {current_time}")
+    def check_data_staleness(self):
+        """Show data age / feed health and flag popups while data is stale (Tk thread)"""
+        try:
+            self.feed_watchdog.max_age = max(1.0, float(self.stale_after_var.get()))
+        except ValueError:
+            pass
+        
+        if not self.market_feed_active():
+            self.feed_watchdog.reset()
+            self.data_health_label.config(text="Data: not monitoring", foreground='gray')
+        else:
+            age = self.feed_watchdog.age()
+            stale = self.feed_watchdog.is_stale()
+            feed_state = "DEGRADED" if self.feed_breaker.degraded else "OK"
+            last_recovery = self.feed_breaker.last_recovery()
+            recovery_text = f", last recovery {last_recovery:.1f} s" if last_recovery is not None else ""
+            age_text = f"{age:.1f} s old" if age is not None else "waiting for first tick"
+            
+            self.data_health_label.config(
+                text=f"Data: {'STALE' if stale else 'LIVE'} ({age_text}) | Feed: {feed_state}{recovery_text}",
+                foreground='red' if stale else ('orange' if self.feed_breaker.degraded else 'green')
+            )
             
-            # next_row = sheet.range('A' + str(sheet.cells.last_cell.row)).end('up').row + 1
-            # sheet.range(f'A{next_row}').value = datetime.now()
-            # sheet.range(f'B{next_row}').value = price_difference
+            for window in (self.price_diff_popup, self.comparison_popup):
+                self.flag_stale_window(window, stale)
+        
+        self.root.after(self.watchdog_interval, self.check_data_staleness)
+
+    def flag_stale_window(self, window, stale):
+        """Prefix a popup's title with [STALE] while its numbers are out of date"""
+        try:
+            if not window or not window.winfo_exists():
+                return
+            title = window.title()
+            if stale and not title.startswith("[STALE] "):
+                window.title("[STALE] " + title)
+            elif not stale and title.startswith("[STALE] "):
+                window.title(title[len("[STALE] "):])
+        except Exception as e:
+            print(f"Error flagging stale window: {e}")
+
+    def adapt_poll_interval(self, snapshot):
+        """Pick the next poll interval from threshold proximity and spread volatility (feed thread)"""
+        interval = self.poll_cadence.update(snapshot.spreads, self.signal_thresholds)
+        if interval != self.poll_scheduler.interval:
+            self.log_message(f"Poll interval {self.poll_scheduler.interval:g} s -> {interval:g} s "
+                             f"({self.poll_cadence.reason})")
+            self.poll_scheduler.set_interval(interval)
+
+    def wait_for_market_open(self):
+        """Sleep until the next MCX session; returns False if the feed is no longer needed"""
+        if self.mcx_calendar.is_market_open():
+            return True
+        
+        next_open = self.mcx_calendar.next_open()
+        self.log_message(f"MCX closed, feed sleeping until {next_open:%a %d-%b %H:%M}")
+        while self.market_feed_active():
+            wait = self.mcx_calendar.seconds_until_open()
+            if not wait:
+                self.log_message("MCX session open, resuming feed")
+                return True
+            time.sleep(min(wait, self.market_closed_sleep))
+        return False
+
+    def apply_poll_interval(self, event=None):
+        """Read the poll interval entry (Tk thread) and hand it to the scheduler"""
+        try:
+            interval = float(self.poll_interval_var.get())
+        except ValueError:
+            self.poll_interval_var.set(f"{self.poll_scheduler.interval:g}")
+            return
+        
+        if interval < self.min_poll_interval:
+            self.log_message(f"Poll interval raised to the {self.min_poll_interval:g} s API minimum")
+            interval = self.min_poll_interval
+            self.poll_interval_var.set(f"{interval:g}")
+        
+        # Adaptive mode treats the entry as the slow bound and picks the interval per tick
+        self.adaptive_polling = self.adaptive_poll_var.get()
+        self.poll_cadence.max_interval = interval
+        if not self.adaptive_polling:
+            self.poll_scheduler.set_interval(interval)
+
+    def update_cadence_display(self):
+        """Refresh the achieved poll cadence and jitter"""
+        self.cadence_label.config(text=self.poll_scheduler.summary())
+        self.root.after(self.api_stats_interval, self.update_cadence_display)
+
+    def start_feed_thread(self):
+        """Restart the feed thread from a worker thread (selection already read)"""
+        with self.feed_lock:
+            if self.feed_running:
+                return
+            self.feed_running = True
+        threading.Thread(target=self.monitor_month_comparison, daemon=True).start()
+
+    def restart_tick_stream(self):
+        """Resubscribe the stream after pairs were added to or removed from the hub"""
+        def restart():
+            self.stop_tick_stream()
+            if not self.start_tick_stream() and self.market_feed_active():
+                self.log_message("Tick stream restart failed, falling back to polling")
+                threading.Thread(target=self.poll_month_comparison, daemon=True).start()
+        
+        if self.tick_stream is not None:
+            threading.Thread(target=restart, daemon=True).start()
+
+    def fetch_quotes(self, instruments):
+        """Full quotes (depth, OHLC, OI) for instruments"""
+        return self.kite.quote(instruments)
+
+    def fetch_ltp(self, instruments):
+        """Last traded prices only: the light payload for the polling hot loop"""
+        return self.kite.ltp(instruments)
+
+    def format_top_of_book(self, contract):
+        """Best bid / ask from the latest full quote of a contract, with the quote's age"""
+        latest = self.market_hub.latest
+        quote = latest.quotes.get(contract) if latest is not None else None
+        depth = (quote or {}).get('depth') or {}
+        if not depth.get('buy') or not depth.get('sell'):
+            return "-- (waiting for a full quote)"
+        best_bid, best_ask = depth['buy'][0], depth['sell'][0]
+        age = self.market_hub.quote_age(contract)
+        age_text = f"  [{age:.0f} s old]" if age is not None else ""
+        return (f"{best_bid['price']:.2f} ({best_bid['quantity']}) / "
+                f"{best_ask['price']:.2f} ({best_ask['quantity']}){age_text}")
+
+    def watch_popup_depth(self, window, book_labels):
+        """Keep a popup's bid / ask rows current from hub snapshots until the window closes"""
+        def render():
+            if not window.winfo_exists():
+                return
+            for contract, label in book_labels.items():
+                label.config(text=self.format_top_of_book(contract))
+        
+        def on_snapshot(snapshot):
+            # Feed thread: hand the redraw to the Tk thread, keeping only the latest per popup
+            self.post_to_ui(render, key=f"popup_depth_{id(window)}")
+        
+        def on_destroy(event):
+            if event.widget is window:
+                self.market_hub.unsubscribe(on_snapshot)
+        
+        self.market_hub.subscribe(on_snapshot)
+        window.bind('<Destroy>', on_destroy, add='+')
 
+    def get_month_spread(self, max_age=2):
+        """Latest spread snapshot for the loaded pair, fetching only if stale"""
+        snapshot = self.market_hub.refresh(max_age)
+        if snapshot is None:
+            return None
+        return snapshot.spreads.get(self.month_pair_commodity)
+
+    def on_month_snapshot(self, snapshot):
+        """Main tab subscriber: comparison display and entry/exit logic"""
+        spread = snapshot.spreads.get(self.month_pair_commodity)
+        if spread is not None:
+            self.post_to_ui(self.update_month_comparison_display, spread, key='month_display')
+
+    def on_month_snapshot_persist(self, snapshot):
+        """Persistence subscriber: hand the tick to the persistence worker"""
+        spread = snapshot.spreads.get(self.month_pair_commodity)
+        if spread is not None:
+            # Interval that produced this tick (None while streaming)
+            poll_interval = self.poll_scheduler.interval if self.tick_stream is None else None
+            self.persist_queue.put((spread, True, poll_interval))
+
+    def persistence_worker(self):
+        """Write ticks to the DB and Excel off the Tk and market data threads"""
+        while True:
+            spread, write_readings, poll_interval = self.persist_queue.get()
+            try:
+                self.persist_spread(spread, write_readings, poll_interval)
+            except Exception as e:
+                self.log_message(f"Error persisting tick: {e}")
+
+    def persist_spread(self, spread, write_readings=True, poll_interval=None):
+        """Save one spread snapshot: daily performance, intraday history and (main pair only) tick journal"""
+        # Save daily performance to database (including total sum)
+        self.save_daily_performance(
+            spread.commodity, spread.current_contract, spread.next_contract,
+            spread.current_price, spread.next_price, spread.current_change, spread.next_change,
+            spread.relative_performance,
+            self.get_smiley_status(spread.current_change, spread.next_change),
+            spread.total_sum
+        )
+        self.spread_history.record(spread)
+        if not write_readings:
+            return
+        
+        # Export the finished day once the journal rolls over to a new date
+        tick_day = datetime.fromtimestamp(spread.timestamp).date()
+        if tick_day != self.journal_day:
+            self.export_tick_journal(self.journal_day)
+            self.journal_day = tick_day
+        self.tick_journal.append(spread, poll_interval)
+        
+        # Update today's history line from the tick itself (no DB round trip)
+        self.post_to_ui(self.update_history_today, spread, key='history')
+
+    def export_tick_journal(self, day=None):
+        """Flush the journal and export one day's readings to the Excel sheet (worker thread)"""
+        day = day or date.today()
+        with self.export_lock:
+            self.tick_journal.flush()
+            rows = self.tick_journal.read_rows(day)
+            if rows:
+                export_readings_to_file(rows, day)
+                self.log_message(f"Exported {len(rows)} readings for {day} to {FILE_NAME}")
+        return len(rows)
+
+    def export_tick_journal_in_background(self):
+        """Export today's journal without blocking the Tk thread"""
+        self.journal_status_label.config(text=f"Rows journaled: {self.tick_journal.rows_written} (exporting...)")
+        self.run_in_background(
+            self.export_tick_journal,
+            lambda count: self.journal_status_label.config(
+                text=f"Rows journaled: {self.tick_journal.rows_written} (exported {count})"),
+            on_error=lambda e: messagebox.showerror("Error", f"Export failed: {e}")
+        )
+
+    def get_smiley_status(self, current_change, next_change):
+        """Classify next vs current month performance as POSITIVE/NEGATIVE/NEUTRAL"""
+        return smiley_status(current_change, next_change)
+
+    def start_tick_stream(self):
+        """Subscribe the loaded contracts on KiteTicker; returns False to fall back to polling"""
+        try:
+            symbol_tokens = {}
+            for contract in self.market_hub.symbols():
+                token = self.get_instrument_token(contract)
+                if not token:
+                    return False
+                symbol_tokens[contract] = token
+            
+            self.tick_stream = TickerStream(self.api_key, self.access_token, symbol_tokens,
+                                            on_prices=self.on_stream_prices,
+                                            on_lost=self.on_stream_lost,
+                                            on_status=self.log_message,
+                                            root=self.ticker_root)
+            if self.tick_stream.start():
+                self.log_message(f"Streaming ticks for {', '.join(symbol_tokens)}")
+                return True
+            
+            self.tick_stream = None
+            return False
             
-            #writer.writerows(new_row)
-            #with open('New Microsoft Excel Worksheet.csv', 'a', newline='') as f: csv.writer(f).writerow(new_row)
-            update_existing_file(price_difference)
+        except Exception as e:
+            self.log_message(f"Error starting tick stream: {e}")
+            self.stop_tick_stream()
+            return False
+
+    def stop_tick_stream(self):
+        """Close the KiteTicker stream if one is running"""
+        if self.tick_stream is not None:
+            self.tick_stream.stop()
+            self.tick_stream = None
+
+    def on_stream_prices(self, current_prices):
+        """Handle prices pushed by the ticker thread"""
+        if not self.market_feed_active():
+            return
+        try:
+            self.market_hub.publish(current_prices)
+        except Exception as e:
+            self.log_message(f"Error processing streamed tick: {e}")
+
+    def on_stream_lost(self):
+        """Switch to polling when the WebSocket cannot reconnect"""
+        self.tick_stream = None
+        if self.market_feed_active():
+            self.log_message("Tick stream lost, falling back to polling")
+            threading.Thread(target=self.poll_month_comparison, daemon=True).start()
 
+    def update_price_diff_display(self, spread):
+        """Update price difference display in the main window"""
+        try:
+            current_change_rupees = spread.current_change_rupees
+            next_change_rupees = spread.next_change_rupees
+            price_difference = spread.price_difference
+            
+            print("price_difference: ", price_difference)
+            
             # if price_difference > -2.5:
             #     import winsound
             #     frequency = 3000  # Set Frequency To 2500 Hertz
@@ -1736,168 +3003,125 @@ class ZerodhaTradingApp:
         except Exception as e:
             print(f"Error updating price difference display: {e}")
 
-    def update_month_comparison_display(self, current_prices):
-        """Update month comparison display vs PREVIOUS DAY CLOSE"""
-        if not self.root.winfo_exists():
-            return
-        
-        def update_gui():
-            try:
-                current_price = current_prices.get(self.current_month_contract, 0)
-                next_price = current_prices.get(self.next_month_contract, 0)
-                
-                # Get PREVIOUS DAY CLOSE prices
-                current_prev_close = self.previous_day_close_prices.get(self.current_month_contract, current_price)
-                next_prev_close = self.previous_day_close_prices.get(self.next_month_contract, next_price)
-                
-                # Calculate changes from PREVIOUS DAY CLOSE
-                if current_prev_close > 0:
-                    current_change = ((current_price - current_prev_close) / current_prev_close) * 100
-                else:
-                    current_change = 0
-                
-                if next_prev_close > 0:
-                    next_change = ((next_price - next_prev_close) / next_prev_close) * 100
-                else:
-                    next_change = 0
-                
-                # Calculate total sum of changes
-                total_sum = current_change + next_change
-                
-                # Calculate price changes in rupees
-                current_change_rupees = current_price - current_prev_close
-                next_change_rupees = next_price - next_prev_close
-                price_difference = current_change_rupees - next_change_rupees
-                
-                # Update price labels
-                self.current_price_label.config(text=f"Current: ₹{current_price:.2f}")
-                self.next_price_label.config(text=f"Current: ₹{next_price:.2f}")
-                
-                # Update change labels with colors
-                current_color = 'green' if current_change >= 0 else 'red'
-                next_color = 'green' if next_change >= 0 else 'red'
-                
-                self.current_change_label.config(
-                    text=f"Change: {current_change:+.2f}%",
-                    foreground=current_color
-                )
-                self.next_change_label.config(
-                    text=f"Change: {next_change:+.2f}%",
-                    foreground=next_color
-                )
-                
-                # Update price difference display
-                current_rupee_color = 'green' if current_change_rupees >= 0 else 'red'
-                next_rupee_color = 'green' if next_change_rupees >= 0 else 'red'
-                diff_color = 'green' if price_difference > 0 else 'red' if price_difference < 0 else 'orange'
-                
-                self.price_diff_current.config(
-                    text=f"₹{current_change_rupees:+.2f}",
-                    foreground=current_rupee_color
-                )
-                self.price_diff_next.config(
-                    text=f"₹{next_change_rupees:+.2f}",
-                    foreground=next_rupee_color
-                )
-                self.price_diff_total.config(
-                    text=f"₹{price_difference:+.2f}",
-                    foreground=diff_color
-                )
-                
-                # Update price difference display in the main window
-                # This ensures the price difference updates during live monitoring
-                self.update_price_diff_display()
-                
-                # Check entry/exit condition
-                should_trigger, signal_type, _ = self.check_entry_exit_condition(price_difference)
-                
-                if should_trigger:
-                    self.show_entry_exit_popup(price_difference, signal_type)
-                
-                # Update total changes summary section
-                self.update_total_changes_summary(current_change, next_change, total_sum)
-                
-                # Check trigger condition for special popup
-                should_perf_trigger, difference = self.check_trigger_condition(current_change, next_change)
-                
-                if should_perf_trigger:
-                    self.show_triggered_popup(current_change, next_change, difference)
-                
-                # Determine comparison logic
-                next_increased = next_change > 0
-                current_decreased = current_change < 0
-                
-                # Calculate relative performance
-                relative_performance = next_change - current_change
-                
-                # Determine smiley
-                smiley_status = "NEUTRAL"
-                if next_increased and current_decreased:
-                    # Best case: next month up, current month down
-                    smiley = "😊"
-                    smiley_color = 'green'
-                    comparison_text = "📈 Next month UP, Current DOWN vs Prev Close"
-                    result_color = 'green'
-                    smiley_status = "POSITIVE"
-                elif relative_performance > 0.5:  # Next month performing better by 0.5%
-                    smiley = "😊"
-                    smiley_color = 'green'
-                    comparison_text = f"📈 Next month +{relative_performance:.2f}% better"
-                    result_color = 'green'
-                    smiley_status = "POSITIVE"
-                elif relative_performance < -0.5:  # Current month performing better
-                    smiley = "☹️"
-                    smiley_color = 'red'
-                    comparison_text = f"📉 Current month +{abs(relative_performance):.2f}% better"
-                    result_color = 'red'
-                    smiley_status = "NEGATIVE"
+    def update_spread_stats_display(self, commodity):
+        """Show the rolling spread statistics in the Entry/Exit Status frame"""
+        try:
+            stats = self.latest_spread_stats.get(commodity)
+            if stats is None:
+                self.spread_stats_label.config(text="Spread Stats: --")
+                return
+            
+            zscore = f"{stats.zscore:+.2f}" if stats.zscore is not None else "--"
+            percentile = f"{stats.percentile:.0f}" if stats.percentile is not None else "--"
+            self.spread_stats_label.config(text=(
+                f"EWMA mean ₹{stats.mean:+.2f}  σ ₹{stats.std:.2f}  z {zscore}\n"
+                f"Window min ₹{stats.minimum:+.2f}  median ₹{stats.median:+.2f}  "
+                f"max ₹{stats.maximum:+.2f}  pct {percentile}"
+            ))
+            
+        except Exception as e:
+            print(f"Error updating spread stats display: {e}")
+
+    def update_month_comparison_display(self, spread):
+        """Update month comparison display vs PREVIOUS DAY CLOSE (Tk thread)"""
+        try:
+            current_price = spread.current_price
+            next_price = spread.next_price
+            current_change = spread.current_change
+            next_change = spread.next_change
+            total_sum = spread.total_sum
+            
+            # Update price labels
+            self.current_price_label.config(text=f"Current: ₹{current_price:.2f}")
+            self.next_price_label.config(text=f"Current: ₹{next_price:.2f}")
+            
+            # Update change labels with colors
+            current_color = 'green' if current_change >= 0 else 'red'
+            next_color = 'green' if next_change >= 0 else 'red'
+            
+            self.current_change_label.config(
+                text=f"Change: {current_change:+.2f}%",
+                foreground=current_color
+            )
+            self.next_change_label.config(
+                text=f"Change: {next_change:+.2f}%",
+                foreground=next_color
+            )
+            
+            # Update price difference display in the main window
+            self.update_price_diff_display(spread)
+            self.update_spread_stats_display(spread.commodity)
+            
+            # Entry/exit runs per tick on the feed thread; publish the current settings for it
+            self.refresh_signal_config()
+            self.update_signal_state_display()
+            
+            # Update total changes summary section
+            self.update_total_changes_summary(current_change, next_change, total_sum)
+            
+            # Check trigger condition for special popup
+            should_perf_trigger, difference = self.check_trigger_condition(current_change, next_change)
+            
+            if should_perf_trigger:
+                self.show_triggered_popup(current_change, next_change, difference)
+            
+            # Determine comparison logic
+            next_increased = next_change > 0
+            current_decreased = current_change < 0
+            
+            # Calculate relative performance
+            relative_performance = spread.relative_performance
+            
+            # Determine smiley
+            if next_increased and current_decreased:
+                # Best case: next month up, current month down
+                smiley = "😊"
+                smiley_color = 'green'
+                comparison_text = "📈 Next month UP, Current DOWN vs Prev Close"
+                result_color = 'green'
+            elif relative_performance > 0.5:  # Next month performing better by 0.5%
+                smiley = "😊"
+                smiley_color = 'green'
+                comparison_text = f"📈 Next month +{relative_performance:.2f}% better"
+                result_color = 'green'
+            elif relative_performance < -0.5:  # Current month performing better
+                smiley = "☹️"
+                smiley_color = 'red'
+                comparison_text = f"📉 Current month +{abs(relative_performance):.2f}% better"
+                result_color = 'red'
+            else:
+                smiley = "😐"
+                smiley_color = 'orange'
+                comparison_text = "⚖️ Months similar performance vs Prev Close"
+                result_color = 'orange'
+            
+            # Update smiley and text
+            self.month_smiley_label.config(text=smiley, fg=smiley_color)
+            self.month_comparison_text.config(text=comparison_text, foreground=result_color)
+            
+            # Update result label
+            self.month_result_label.config(
+                text=f"Comparison: Next month is {relative_performance:+.2f}% vs Current",
+                foreground=result_color
+            )
+            
+            # Update trigger status
+            if self.last_trigger_time:
+                time_since = int(time.time() - self.last_trigger_time)
+                cooldown_left = max(0, self.trigger_cooldown - time_since)
+                if cooldown_left > 0:
+                    self.trigger_status_label.config(
+                        text=f"Trigger Cooldown: {cooldown_left}s",
+                        foreground='orange'
+                    )
                 else:
-                    smiley = "😐"
-                    smiley_color = 'orange'
-                    comparison_text = "⚖️ Months similar performance vs Prev Close"
-                    result_color = 'orange'
-                    smiley_status = "NEUTRAL"
-                
-                # Update smiley and text
-                self.month_smiley_label.config(text=smiley, fg=smiley_color)
-                self.month_comparison_text.config(text=comparison_text, foreground=result_color)
-                
-                # Update result label
-                self.month_result_label.config(
-                    text=f"Comparison: Next month is {relative_performance:+.2f}% vs Current",
-                    foreground=result_color
-                )
-                
-                # Update trigger status
-                if self.last_trigger_time:
-                    time_since = int(time.time() - self.last_trigger_time)
-                    cooldown_left = max(0, self.trigger_cooldown - time_since)
-                    if cooldown_left > 0:
-                        self.trigger_status_label.config(
-                            text=f"Trigger Cooldown: {cooldown_left}s",
-                            foreground='orange'
-                        )
-                    else:
-                        self.trigger_status_label.config(
-                            text="Trigger Status: Ready",
-                            foreground='green'
-                        )
-                
-                # Save daily performance to database (including total sum)
-                commodity = self.month_commodity.get()
-                self.save_daily_performance(
-                    commodity, self.current_month_contract, self.next_month_contract,
-                    current_price, next_price, current_change, next_change,
-                    relative_performance, smiley_status, total_sum
-                )
-                
-                # Update history display
-                self.update_history_display(commodity)
-                
-            except Exception as e:
-                print(f"Error updating month comparison display: {e}")
-        
-        self.root.after(0, update_gui)
+                    self.trigger_status_label.config(
+                        text="Trigger Status: Ready",
+                        foreground='green'
+                    )
+            
+        except Exception as e:
+            print(f"Error updating month comparison display: {e}")
 
     def update_total_changes_summary(self, current_change, next_change, total_sum):
         """Update the total changes summary section"""
@@ -1952,25 +3176,15 @@ class ZerodhaTradingApp:
     def save_daily_performance(self, commodity, current_contract, next_contract, 
                               current_close, next_close, current_perf, next_perf, 
                               relative_perf, smiley_status, total_sum=None):
-        """Save daily performance to database"""
+        """Queue today's performance row (committed in batches by the store's writer thread)"""
         try:
-            conn = sqlite3.connect(self.daily_performance_db)
-            cursor = conn.cursor()
-            
             today = date.today()
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO daily_performance 
-                (date, commodity, current_month_contract, next_month_contract,
-                 current_month_close, next_month_close, current_performance,
-                 next_performance, relative_performance, smiley_status, total_sum)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (today, commodity, current_contract, next_contract,
-                  current_close, next_close, current_perf, next_perf,
-                  relative_perf, smiley_status, total_sum))
-            
-            conn.commit()
-            conn.close()
+            self.performance_store.execute(SAVE_DAILY_PERFORMANCE, (
+                today, commodity, current_contract, next_contract,
+                current_close, next_close, current_perf, next_perf,
+                relative_perf, smiley_status, total_sum
+            ))
             
         except Exception as e:
             self.log_message(f"Error saving daily performance: {e}")
@@ -1978,10 +3192,7 @@ class ZerodhaTradingApp:
     def get_historical_performance(self, commodity, days=7):
         """Get historical performance data"""
         try:
-            conn = sqlite3.connect(self.daily_performance_db)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            return self.performance_store.query('''
                 SELECT date, current_performance, next_performance, 
                        relative_performance, smiley_status, total_sum
                 FROM daily_performance 
@@ -1990,22 +3201,96 @@ class ZerodhaTradingApp:
                 LIMIT ?
             ''', (commodity, days))
             
-            results = cursor.fetchall()
-            conn.close()
-            
-            return results
-            
         except Exception as e:
             self.log_message(f"Error getting historical performance: {e}")
             return []
 
     def update_history_display(self, commodity):
-        """Update historical performance display"""
+        """Reload the history cache for a commodity (DB read runs off the Tk thread)"""
+        self.history_commodity = commodity
+        self.history_day = date.today()
+        self.history_today_line = None
+        self.run_in_background(lambda: self.get_historical_performance(commodity, days=7),
+                               lambda rows: self.load_history_cache(commodity, rows))
+
+    def load_history_cache(self, commodity, history_data):
+        """Split queried rows into past days (cached) and today's row, then render"""
+        if commodity != self.history_commodity:
+            return
+        today = self.history_day.isoformat()
+        self.history_past_rows = [record for record in history_data if str(record[0])[:10] != today]
+        today_rows = [record for record in history_data if str(record[0])[:10] == today]
+        self.render_history_display(today_rows[0] if today_rows else None)
+
+    def update_history_today(self, spread):
+        """Replace only today's history line with the latest tick"""
+        if spread.commodity != self.history_commodity or date.today() != self.history_day:
+            # New trading day (or different pair): past rows have changed
+            self.update_history_display(spread.commodity)
+            return
+        
+        record = (self.history_day.isoformat(), spread.current_change, spread.next_change,
+                  spread.relative_performance,
+                  self.get_smiley_status(spread.current_change, spread.next_change),
+                  spread.total_sum)
+        
+        if self.history_today_line is None:
+            self.render_history_display(record)
+            return
+        
+        line, tag = self.format_history_line(record)
+        if line == self.history_today_line:
+            return
+        
+        try:
+            # Today's row is the first line under the header and separator
+            self.history_text.delete("3.0", "4.0")
+            self.history_text.insert("3.0", line, tag)
+            self.history_today_line = line
+        except Exception as e:
+            self.log_message(f"Error updating history display: {e}")
+
+    def format_history_line(self, record):
+        """Format one history row and pick its color tag"""
+        date_str, curr_perf, next_perf, rel_perf, smiley, total_sum = record
+        
+        # Format date
+        if isinstance(date_str, str):
+            display_date = date_str[:10]  # Take first 10 chars
+        else:
+            display_date = str(date_str)[:10]
+        
+        # Format percentages
+        curr_str = f"{curr_perf:+.1f}" if curr_perf is not None else "N/A"
+        next_str = f"{next_perf:+.1f}" if next_perf is not None else "N/A"
+        rel_str = f"{rel_perf:+.1f}" if rel_perf is not None else "N/A"
+        total_str = f"{total_sum:+.1f}" if total_sum is not None else "N/A"
+        
+        line = f"{display_date} | {curr_str:6s} | {next_str:6s} | {rel_str:6s} | {total_str:7s} | {smiley}\n"
+        
+        # Colors based on total sum
+        if total_sum is None:
+            tag = "gray"
+        elif total_sum > 2.0:
+            tag = "dark_green"
+        elif total_sum > 0.5:
+            tag = "green"
+        elif total_sum < -2.0:
+            tag = "dark_red"
+        elif total_sum < -0.5:
+            tag = "red"
+        else:
+            tag = "orange"
+        
+        return line, tag
+
+    def render_history_display(self, today_record=None):
+        """Full redraw of the history panel from today's row plus the cached past rows"""
         try:
-            history_data = self.get_historical_performance(commodity, days=7)
-            
             self.history_text.delete(1.0, tk.END)
+            self.history_today_line = None
             
+            history_data = ([today_record] if today_record else []) + self.history_past_rows
             if not history_data:
                 self.history_text.insert(tk.END, "No historical data available")
                 return
@@ -2014,47 +3299,11 @@ class ZerodhaTradingApp:
             self.history_text.insert(tk.END, "-" * 60 + "\n")
             
             for record in history_data:
-                date_str, curr_perf, next_perf, rel_perf, smiley, total_sum = record
-                
-                # Format date
-                if isinstance(date_str, str):
-                    display_date = date_str[:10]  # Take first 10 chars
-                else:
-                    display_date = str(date_str)[:10]
-                
-                # Format percentages
-                curr_str = f"{curr_perf:+.1f}" if curr_perf is not None else "N/A"
-                next_str = f"{next_perf:+.1f}" if next_perf is not None else "N/A"
-                rel_str = f"{rel_perf:+.1f}" if rel_perf is not None else "N/A"
-                total_str = f"{total_sum:+.1f}" if total_sum is not None else "N/A"
-                
-                # Add color tags based on smiley status
-                line = f"{display_date} | {curr_str:6s} | {next_str:6s} | {rel_str:6s} | {total_str:7s} | {smiley}\n"
-                
-                self.history_text.insert(tk.END, line)
-                
-                # Apply colors based on total sum
-                if total_sum is not None:
-                    if total_sum > 2.0:
-                        self.history_text.tag_add("dark_green", f"end-2l", f"end-1l")
-                    elif total_sum > 0.5:
-                        self.history_text.tag_add("green", f"end-2l", f"end-1l")
-                    elif total_sum < -2.0:
-                        self.history_text.tag_add("dark_red", f"end-2l", f"end-1l")
-                    elif total_sum < -0.5:
-                        self.history_text.tag_add("red", f"end-2l", f"end-1l")
-                    else:
-                        self.history_text.tag_add("orange", f"end-2l", f"end-1l")
-                else:
-                    self.history_text.tag_add("gray", f"end-2l", f"end-1l")
+                line, tag = self.format_history_line(record)
+                self.history_text.insert(tk.END, line, tag)
             
-            # Configure text colors
-            self.history_text.tag_config("dark_green", foreground="dark green")
-            self.history_text.tag_config("green", foreground="green")
-            self.history_text.tag_config("dark_red", foreground="dark red")
-            self.history_text.tag_config("red", foreground="red")
-            self.history_text.tag_config("orange", foreground="orange")
-            self.history_text.tag_config("gray", foreground="gray")
+            if today_record:
+                self.history_today_line = self.format_history_line(today_record)[0]
             
         except Exception as e:
             self.log_message(f"Error updating history display: {e}")
@@ -2083,34 +3332,22 @@ class ZerodhaTradingApp:
             messagebox.showerror("Error", f"Connection failed: {e}")
 
     # Missing methods from previous implementations that need to be included
-    def check_trigger_condition(self, current_change, next_change):
+    def check_trigger_condition(self, current_change, next_change, now=None):
         """
         Check if next month's performance is significantly better than current month's
         Returns: (bool, float difference)
         """
+        now = time.time() if now is None else now
         try:
             # Update threshold from GUI
-            self.trigger_threshold = float(self.trigger_threshold_var.get())
-            self.trigger_cooldown = int(self.cooldown_var.get())
-            
-            # Calculate difference
-            difference = next_change - current_change
-            
-            # Check if next month is performing significantly better
-            if difference > self.trigger_threshold:
-                # Check cooldown
-                current_time = time.time()
-                if self.last_trigger_time is None or (current_time - self.last_trigger_time) > self.trigger_cooldown:
-                    return True, difference
-            return False, difference
-            
+            config = SignalConfig.parse(trigger_threshold=self.trigger_threshold_var.get(),
+                                        trigger_cooldown=self.cooldown_var.get())
+            self.trigger_threshold, self.trigger_cooldown = config.trigger_threshold, config.trigger_cooldown
         except ValueError:
-            # If invalid threshold, use defaults
-            if next_change - current_change > 0.5:
-                current_time = time.time()
-                if self.last_trigger_time is None or (current_time - self.last_trigger_time) > 60:
-                    return True, next_change - current_change
-            return False, next_change - current_change
+            # If invalid threshold, use defaults (0.5 % with a 60 s cooldown)
+            config = SignalConfig()
+        
+        return check_trigger(current_change, next_change, config, self.last_trigger_time, now)
 
     def test_triggered_popup(self):
         """Test the triggered popup display"""
@@ -2520,39 +3757,45 @@ class ZerodhaTradingApp:
         
         # Start updates
         self.start_comparison_popup_updates(window)
+        
+        # Show the latest shared snapshot straight away if there is one
+        if self.market_hub.latest is not None:
+            self.on_comparison_popup_snapshot(self.market_hub.latest)
 
     def start_comparison_popup_updates(self, window):
         """Start updating comparison popup window"""
-        def update_popup():
+        self.market_hub.subscribe(self.on_comparison_popup_snapshot)
+        
+        def refresh_popup():
             if not window.winfo_exists():
                 return
             
-            try:
-                # Get current prices
-                contracts = [self.current_month_contract, self.next_month_contract]
-                instruments = [f"MCX:{contract}" for contract in contracts]
-                
-                quote_data = self.kite.quote(instruments)
-                
-                current_price = quote_data[f"MCX:{self.current_month_contract}"]['last_price']
-                next_price = quote_data[f"MCX:{self.next_month_contract}"]['last_price']
-                
-                # Get PREVIOUS DAY CLOSE prices
-                current_prev = self.previous_day_close_prices.get(self.current_month_contract, current_price)
-                next_prev = self.previous_day_close_prices.get(self.next_month_contract, next_price)
-                
-                # Update the popup display
-                self.update_comparison_popup_display(window, current_price, next_price, current_prev, next_prev)
-                
-            except Exception as e:
-                print(f"Error updating comparison popup: {e}")
+            # While monitoring, the monitor loop already refreshes the hub
+            if not self.month_comparison_running:
+                self.refresh_market_hub_in_background()
             
             # Schedule next update
             if window.winfo_exists():
-                window.after(2000, update_popup)
+                window.after(2000, refresh_popup)
         
         # Start updates
-        window.after(1000, update_popup)
+        window.after(1000, refresh_popup)
+
+    def on_comparison_popup_snapshot(self, snapshot):
+        """Comparison popup subscriber"""
+        spread = snapshot.spreads.get(self.month_pair_commodity)
+        if spread is None:
+            return
+        
+        def update_popup():
+            window = self.comparison_popup
+            if window and window.winfo_exists():
+                self.update_comparison_popup_display(
+                    window, spread.current_price, spread.next_price,
+                    spread.current_prev_close, spread.next_prev_close
+                )
+        
+        self.post_to_ui(update_popup, key='comparison_popup')
 
     def update_comparison_popup_display(self, window, current_price, next_price, current_prev, next_prev):
         """Update comparison popup with all data"""
@@ -2798,6 +4041,7 @@ class ZerodhaTradingApp:
 
     def on_comparison_popup_close(self, window):
         """Handle comparison popup window close"""
+        self.market_hub.unsubscribe(self.on_comparison_popup_snapshot)
         window.destroy()
         self.comparison_popup = None
 
@@ -0,0 +1,385 @@
+"""
+Backtest the entry/exit thresholds and cooldown over recorded spread history.
+
+History loads into NumPy arrays (SpreadSeries) from:
+- the tick journal (tick_journal/ticks_YYYY-MM-DD.csv)
+- the "Future Readings" sheet of MCX_Trading_Platform_Data.xlsx
+- Kite minute candles for a current/next month pair
+
+It is then replayed with the same rules as the Tk app's
+check_entry_exit_condition, through signal_engine.evaluate_signals, so
+cooldowns and the hysteresis state machine match the live monitor exactly.
+
+The simulated trade is long the spread (current month minus next month): an
+ENTRY opens it, the next EXIT closes it. Repeated ENTRY signals while long,
+and EXIT signals while flat, are ignored. P&L is the change in the spread
+times the contract multiplier (₹ per point per lot), less a per-trade cost.
+
+Example:
+    python backtest.py --source journal --commodity GOLD --start 2026-09-01 --end 2026-09-30 \\
+        --entry -2 --exit 2 --cooldown 5 --multiplier 100
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from signal_engine import (DEFAULT_COOLDOWN, DEFAULT_DEBOUNCE, DEFAULT_ENTRY_THRESHOLD, DEFAULT_EXIT_THRESHOLD,
+                           DEFAULT_REARM_BAND, SIGNAL_GATINGS, SIGNAL_MODES, SignalConfig, evaluate_signals)
+from spread_stats import replay_statistics
+from storage import TICK_JOURNAL_DIR
+
+WORKBOOK_FILE = 'MCX_Trading_Platform_Data.xlsx'
+CANDLE_DAYS_PER_REQUEST = 60  # Kite's limit for minute candles
+
+# Recorded ticks for one commodity as parallel arrays (prices are NaN when the source has none)
+SpreadSeries = namedtuple('SpreadSeries', [
+    'commodity', 'timestamps', 'current_prices', 'next_prices', 'price_differences',
+    'relative_performances',
+])
+
+# One simulated round trip; exit_* is the last tick for a trade still open at the end
+Trade = namedtuple('Trade', [
+    'entry_time', 'exit_time', 'entry_spread', 'exit_spread', 'points', 'pnl', 'is_open',
+])
+
+BacktestResult = namedtuple('BacktestResult', [
+    'commodity', 'config', 'ticks', 'signals', 'trades', 'total_pnl', 'hit_rate',
+    'max_drawdown', 'equity', 'elapsed',
+])
+
+
+def series_from_frame(commodity, frame):
+    """SpreadSeries from a DataFrame with timestamp and price_difference (and optional price) columns"""
+    frame = frame.sort_values('timestamp', kind='stable')
+
+    def column(name):
+        if name in frame.columns:
+            return frame[name].to_numpy(dtype=float)
+        return np.full(len(frame), np.nan)
+
+    # Next minus current month % change vs previous close, as in market_data.build_spread_snapshot
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = [np.where(column(f"{leg}_prev_close") > 0,
+                            (column(f"{leg}_price") - column(f"{leg}_prev_close")) / column(f"{leg}_prev_close") * 100,
+                            np.where(np.isnan(column(f"{leg}_prev_close")), np.nan, 0.0))
+                   for leg in ('current', 'next')]
+    return SpreadSeries(commodity, column('timestamp'), column('current_price'),
+                        column('next_price'), column('price_difference'), changes[1] - changes[0])
+
+
+def epoch_seconds(moments):
+    """Epoch seconds for a datetime Series (naive values are local wall-clock time, like the journal's)"""
+    if moments.dt.tz is None:
+        moments = moments.dt.tz_localize(datetime.now().astimezone().tzinfo)
+    return (moments - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+
+
+def calendar_days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def load_journal(commodity, start, end=None, directory=TICK_JOURNAL_DIR):
+    """Journaled ticks for a commodity between two dates (inclusive)"""
+    frames = []
+    for day in calendar_days(start, end or start):
+        path = os.path.join(directory, f"ticks_{day:%Y-%m-%d}.csv")
+        if os.path.exists(path):
+            frames.append(pd.read_csv(path, usecols=[
+                'timestamp', 'commodity', 'current_price', 'next_price', 'current_prev_close',
+                'next_prev_close', 'price_difference']))
+
+    if not frames:
+        return series_from_frame(commodity, pd.DataFrame(columns=['timestamp', 'price_difference']))
+    frame = pd.concat(frames, ignore_index=True)
+    return series_from_frame(commodity, frame[frame['commodity'] == commodity])
+
+
+def load_workbook_readings(path=WORKBOOK_FILE, start=None, end=None, commodity=None):
+    """
+    Readings exported to the "Future Readings" sheet (Date, Time, Value)
+    The sheet keeps only the price difference. It moves with the spread within a
+    day, so same-day trades are exact. Trades held overnight also pick up the
+    change in the previous-close baseline.
+    """
+    frame = pd.read_excel(path, sheet_name='Future Readings').dropna(subset=['Date', 'Time', 'Value'])
+    dates = pd.to_datetime(frame['Date']).dt.normalize()
+    if start is not None:
+        keep = (dates.dt.date >= start) & (dates.dt.date <= (end or start))
+        frame, dates = frame[keep], dates[keep]
+
+    moments = dates + pd.to_timedelta(frame['Time'].astype(str))
+    return series_from_frame(commodity or "READINGS", pd.DataFrame({
+        'timestamp': epoch_seconds(moments), 'price_difference': frame['Value'].to_numpy(dtype=float)}))
+
+
+def fetch_minute_candles(kite, instrument_token, start, end):
+    """Minute candles for one contract as a DataFrame (date, close), in Kite-sized chunks"""
+    frames = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=CANDLE_DAYS_PER_REQUEST - 1))
+        candles = kite.historical_data(instrument_token=instrument_token,
+                                       from_date=chunk_start.strftime("%Y-%m-%d 00:00:00"),
+                                       to_date=chunk_end.strftime("%Y-%m-%d 23:59:59"),
+                                       interval="minute", continuous=False)
+        if candles:
+            frames.append(pd.DataFrame(candles)[['date', 'close']])
+        chunk_start = chunk_end + timedelta(days=1)
+    if not frames:
+        return pd.DataFrame(columns=['date', 'close'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_candles(kite, index, commodity, current_contract, next_contract, start, end=None):
+    """
+    Minute-close spreads for a current/next month pair
+    Each day's previous close is the last minute close of the prior session in
+    the data (a week before start is fetched for the first day's baseline).
+    """
+    end = end or start
+    legs = []
+    for contract, prefix in ((current_contract, 'current'), (next_contract, 'next')):
+        token = index.token(contract)
+        if token is None:
+            raise ValueError(f"Unknown contract {contract}")
+        candles = fetch_minute_candles(kite, token, start - timedelta(days=7), end)
+        legs.append(candles.rename(columns={'close': f"{prefix}_price"}))
+
+    frame = legs[0].merge(legs[1], on='date', how='inner').sort_values('date')
+    if frame.empty:
+        return series_from_frame(commodity, pd.DataFrame(columns=['timestamp', 'price_difference']))
+
+    moments = pd.to_datetime(frame['date'])
+    frame['timestamp'] = epoch_seconds(moments)
+    days = moments.dt.date
+    for prefix in ('current', 'next'):
+        session_close = frame.groupby(days)[f"{prefix}_price"].last()
+        frame[f"{prefix}_prev_close"] = days.map(session_close.shift(1))
+
+    frame = frame[(days >= start) & (days <= end)].dropna(subset=['current_prev_close', 'next_prev_close'])
+    # Same definition as market_data.build_spread_snapshot
+    frame['price_difference'] = ((frame['current_price'] - frame['current_prev_close'])
+                                 - (frame['next_price'] - frame['next_prev_close']))
+    return series_from_frame(commodity, frame)
+
+
+def spread_levels(series):
+    """Current minus next month price per tick (the price difference where prices were not recorded)"""
+    levels = series.current_prices - series.next_prices
+    return np.where(np.isnan(levels), series.price_differences, levels)
+
+
+def backtest(series, config=None, multiplier=1.0, cost_per_trade=0.0, confirm_with_trigger=False):
+    """
+    Replay entry/exit signals over a SpreadSeries and simulate long-spread round trips
+    confirm_with_trigger only takes an ENTRY while next month beats current month
+    by more than config.trigger_threshold % (needs recorded previous closes).
+    The zscore / percentile modes replay the live rolling statistics first.
+    """
+    config = config or SignalConfig()
+    started = time.perf_counter()
+    ticks = len(series.timestamps)
+
+    stats = None
+    if config.mode != 'rupees':
+        stats = replay_statistics(series.timestamps, series.price_differences)
+    confirm_entries = series.relative_performances > config.trigger_threshold if confirm_with_trigger else None
+    fired, signal_types, _ = evaluate_signals(series.price_differences, series.timestamps, config,
+                                              confirm_entries=confirm_entries, stats=stats)
+    levels = spread_levels(series)
+
+    # Position after each signal: long after an ENTRY, flat after an EXIT
+    signal_index = np.flatnonzero(fired)
+    long_after = signal_types[signal_index] == "ENTRY"
+    long_before = np.concatenate(([False], long_after[:-1]))
+    opens = signal_index[long_after & ~long_before]
+    closes = signal_index[~long_after & long_before]
+    is_open = np.zeros(len(opens), dtype=bool)
+    if len(closes) < len(opens):
+        closes = np.append(closes, ticks - 1)
+        is_open[-1] = True
+
+    points = levels[closes] - levels[opens]
+    pnl = points * multiplier - cost_per_trade
+
+    # Mark-to-market equity: the position held over each tick interval, costs charged on entry
+    last_signal = np.maximum.accumulate(np.where(fired, np.arange(ticks), -1)) if ticks else np.zeros(0, int)
+    position = (last_signal >= 0) & (signal_types[np.maximum(last_signal, 0)] == "ENTRY")
+    moves = np.concatenate(([0.0], position[:-1] * np.diff(levels))) if ticks else np.zeros(0)
+    charges = np.zeros(ticks)
+    charges[opens] = cost_per_trade
+    equity = np.cumsum(moves * multiplier - charges)
+    max_drawdown = float(np.max(np.maximum.accumulate(equity) - equity)) if ticks else 0.0
+
+    closed = pnl[~is_open]
+    trades = [Trade(series.timestamps[i], series.timestamps[j], levels[i], levels[j], p, v, o)
+              for i, j, p, v, o in zip(opens, closes, points, pnl, is_open)]
+    return BacktestResult(
+        commodity=series.commodity,
+        config=config,
+        ticks=ticks,
+        signals=int(fired.sum()),
+        trades=trades,
+        total_pnl=float(pnl.sum()),
+        hit_rate=float(np.mean(closed > 0)) if len(closed) else None,
+        max_drawdown=max_drawdown,
+        equity=equity,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def format_report(result):
+    """Summary lines for a BacktestResult"""
+    config = result.config
+    closed = [trade for trade in result.trades if not trade.is_open]
+    if config.gating == 'hysteresis':
+        gating = f"re-arm band {config.rearm_band:g}, debounce {config.debounce} ticks"
+    else:
+        gating = f"cooldown {config.cooldown / 60:g} min"
+    lines = [
+        f"{result.commodity}: entry {config.describe_band('ENTRY')}, exit {config.describe_band('EXIT')}, {gating}",
+        f"Ticks: {result.ticks}  Signals: {result.signals}  Trades: {len(closed)} closed"
+        f"{', 1 open' if len(closed) < len(result.trades) else ''}",
+        f"P&L per lot: ₹{result.total_pnl:+,.2f}  Max drawdown: ₹{result.max_drawdown:,.2f}",
+    ]
+    if closed:
+        pnls = [trade.pnl for trade in closed]
+        holding = sum(trade.exit_time - trade.entry_time for trade in closed) / len(closed)
+        lines.append(f"Hit rate: {result.hit_rate:.1%}  Avg: ₹{sum(pnls) / len(pnls):+,.2f}  "
+                     f"Best: ₹{max(pnls):+,.2f}  Worst: ₹{min(pnls):+,.2f}  Avg hold: {holding / 60:.1f} min")
+    lines.append(f"Replayed in {result.elapsed * 1000:.1f} ms")
+    return lines
+
+
+def save_trades(trades, path):
+    """Write trades to CSV"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['entry_time', 'exit_time', 'entry_spread', 'exit_spread', 'points', 'pnl', 'open'])
+        for trade in trades:
+            writer.writerow([
+                datetime.fromtimestamp(trade.entry_time).isoformat(timespec='seconds'),
+                datetime.fromtimestamp(trade.exit_time).isoformat(timespec='seconds'),
+                round(trade.entry_spread, 4), round(trade.exit_spread, 4),
+                round(trade.points, 4), round(trade.pnl, 2), trade.is_open,
+            ])
+
+
+def connect_kite(args):
+    """Rate-limited KiteConnect and instrument index for candle history"""
+    from instruments import InstrumentIndex, load_instrument_master
+    from rate_limit import KiteRateLimiter, RateLimitedKite
+    from signal_daemon import KiteConnect, load_credentials
+
+    api_key, access_token = load_credentials(args)
+    if not api_key or not access_token:
+        raise ValueError("No Kite credentials: log in once from the Tk app or pass --api-key/--access-token")
+    kite = RateLimitedKite(KiteConnect(api_key=api_key), KiteRateLimiter())
+    kite.set_access_token(access_token)
+    instruments_df, _ = load_instrument_master(kite)
+    return kite, InstrumentIndex(instruments_df)
+
+
+def load_series(args):
+    """SpreadSeries for the history arguments (see add_history_arguments); raises ValueError"""
+    if args.source != 'xlsx' and not args.commodity:
+        raise ValueError("--commodity is required for journal and candle history")
+    commodity = args.commodity.upper() if args.commodity else None
+    start = args.start or date.today()
+    end = args.end or start
+
+    if args.source == 'journal':
+        return load_journal(commodity, start, end, args.journal_dir)
+    if args.source == 'xlsx':
+        return load_workbook_readings(args.workbook, start if args.start else None, end, commodity)
+
+    kite, index = connect_kite(args)
+    current_contract, next_contract = args.current, args.next
+    if not current_contract or not next_contract:
+        futures = index.active_futures(commodity, start, count=2)
+        if len(futures) < 2:
+            raise ValueError(f"No current/next month futures for {commodity}; pass --current/--next")
+        current_contract, next_contract = futures[0].tradingsymbol, futures[1].tradingsymbol
+    print(f"Fetching minute candles for {current_contract} vs {next_contract}")
+    return load_candles(kite, index, commodity, current_contract, next_contract, start, end)
+
+
+def add_history_arguments(parser):
+    """Arguments selecting the history to replay (shared with param_sweep.py)"""
+    parser.add_argument('--source', choices=['journal', 'xlsx', 'candles'], default='journal')
+    parser.add_argument('--commodity', help="commodity (required for journal and candles)")
+    parser.add_argument('--start', type=date.fromisoformat, help="first day, YYYY-MM-DD (default today)")
+    parser.add_argument('--end', type=date.fromisoformat, help="last day, YYYY-MM-DD (default start)")
+    parser.add_argument('--multiplier', type=float, default=1.0, help="₹ per spread point per lot")
+    parser.add_argument('--cost', type=float, default=0.0, help="cost per round trip per lot (₹)")
+    parser.add_argument('--journal-dir', default=TICK_JOURNAL_DIR)
+    parser.add_argument('--workbook', default=WORKBOOK_FILE)
+    parser.add_argument('--current', help="current month contract for candles (default: active pair)")
+    parser.add_argument('--next', help="next month contract for candles (default: active pair)")
+    parser.add_argument('--credentials', default='zerodha_credentials.json')
+    parser.add_argument('--api-key')
+    parser.add_argument('--access-token')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Backtest MCX spread entry/exit signals over recorded history")
+    add_history_arguments(parser)
+    parser.add_argument('--entry', type=float, default=DEFAULT_ENTRY_THRESHOLD, help="entry threshold (₹)")
+    parser.add_argument('--exit', type=float, default=DEFAULT_EXIT_THRESHOLD, help="exit threshold (₹)")
+    parser.add_argument('--cooldown', type=float, default=DEFAULT_COOLDOWN / 60, help="cooldown (minutes)")
+    parser.add_argument('--trigger-threshold', type=float,
+                        help="only take an ENTRY while next month beats current by more than this %% (off by default)")
+    parser.add_argument('--mode', choices=SIGNAL_MODES, default='rupees', help="signal on ₹, z-score or percentile bands")
+    parser.add_argument('--entry-z', type=float, default=-2.0, help="entry z-score band (zscore mode)")
+    parser.add_argument('--exit-z', type=float, default=2.0, help="exit z-score band (zscore mode)")
+    parser.add_argument('--entry-percentile', type=float, default=5.0, help="entry percentile band (percentile mode)")
+    parser.add_argument('--exit-percentile', type=float, default=95.0, help="exit percentile band (percentile mode)")
+    parser.add_argument('--gating', choices=SIGNAL_GATINGS, default='hysteresis',
+                        help="entry/exit gating: hysteresis state machine or wall-clock cooldown")
+    parser.add_argument('--rearm-band', type=float, default=DEFAULT_REARM_BAND,
+                        help="distance back past a band before the opposite signal arms (units of --mode)")
+    parser.add_argument('--debounce', type=int, default=DEFAULT_DEBOUNCE, help="consecutive ticks beyond a band")
+    parser.add_argument('--trades-csv', help="write the simulated trades to this CSV")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        series = load_series(args)
+    except Exception as e:
+        print(f"Error loading history: {e}")
+        return 1
+    if not len(series.timestamps):
+        print("No history for that selection")
+        return 1
+
+    config = SignalConfig(args.entry, args.exit, args.cooldown * 60, mode=args.mode, entry_z=args.entry_z,
+                          exit_z=args.exit_z, entry_percentile=args.entry_percentile,
+                          exit_percentile=args.exit_percentile, gating=args.gating, rearm_band=args.rearm_band,
+                          debounce=max(1, args.debounce))
+    if args.trigger_threshold is not None:
+        config = config._replace(trigger_threshold=args.trigger_threshold)
+    result = backtest(series, config, args.multiplier, args.cost,
+                      confirm_with_trigger=args.trigger_threshold is not None)
+    for line in format_report(result):
+        print(line)
+
+    if args.trades_csv:
+        save_trades(result.trades, args.trades_csv)
+        print(f"Trades written to {args.trades_csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
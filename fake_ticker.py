@@ -0,0 +1,158 @@
+"""
+Local fake Kite ticker WebSocket server for testing streaming without a market.
+
+Speaks just enough of the KiteTicker protocol for TickerStream: it accepts
+the JSON subscribe / mode messages and pushes binary LTP packets (token and
+last price in paise) for every subscribed token, random-walking from a base
+price. Any token is served, so the Tk app and the signal daemon can point at
+it with their real instrument tokens. --drop-after closes each connection
+after that many tick messages to exercise KiteTicker's reconnect.
+
+Examples:
+    python fake_ticker.py --port 9000 --price 72000 --drop-after 50
+    python signal_daemon.py --commodity GOLD --source stream --ticker-root ws://127.0.0.1:9000
+    python fake_ticker.py --self-test   # connect, tick and reconnect through TickerStream
+"""
+import argparse
+import json
+import random
+import struct
+import sys
+import threading
+import time
+
+from autobahn.twisted.websocket import WebSocketServerFactory, WebSocketServerProtocol, listenWS
+from twisted.internet import reactor, task
+
+
+def ltp_message(prices):
+    """Binary KiteTicker message with one LTP packet per {token: price}"""
+    packets = [struct.pack('>II', token, int(round(price * 100))) for token, price in prices.items()]
+    return struct.pack('>H', len(packets)) + b''.join(struct.pack('>H', len(packet)) + packet
+                                                     for packet in packets)
+
+
+class FakeTickerProtocol(WebSocketServerProtocol):
+    """One client connection: subscriptions and its tick loop"""
+
+    def onOpen(self):
+        self.tokens = set()
+        self.sent = 0
+        self.loop = None
+        self.factory.connections += 1
+
+    def onMessage(self, payload, is_binary):
+        if is_binary:
+            return
+        try:
+            message = json.loads(payload.decode('utf-8'))
+        except ValueError:
+            return
+        action, value = message.get('a'), message.get('v')
+        if action == 'subscribe':
+            self.tokens.update(int(token) for token in value)
+        elif action == 'unsubscribe':
+            self.tokens.difference_update(int(token) for token in value)
+        elif action == 'mode' and self.loop is None:
+            self.loop = task.LoopingCall(self.send_ticks)
+            self.loop.start(self.factory.interval)
+
+    def send_ticks(self):
+        if not self.tokens:
+            return
+        self.sendMessage(ltp_message({token: self.factory.next_price(token) for token in self.tokens}),
+                         isBinary=True)
+        self.sent += 1
+        if self.factory.drop_after and self.sent >= self.factory.drop_after:
+            self.dropConnection(abort=True)
+
+    def onClose(self, was_clean, code, reason):
+        if getattr(self, 'loop', None) is not None and self.loop.running:
+            self.loop.stop()
+
+
+class FakeTickerFactory(WebSocketServerFactory):
+    protocol = FakeTickerProtocol
+
+    def __init__(self, url, price=100.0, interval=0.5, drop_after=None, seed=None):
+        super().__init__(url)
+        self.base_price = price
+        self.interval = interval
+        self.drop_after = drop_after
+        self.prices = {}
+        self.connections = 0
+        self.random = random.Random(seed)
+
+    def next_price(self, token):
+        """Random walk in whole ticks of 1.0 from the base price"""
+        price = self.prices.get(token, self.base_price) + self.random.choice((-1.0, 0.0, 1.0))
+        self.prices[token] = price
+        return price
+
+
+def listen(port, **kwargs):
+    """Register the server with the reactor; returns its factory"""
+    factory = FakeTickerFactory(f"ws://127.0.0.1:{port}", **kwargs)
+    listenWS(factory)
+    return factory
+
+
+def self_test(port, timeout=30.0):
+    """Connect TickerStream to the fake server, receive ticks, survive a dropped connection"""
+    from market_data import TickerStream
+
+    factory = listen(port, interval=0.1, drop_after=5, seed=1)
+    received = []
+    statuses = []
+    reconnected = threading.Event()
+
+    def on_prices(prices):
+        # Tag each tick with the client's connection count (one "connected" status per (re)connect)
+        connects = sum(1 for status in statuses if status.startswith("WebSocket connected"))
+        received.append((connects, prices))
+        if connects >= 2:
+            reconnected.set()
+
+    stream = TickerStream('api_key', 'access_token', {'FAKE1FUT': 111, 'FAKE2FUT': 222}, on_prices,
+                          on_status=statuses.append, root=f"ws://127.0.0.1:{port}")
+    try:
+        # TickerStream runs the reactor (with our server) on its own thread
+        if not stream.start(timeout=10):
+            print("FAIL: no connection")
+            return 1
+        print(f"connected: {statuses[-1]}")
+        if not reconnected.wait(timeout):
+            print(f"FAIL: no ticks after a reconnect ({len(received)} ticks, {factory.connections} connections)")
+            return 1
+        before = sum(1 for connects, _ in received if connects == 1)
+        print(f"ticks before the drop: {before}, after reconnecting: {len(received) - before}, "
+              f"server connections: {factory.connections}")
+        print("OK")
+        return 0
+    finally:
+        stream.stop()
+        time.sleep(0.2)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fake Kite ticker WebSocket server")
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--price', type=float, default=100.0, help="starting price of every token")
+    parser.add_argument('--interval', type=float, default=0.5, help="seconds between tick messages")
+    parser.add_argument('--drop-after', type=int, help="drop each connection after this many tick messages")
+    parser.add_argument('--self-test', action='store_true', help="run a TickerStream against the server and exit")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.self_test:
+        return self_test(args.port)
+    listen(args.port, price=args.price, interval=args.interval, drop_after=args.drop_after)
+    print(f"Fake ticker on ws://127.0.0.1:{args.port}")
+    reactor.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Local cache of the Kite instrument master.
+
+The MCX instrument dump is downloaded at most once per trading date and
+stored as a pickled DataFrame under instrument_cache/, so later logins load
+it from disk in milliseconds. Older cache files are removed on refresh.
+
+InstrumentIndex is built once per load and answers symbol -> token/expiry/
+lot size and per-underlying futures chain lookups without scanning the
+DataFrame.
+"""
+import os
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date
+
+import pandas as pd
+
+INSTRUMENT_CACHE_DIR = 'instrument_cache'
+
+InstrumentInfo = namedtuple('InstrumentInfo', [
+    'tradingsymbol', 'instrument_token', 'expiry', 'lot_size', 'name', 'instrument_type',
+])
+
+
+def instrument_cache_path(exchange="MCX", trading_date=None):
+    """Cache file for one exchange and trading date"""
+    trading_date = trading_date or date.today()
+    return os.path.join(INSTRUMENT_CACHE_DIR, f"{exchange}_instruments_{trading_date:%Y-%m-%d}.pkl")
+
+
+def load_instrument_master(kite, exchange="MCX", force_refresh=False, trading_date=None):
+    """
+    Load the instrument master for an exchange, downloading only when today's cache is missing
+    Returns: (DataFrame, loaded_from_cache)
+    """
+    path = instrument_cache_path(exchange, trading_date)
+
+    if not force_refresh and os.path.exists(path):
+        try:
+            return pd.read_pickle(path), True
+        except Exception as e:
+            print(f"Instrument cache {path} unreadable, downloading again: {e}")
+
+    instruments_df = pd.DataFrame(kite.instruments(exchange))
+
+    # Convert expiry to datetime if it's string
+    if 'expiry' in instruments_df.columns and instruments_df['expiry'].dtype == 'object':
+        instruments_df['expiry'] = pd.to_datetime(instruments_df['expiry']).dt.date
+
+    save_instrument_cache(instruments_df, path, exchange)
+    return instruments_df, False
+
+
+def save_instrument_cache(instruments_df, path, exchange="MCX"):
+    """Write the cache atomically and drop older dumps for the exchange"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        instruments_df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+        for name in os.listdir(INSTRUMENT_CACHE_DIR):
+            old_path = os.path.join(INSTRUMENT_CACHE_DIR, name)
+            if name.startswith(f"{exchange}_instruments_") and old_path != path:
+                os.remove(old_path)
+    except Exception as e:
+        print(f"Error saving instrument cache: {e}")
+
+
+class InstrumentIndex:
+    """Dict and expiry-sorted chain indexes over an instrument master DataFrame"""
+
+    def __init__(self, instruments_df):
+        self.by_symbol = {}
+        self.futures_chains = {}  # underlying name -> [InstrumentInfo] sorted by expiry
+        self.chain_expiries = {}  # underlying name -> [expiry] for bisect
+
+        if instruments_df is None or instruments_df.empty:
+            return
+
+        columns = [instruments_df[column] if column in instruments_df.columns
+                   else [None] * len(instruments_df)
+                   for column in InstrumentInfo._fields]
+
+        chains = {}
+        for values in zip(*columns):
+            info = InstrumentInfo(*values)
+            info = info._replace(instrument_token=int(info.instrument_token))
+            self.by_symbol[info.tradingsymbol] = info
+
+            if info.instrument_type == 'FUT' and info.name and info.expiry is not None:
+                chains.setdefault(info.name, []).append(info)
+
+        for name, chain in chains.items():
+            chain.sort(key=lambda info: info.expiry)
+            self.futures_chains[name] = chain
+            self.chain_expiries[name] = [info.expiry for info in chain]
+
+    def get(self, tradingsymbol):
+        """InstrumentInfo for a trading symbol, or None"""
+        return self.by_symbol.get(tradingsymbol)
+
+    def token(self, tradingsymbol):
+        """Instrument token for a trading symbol, or None"""
+        info = self.by_symbol.get(tradingsymbol)
+        return info.instrument_token if info else None
+
+    def active_futures(self, underlying, on_date=None, count=2):
+        """Nearest unexpired futures for an underlying (current month first)"""
+        chain = self.futures_chains.get(underlying)
+        if not chain:
+            return []
+
+        on_date = on_date or date.today()
+        start = bisect_left(self.chain_expiries[underlying], on_date)
+        return chain[start:start + count]
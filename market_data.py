@@ -0,0 +1,342 @@
+"""
+Market data sources for the MCX month comparison monitor.
+
+MarketDataHub fetches prices once per tick and publishes one immutable
+MarketSnapshot to every subscriber (main tab, popups, persistence), so all
+views show the same numbers from the same request.
+
+TieredQuoteFetcher is the hub's fetch function for polling: kite.ltp on
+every tick, a full kite.quote (depth, OHLC, OI) only every few minutes or
+on the tick after a signal asks for one.
+
+TickerStream pushes last traded prices from the Kite WebSocket (KiteTicker)
+instead of polling kite.quote(). The WebSocket root can be overridden so the
+stream can be pointed at a local fake server that speaks the Kite binary
+tick format (e.g. ws://127.0.0.1:9000; fake_ticker.py is one).
+"""
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+try:
+    from kiteconnect import KiteTicker
+except ImportError:
+    KiteTicker = None
+
+
+# One published tick: prices and latest full quotes keyed by tradingsymbol, spreads keyed by commodity
+MarketSnapshot = namedtuple('MarketSnapshot', ['timestamp', 'prices', 'quotes', 'spreads'])
+
+# Current vs next month figures computed once per tick for one commodity
+SpreadSnapshot = namedtuple('SpreadSnapshot', [
+    'timestamp', 'commodity', 'current_contract', 'next_contract',
+    'current_price', 'next_price', 'current_prev_close', 'next_prev_close',
+    'current_change', 'next_change', 'current_change_rupees', 'next_change_rupees',
+    'price_difference', 'total_sum', 'relative_performance',
+])
+
+
+def build_spread_snapshot(commodity, current_contract, next_contract, prices, prev_closes, timestamp):
+    """Compute current vs next month changes against PREVIOUS DAY CLOSE"""
+    current_price = prices.get(current_contract, 0)
+    next_price = prices.get(next_contract, 0)
+    
+    # Missing previous close falls back to the current price (zero change)
+    current_prev = prev_closes.get(current_contract, current_price)
+    next_prev = prev_closes.get(next_contract, next_price)
+    
+    current_change = ((current_price - current_prev) / current_prev) * 100 if current_prev > 0 else 0
+    next_change = ((next_price - next_prev) / next_prev) * 100 if next_prev > 0 else 0
+    
+    # change difference in rs = current month (Current Price - Previous Close) - next month (Current Price - Previous Close)
+    current_change_rupees = current_price - current_prev
+    next_change_rupees = next_price - next_prev
+    price_difference = current_change_rupees - next_change_rupees
+    
+    return SpreadSnapshot(
+        timestamp=timestamp,
+        commodity=commodity,
+        current_contract=current_contract,
+        next_contract=next_contract,
+        current_price=current_price,
+        next_price=next_price,
+        current_prev_close=current_prev,
+        next_prev_close=next_prev,
+        current_change=current_change,
+        next_change=next_change,
+        current_change_rupees=current_change_rupees,
+        next_change_rupees=next_change_rupees,
+        price_difference=price_difference,
+        total_sum=current_change + next_change,
+        relative_performance=next_change - current_change,
+    )
+
+
+class MarketDataHub:
+    """Fetch quotes once per tick and fan the same snapshot out to every subscriber"""
+
+    def __init__(self, fetch_quotes=None, prev_closes=None):
+        # fetch_quotes(["MCX:SYMBOL", ...]) -> kite.quote style dict
+        self.fetch_quotes = fetch_quotes
+        self.prev_closes = prev_closes if prev_closes is not None else {}
+        self.pairs = {}  # commodity -> (current_contract, next_contract)
+        self.subscribers = []
+        self.latest = None
+        self.full_quotes = {}  # tradingsymbol -> last full quote (LTP-only ticks keep the previous one)
+        self.full_quote_times = {}  # tradingsymbol -> time.time() the full quote arrived
+        self.fetch_count = 0
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+
+    def set_pair(self, commodity, current_contract, next_contract):
+        """Watch the current/next month pair for a commodity"""
+        with self.lock:
+            self.pairs[commodity] = (current_contract, next_contract)
+
+    def remove_pair(self, commodity):
+        """Stop watching a commodity"""
+        with self.lock:
+            self.pairs.pop(commodity, None)
+
+    def symbols(self):
+        """All tradingsymbols across watched pairs (each leg once)"""
+        with self.lock:
+            pairs = list(self.pairs.values())
+        symbols = []
+        for pair in pairs:
+            for symbol in pair:
+                if symbol not in symbols:
+                    symbols.append(symbol)
+        return symbols
+
+    def subscribe(self, callback):
+        """Register callback(snapshot) for every published tick"""
+        with self.lock:
+            if callback not in self.subscribers:
+                self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Remove a subscriber"""
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def quote_age(self, symbol, now=None):
+        """Seconds since the symbol's last full quote arrived, or None if there is none"""
+        received = self.full_quote_times.get(symbol)
+        if received is None:
+            return None
+        return (now or time.time()) - received
+
+    def poll(self, timestamp=None):
+        """Fetch all watched legs in one request and publish the snapshot (stamped with timestamp if given)"""
+        with self.fetch_lock:
+            return self._poll(timestamp)
+
+    def refresh(self, max_age):
+        """Return the latest snapshot, fetching only if it is older than max_age seconds"""
+        with self.fetch_lock:
+            latest = self.latest
+            if latest is not None and (time.time() - latest.timestamp) < max_age:
+                return latest
+            return self._poll()
+
+    def _poll(self, timestamp=None):
+        symbols = self.symbols()
+        if not symbols or self.fetch_quotes is None:
+            return None
+        
+        quote_data = self.fetch_quotes([f"MCX:{symbol}" for symbol in symbols])
+        self.fetch_count += 1
+        
+        prices = {}
+        for symbol in symbols:
+            quote = quote_data.get(f"MCX:{symbol}")
+            if quote is not None:
+                prices[symbol] = quote['last_price']
+                if 'ohlc' in quote:
+                    self.full_quotes[symbol] = quote
+                    self.full_quote_times[symbol] = time.time()
+        
+        return self.publish(prices, self.full_quotes, timestamp)
+
+    def publish(self, prices, quotes=None, timestamp=None):
+        """Build one immutable snapshot from prices and hand it to every subscriber"""
+        timestamp = timestamp or time.time()
+        
+        with self.lock:
+            pairs = dict(self.pairs)
+            subscribers = list(self.subscribers)
+        
+        spreads = {}
+        for commodity, (current_contract, next_contract) in pairs.items():
+            if current_contract in prices and next_contract in prices:
+                spreads[commodity] = build_spread_snapshot(
+                    commodity, current_contract, next_contract,
+                    prices, self.prev_closes, timestamp
+                )
+        
+        snapshot = MarketSnapshot(
+            timestamp=timestamp,
+            prices=MappingProxyType(dict(prices)),
+            quotes=MappingProxyType(dict(quotes or {})),
+            spreads=MappingProxyType(spreads),
+        )
+        self.latest = snapshot
+        
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error in market data subscriber: {e}")
+        
+        return snapshot
+
+
+class TieredQuoteFetcher:
+    """Fetch kite.ltp on the hot path and a full kite.quote at a lower cadence or on demand"""
+
+    def __init__(self, fetch_ltp, fetch_quote, full_quote_interval=300):
+        self.fetch_ltp = fetch_ltp
+        self.fetch_quote = fetch_quote
+        self.full_quote_interval = full_quote_interval  # seconds
+        self.last_full_time = 0.0
+        self.full_requested = False
+        self.ltp_count = 0
+        self.full_count = 0
+        self.lock = threading.Lock()
+
+    def request_full(self):
+        """Make the next fetch a full quote (e.g. a signal fired and the popup wants depth)"""
+        self.full_requested = True
+
+    def __call__(self, instruments):
+        with self.lock:
+            now = time.time()
+            full = self.full_requested or (now - self.last_full_time) >= self.full_quote_interval
+            if full:
+                self.full_requested = False
+                self.last_full_time = now
+
+        if full:
+            self.full_count += 1
+            return self.fetch_quote(instruments)
+        self.ltp_count += 1
+        return self.fetch_ltp(instruments)
+
+
+class TickerStream:
+    """Stream last prices for a set of contracts over KiteTicker"""
+
+    def __init__(self, api_key, access_token, symbol_tokens, on_prices,
+                 on_lost=None, on_status=None, root=None, mode="ltp"):
+        # symbol_tokens: {tradingsymbol: instrument_token}
+        self.api_key = api_key
+        self.access_token = access_token
+        self.symbol_tokens = dict(symbol_tokens)
+        self.token_symbols = {int(token): symbol for symbol, token in self.symbol_tokens.items()}
+        self.on_prices = on_prices
+        self.on_lost = on_lost
+        self.on_status = on_status
+        self.root = root
+        self.mode = mode
+
+        self.ticker = None
+        self.latest_prices = {}
+        self.last_tick_time = None
+        self.tick_count = 0
+        self.running = False
+        self.connected = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self, timeout=10):
+        """Connect and subscribe; returns True once the socket is open"""
+        if KiteTicker is None:
+            self._status("kiteconnect.KiteTicker not available")
+            return False
+
+        self.running = True
+        self.connected.clear()
+
+        self.ticker = KiteTicker(self.api_key, self.access_token, root=self.root,
+                                 reconnect_max_tries=10)
+        self.ticker.on_connect = self._on_connect
+        self.ticker.on_ticks = self._on_ticks
+        self.ticker.on_close = self._on_close
+        self.ticker.on_error = self._on_error
+        self.ticker.on_reconnect = self._on_reconnect
+        self.ticker.on_noreconnect = self._on_noreconnect
+
+        # Twisted reactor runs on its own daemon thread
+        self.ticker.connect(threaded=True)
+
+        if not self.connected.wait(timeout):
+            self._status(f"WebSocket did not connect within {timeout}s")
+            self.stop()
+            return False
+        return True
+
+    def stop(self):
+        """Close the socket without stopping the reactor (it cannot be restarted)"""
+        self.running = False
+        if self.ticker is not None:
+            try:
+                self.ticker.close()
+            except Exception as e:
+                print(f"Error closing ticker: {e}")
+            self.ticker = None
+
+    def is_connected(self):
+        """Check if the WebSocket is open"""
+        return self.ticker is not None and self.ticker.is_connected()
+
+    def _on_connect(self, ws, response):
+        tokens = list(self.token_symbols)
+        ws.subscribe(tokens)
+        ws.set_mode(self.mode, tokens)
+        self.connected.set()
+        self._status(f"WebSocket connected, subscribed to {len(tokens)} instruments")
+
+    def _on_ticks(self, ws, ticks):
+        if not self.running:
+            return
+
+        with self.lock:
+            for tick in ticks:
+                symbol = self.token_symbols.get(tick.get('instrument_token'))
+                if symbol is not None and tick.get('last_price') is not None:
+                    self.latest_prices[symbol] = tick['last_price']
+            self.last_tick_time = time.time()
+            self.tick_count += len(ticks)
+            prices = dict(self.latest_prices)
+
+        # Only push once every leg has a price
+        if len(prices) == len(self.symbol_tokens):
+            try:
+                self.on_prices(prices)
+            except Exception as e:
+                print(f"Error handling streamed prices: {e}")
+
+    def _on_close(self, ws, code, reason):
+        if self.running:
+            self._status(f"WebSocket closed ({code}): {reason}")
+
+    def _on_error(self, ws, code, reason):
+        self._status(f"WebSocket error ({code}): {reason}")
+
+    def _on_reconnect(self, ws, attempts_count):
+        self._status(f"WebSocket reconnecting (attempt {attempts_count})")
+
+    def _on_noreconnect(self, ws):
+        self._status("WebSocket gave up reconnecting")
+        was_running = self.running
+        self.running = False
+        if was_running and self.on_lost:
+            self.on_lost()
+
+    def _status(self, message):
+        if self.on_status:
+            self.on_status(message)
+        else:
+            print(message)
@@ -0,0 +1,136 @@
+"""
+MCX trading calendar.
+
+Sessions run Monday to Friday in two segments: morning 09:00-17:00 and
+evening 17:00-23:30 IST, with the evening close moving to 23:55 while the US
+is on standard time (first Sunday of November to the second Sunday of March).
+Exchange holidays come from mcx_holidays.json, where each date says whether
+the morning and/or evening segment trades (MCX often keeps the evening
+segment open on Indian holidays). Times are naive local datetimes; the app
+runs on an IST clock.
+"""
+import json
+import os
+from datetime import date, datetime, time, timedelta
+
+HOLIDAY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mcx_holidays.json')
+
+MORNING_OPEN = time(9, 0)
+MORNING_CLOSE = time(17, 0)
+EVENING_OPEN = time(17, 0)
+EVENING_CLOSE_US_DST = time(23, 30)
+EVENING_CLOSE_US_STANDARD = time(23, 55)
+
+
+def nth_sunday(year, month, n):
+    """Date of the nth Sunday of a month"""
+    first = date(year, month, 1)
+    first_sunday = first + timedelta(days=(6 - first.weekday()) % 7)
+    return first_sunday + timedelta(weeks=n - 1)
+
+
+def is_us_dst(day):
+    """US daylight saving: second Sunday of March up to the first Sunday of November"""
+    return nth_sunday(day.year, 3, 2) <= day < nth_sunday(day.year, 11, 1)
+
+
+def load_holidays(path=HOLIDAY_FILE):
+    """{date: (morning_open, evening_open)} from the holiday file"""
+    if not os.path.exists(path):
+        print(f"MCX holiday file {path} not found; treating every weekday as a trading day")
+        return {}
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    holidays = {}
+    for day_str, entry in data.get('holidays', {}).items():
+        holidays[date.fromisoformat(day_str)] = (bool(entry.get('morning', False)),
+                                                  bool(entry.get('evening', False)))
+    return holidays
+
+
+class MCXCalendar:
+    """Session hours, holidays and previous/next session lookups"""
+
+    def __init__(self, holidays=None):
+        self.holidays = load_holidays() if holidays is None else holidays
+        self._sessions = {}
+        self._previous = {}
+
+    def sessions(self, day):
+        """[(start, end)] trading segments of a day as datetimes, merged where contiguous"""
+        cached = self._sessions.get(day)
+        if cached is not None:
+            return cached
+
+        segments = []
+        if day.weekday() < 5:
+            morning_open, evening_open = self.holidays.get(day, (True, True))
+            evening_close = EVENING_CLOSE_US_DST if is_us_dst(day) else EVENING_CLOSE_US_STANDARD
+
+            if morning_open:
+                segments.append((datetime.combine(day, MORNING_OPEN), datetime.combine(day, MORNING_CLOSE)))
+            if evening_open:
+                start = datetime.combine(day, EVENING_OPEN)
+                end = datetime.combine(day, evening_close)
+                if segments and segments[-1][1] == start:
+                    segments[-1] = (segments[-1][0], end)
+                else:
+                    segments.append((start, end))
+
+        self._sessions[day] = segments
+        return segments
+
+    def is_trading_day(self, day):
+        """Check if any segment trades on a day"""
+        return bool(self.sessions(day))
+
+    def previous_session(self, day=None):
+        """Last trading day strictly before day (today by default)"""
+        day = day or date.today()
+        cached = self._previous.get(day)
+        if cached is not None:
+            return cached
+
+        session = day - timedelta(days=1)
+        for _ in range(366):
+            if self.is_trading_day(session):
+                break
+            session -= timedelta(days=1)
+
+        self._previous[day] = session
+        return session
+
+    def is_market_open(self, ts=None):
+        """Check if a timestamp (datetime or epoch seconds; now by default) falls inside a session"""
+        ts = self._as_datetime(ts)
+        return any(start <= ts < end for start, end in self.sessions(ts.date()))
+
+    def next_open(self, ts=None):
+        """Start of the next session at or after ts (ts itself when the market is open)"""
+        ts = self._as_datetime(ts)
+        day = ts.date()
+        for _ in range(366):
+            for start, end in self.sessions(day):
+                if start <= ts < end:
+                    return ts
+                if start > ts:
+                    return start
+            day += timedelta(days=1)
+        return None
+
+    def seconds_until_open(self, ts=None):
+        """Seconds until the next session opens (0 while open)"""
+        ts = self._as_datetime(ts)
+        next_start = self.next_open(ts)
+        if next_start is None:
+            return None
+        return max(0.0, (next_start - ts).total_seconds())
+
+    def _as_datetime(self, ts):
+        if ts is None:
+            return datetime.now()
+        if isinstance(ts, (int, float)):
+            return datetime.fromtimestamp(ts)
+        return ts
@@ -0,0 +1,251 @@
+"""
+Parallel parameter sweep for the Entry/Exit Settings.
+
+Backtests every combination of entry threshold, exit threshold, cooldown
+(minutes) and, optionally, a trigger_threshold entry confirmation: an ENTRY
+is only taken while next month beats current month by more than that %.
+Combinations come from a grid, or from a random sample of the grid
+(--random N). Signals are gated by the wall-clock cooldown being swept, not
+the hysteresis state machine.
+
+The history is loaded once and copied into one shared memory block. Worker
+processes map NumPy views onto it instead of each receiving a pickled copy,
+so per-task traffic is just the parameters and a result row, and throughput
+scales with the number of cores.
+
+Results are ranked in a CSV, the top rows are printed, and a heatmap of the
+best result per entry/exit pair is saved (needs matplotlib).
+
+Example:
+    python param_sweep.py --source journal --commodity GOLD --start 2026-09-01 --end 2026-09-30 \\
+        --entry-range=-4:-1:0.5 --exit-range=1:4:0.5 --cooldown-range=1,5,10,15 \\
+        --trigger-range 0.2:1:0.2 --multiplier 100 --workers 16
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import SpreadSeries, add_history_arguments, backtest, load_series
+from signal_engine import SignalConfig
+
+# SpreadSeries arrays stored as rows of one shared float64 block
+SHARED_FIELDS = SpreadSeries._fields[1:]
+
+RANK_METRICS = {
+    'pnl': 'total_pnl',
+    'hit_rate': 'hit_rate',
+    'pnl_to_drawdown': 'pnl_to_drawdown',
+}
+
+# Per worker process: the shared block and the series viewing it
+_worker = {}
+
+
+def parse_values(text, integer=False):
+    """'START:STOP:STEP' (inclusive) or 'A,B,C' -> list of values"""
+    cast = int if integer else float
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        if step <= 0:
+            raise ValueError(f"Step must be positive in {text}")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return [cast(round(start + i * step, 10)) for i in range(max(count, 0))]
+    return [cast(value) for value in text.split(',') if value.strip()]
+
+
+def build_combinations(entries, exits, cooldowns, triggers, sample=None, seed=None):
+    """Grid of (entry, exit, cooldown_minutes, trigger) with entry < exit, or a random sample of it"""
+    combinations = [combo for combo in itertools.product(entries, exits, cooldowns, triggers)
+                    if combo[0] < combo[1]]
+    if sample is not None and sample < len(combinations):
+        picks = np.random.default_rng(seed).choice(len(combinations), size=sample, replace=False)
+        combinations = [combinations[i] for i in sorted(picks)]
+    return combinations
+
+
+def share_series(series):
+    """Copy a SpreadSeries into a new shared memory block; returns (block, shape)"""
+    data = np.vstack([getattr(series, field) for field in SHARED_FIELDS])
+    block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    np.ndarray(data.shape, dtype=np.float64, buffer=block.buf)[:] = data
+    return block, data.shape
+
+
+def attach_series(name, shape, commodity, multiplier, cost):
+    """Pool initializer: view the shared history without copying it"""
+    block = shared_memory.SharedMemory(name=name)
+    arrays = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+    _worker.update(block=block, series=SpreadSeries(commodity, *arrays), multiplier=multiplier, cost=cost)
+
+
+def run_combination(combination):
+    """Backtest one (entry, exit, cooldown_minutes, trigger) on the worker's shared series"""
+    entry_threshold, exit_threshold, cooldown_minutes, trigger_threshold = combination
+    config = SignalConfig(entry_threshold, exit_threshold, cooldown_minutes * 60)
+    if trigger_threshold is not None:
+        config = config._replace(trigger_threshold=trigger_threshold)
+
+    result = backtest(_worker['series'], config, _worker['multiplier'], _worker['cost'],
+                      confirm_with_trigger=trigger_threshold is not None)
+    closed = sum(1 for trade in result.trades if not trade.is_open)
+    return {
+        'entry_threshold': entry_threshold,
+        'exit_threshold': exit_threshold,
+        'cooldown_minutes': cooldown_minutes,
+        'trigger_threshold': np.nan if trigger_threshold is None else trigger_threshold,
+        'total_pnl': result.total_pnl,
+        'trades': closed,
+        'open_trade': closed < len(result.trades),
+        'hit_rate': np.nan if result.hit_rate is None else result.hit_rate,
+        'max_drawdown': result.max_drawdown,
+        'pnl_to_drawdown': result.total_pnl / result.max_drawdown if result.max_drawdown > 0 else np.nan,
+        'signals': result.signals,
+    }
+
+
+def run_sweep(series, combinations, workers=None, multiplier=1.0, cost=0.0, progress=None):
+    """Backtest every combination across a process pool sharing the series; returns a DataFrame"""
+    workers = workers or os.cpu_count() or 1
+    block, shape = share_series(series)
+    try:
+        initargs = (block.name, shape, series.commodity, multiplier, cost)
+        # Enough chunks per worker to balance uneven runtimes, few enough to keep IPC negligible
+        chunksize = max(1, len(combinations) // (workers * 8))
+        rows = []
+        with Pool(processes=workers, initializer=attach_series, initargs=initargs) as pool:
+            for row in pool.imap_unordered(run_combination, combinations, chunksize=chunksize):
+                rows.append(row)
+                if progress:
+                    progress(len(rows), len(combinations))
+    finally:
+        block.close()
+        block.unlink()
+    return pd.DataFrame(rows)
+
+
+def rank_results(results, metric='pnl'):
+    """Sort best first by a RANK_METRICS key (ties by P&L)"""
+    column = RANK_METRICS[metric]
+    ranked = results.sort_values([column, 'total_pnl'], ascending=False, na_position='last', kind='stable')
+    ranked = ranked.reset_index(drop=True)
+    ranked.index += 1
+    ranked.index.name = 'rank'
+    return ranked
+
+
+def save_heatmap(results, path, metric='pnl', max_cells=25):
+    """Best metric per entry/exit pair over the other parameters (random sweeps are binned)"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed, skipping heatmap")
+        return False
+
+    column = RANK_METRICS[metric]
+    frame = results[['entry_threshold', 'exit_threshold', column]].copy()
+    for axis in ('entry_threshold', 'exit_threshold'):
+        if frame[axis].nunique() > max_cells:
+            frame[axis] = pd.cut(frame[axis], bins=12).apply(lambda interval: round(interval.mid, 2))
+    grid = frame.pivot_table(index='exit_threshold', columns='entry_threshold', values=column,
+                             aggfunc='max', observed=True).sort_index(ascending=False)
+
+    fig, ax = plt.subplots(figsize=(max(6, grid.shape[1] * 0.7), max(4.5, grid.shape[0] * 0.5)))
+    image = ax.imshow(grid.to_numpy(dtype=float), cmap='RdYlGn', aspect='auto')
+    ax.set_xticks(range(grid.shape[1]), [f"{value:g}" for value in grid.columns])
+    ax.set_yticks(range(grid.shape[0]), [f"{value:g}" for value in grid.index])
+    ax.set_xlabel("Entry threshold (₹)")
+    ax.set_ylabel("Exit threshold (₹)")
+    ax.set_title(f"Best {column} over cooldown / trigger")
+    fig.colorbar(image, ax=ax, label=column)
+
+    if grid.size <= 225:
+        for (row, col), value in np.ndenumerate(grid.to_numpy(dtype=float)):
+            if not np.isnan(value):
+                ax.text(col, row, f"{value:,.0f}" if abs(value) >= 10 else f"{value:.2f}",
+                        ha='center', va='center', fontsize=7)
+
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return True
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Parallel entry/exit threshold and cooldown sweep")
+    add_history_arguments(parser)
+    parser.add_argument('--entry-range', default="-4:-0.5:0.5", help="entry thresholds, e.g. --entry-range=-4:-1:0.5 or A,B,C")
+    parser.add_argument('--exit-range', default="0.5:4:0.5", help="exit thresholds, START:STOP:STEP or A,B,C")
+    parser.add_argument('--cooldown-range', default="1,2,5,10,15", help="cooldowns in whole minutes")
+    parser.add_argument('--trigger-range', help="trigger_threshold %% values for entry confirmation (off by default)")
+    parser.add_argument('--random', type=int, metavar='N', help="backtest a random sample of N combinations")
+    parser.add_argument('--seed', type=int, help="random sample seed")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--rank-by', choices=sorted(RANK_METRICS), default='pnl')
+    parser.add_argument('--top', type=int, default=15, help="rows to print")
+    parser.add_argument('--output', default="sweep_results.csv", help="ranked results CSV")
+    parser.add_argument('--heatmap', default="sweep_heatmap.png", help="heatmap image ('' to skip)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        combinations = build_combinations(
+            parse_values(args.entry_range), parse_values(args.exit_range),
+            parse_values(args.cooldown_range, integer=True),
+            parse_values(args.trigger_range) if args.trigger_range else [None],
+            args.random, args.seed)
+    except ValueError as e:
+        print(f"Invalid range: {e}")
+        return 2
+    if not combinations:
+        print("No parameter combinations (entry must be below exit)")
+        return 2
+
+    try:
+        series = load_series(args)
+    except Exception as e:
+        print(f"Error loading history: {e}")
+        return 1
+    if not len(series.timestamps):
+        print("No history for that selection")
+        return 1
+    if args.trigger_range and np.isnan(series.relative_performances).all():
+        print("This history has no previous closes, so trigger confirmation cannot be swept")
+        return 2
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"Sweeping {len(combinations)} combinations over {len(series.timestamps)} ticks with {workers} workers")
+
+    step = max(1, len(combinations) // 10)
+
+    def progress(done, total):
+        if done % step == 0 or done == total:
+            print(f"  {done}/{total}")
+
+    started = time.perf_counter()
+    results = run_sweep(series, combinations, workers, args.multiplier, args.cost, progress)
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f} s ({len(combinations) / elapsed:.1f} backtests/s)")
+
+    ranked = rank_results(results, args.rank_by)
+    ranked.to_csv(args.output, float_format="%.6g")
+    print(f"Ranked results written to {args.output}")
+    with pd.option_context('display.width', 160, 'display.max_columns', None):
+        print(ranked.head(args.top).to_string(float_format=lambda value: f"{value:,.2f}"))
+
+    if args.heatmap and save_heatmap(ranked, args.heatmap, args.rank_by):
+        print(f"Heatmap saved to {args.heatmap}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Client-side rate limiting and call accounting for KiteConnect.
+
+RateLimitedKite wraps a KiteConnect instance so every REST call takes a token
+from its endpoint's bucket first (Kite allows 1 quote/ltp request per second,
+3 historical requests per second and 10 per second for everything else).
+Callers over budget wait for a token instead of being dropped, and identical
+requests already in flight share the leader's response instead of spending
+another token. KiteRateLimiter keeps per-endpoint counters and latencies for
+the Market Data tab.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# endpoint -> (requests per second, burst capacity)
+DEFAULT_LIMITS = {
+    'quote': (1.0, 1),
+    'historical': (3.0, 3),
+    'instruments': (10.0, 10),
+    'other': (10.0, 10),
+}
+
+# KiteConnect method -> endpoint bucket (quote, ohlc and ltp share Kite's quote limit)
+ENDPOINTS = {
+    'quote': 'quote',
+    'ltp': 'quote',
+    'ohlc': 'quote',
+    'historical_data': 'historical',
+    'instruments': 'instruments',
+}
+
+# Read-only methods whose identical concurrent calls can share one response
+COALESCED = {'quote', 'ltp', 'ohlc', 'historical_data', 'instruments', 'profile',
+             'margins', 'positions', 'holdings', 'orders', 'trades'}
+
+# Methods that never hit the API or must not be delayed
+PASSTHROUGH = {'login_url', 'set_access_token', 'set_session_expiry_hook'}
+
+
+class RateLimitExceeded(Exception):
+    """A call waited longer than max_wait for its endpoint budget"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, max_wait):
+        """Take one token, sleeping until one is available; returns seconds waited or None on timeout"""
+        start = time.monotonic()
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+
+            if waited + wait > max_wait:
+                return None
+            time.sleep(wait)
+            waited = time.monotonic() - start
+
+    def available(self):
+        """Tokens currently available"""
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+
+class EndpointStats:
+    """Call counters and a rolling latency window for one endpoint"""
+
+    def __init__(self, window=500):
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0   # calls that had to wait for a token
+        self.coalesced = 0   # calls served by an identical in-flight request
+        self.rejected = 0    # calls that gave up after max_wait
+        self.latencies = deque(maxlen=window)  # seconds, broker round trip only
+
+    def percentile(self, pct):
+        """Latency percentile in milliseconds (None before the first call)"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+
+class KiteRateLimiter:
+    """Per-endpoint buckets, in-flight request coalescing and call accounting"""
+
+    def __init__(self, limits=None, max_wait=10.0):
+        self.limits = dict(limits or DEFAULT_LIMITS)
+        self.max_wait = max_wait
+        self.buckets = {name: TokenBucket(rate, capacity) for name, (rate, capacity) in self.limits.items()}
+        self.stats = {name: EndpointStats() for name in self.limits}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def call(self, endpoint, key, func, *args, **kwargs):
+        """Run func through the endpoint's bucket, sharing the result of identical in-flight calls"""
+        stats = self.stats[endpoint]
+
+        with self.lock:
+            leader = self.in_flight.get(key)
+            if leader is None:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                stats.coalesced += 1
+
+        if leader is not None:
+            return leader.result()
+
+        try:
+            waited = self.buckets[endpoint].acquire(self.max_wait)
+            if waited is None:
+                stats.rejected += 1
+                raise RateLimitExceeded(f"{endpoint} budget exhausted for more than {self.max_wait:.0f}s")
+            if waited > 0:
+                stats.throttled += 1
+
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.calls += 1
+                stats.latencies.append(time.perf_counter() - start)
+
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def summary_lines(self):
+        """One line of counters per endpoint for display"""
+        lines = []
+        for name, stats in self.stats.items():
+            rate, capacity = self.limits[name]
+            p50, p95, p99 = (stats.percentile(pct) for pct in (50, 95, 99))
+            latency = (f"p50 {p50:.0f} / p95 {p95:.0f} / p99 {p99:.0f} ms"
+                       if p50 is not None else "p50 -- / p95 -- / p99 -- ms")
+            lines.append(
+                f"{name:<11} calls {stats.calls:>5}  err {stats.errors:>3}  "
+                f"waited {stats.throttled:>4}  coalesced {stats.coalesced:>4}  rejected {stats.rejected:>3}  "
+                f"{latency}  budget {self.buckets[name].available():.1f}/{capacity} @ {rate:g}/s"
+            )
+        return lines
+
+
+class RateLimitedKite:
+    """KiteConnect proxy: every API method goes through a KiteRateLimiter"""
+
+    def __init__(self, kite, limiter):
+        self._kite = kite
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._kite, name)
+        if not callable(attr) or name.startswith('_') or name in PASSTHROUGH:
+            return attr
+
+        endpoint = ENDPOINTS.get(name, 'other')
+
+        def limited(*args, **kwargs):
+            # Order placement etc. must never be merged with another call
+            key = (name, repr(args), repr(sorted(kwargs.items()))) if name in COALESCED else object()
+            return self._limiter.call(endpoint, key, attr, *args, **kwargs)
+
+        return limited
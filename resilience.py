@@ -0,0 +1,143 @@
+"""
+Broker connection resilience for the polling feed.
+
+Backoff gives jittered exponential retry delays, CircuitBreaker stops
+hammering the broker after repeated failures (the feed runs degraded until a
+trial call succeeds), and StaleDataWatchdog tracks the age of the last good
+tick so views can flag stale numbers and signals can be suppressed. Outage
+and recovery durations are recorded so reconnect behaviour can be measured.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+
+class Backoff:
+    """Exponential backoff with jitter: uniform(base / 2, min(cap, base * factor ** attempt))"""
+
+    def __init__(self, base=1.0, factor=2.0, cap=60.0):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self):
+        """Delay before the next retry; each call widens the window"""
+        ceiling = min(self.cap, self.base * (self.factor ** self.attempt))
+        self.attempt += 1
+        return random.uniform(self.base / 2, max(self.base / 2, ceiling))
+
+    def reset(self):
+        """Back to the shortest delay after a success"""
+        self.attempt = 0
+
+
+class CircuitBreaker:
+    """CLOSED -> OPEN after repeated failures; HALF_OPEN trial call after reset_timeout"""
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.outage_started = None
+        self.recovery_times = deque(maxlen=50)  # seconds from first failure to next success
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    @property
+    def degraded(self):
+        """True while the breaker is not fully closed"""
+        return self.state != self.CLOSED
+
+    def allow(self):
+        """Check if a call may go to the broker now (moves OPEN -> HALF_OPEN once the timeout passes)"""
+        with self.lock:
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            return self.state != self.OPEN
+
+    def seconds_until_retry(self):
+        """Seconds left before an OPEN breaker allows a trial call"""
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.time() - self.opened_at))
+
+    def record_success(self):
+        """Close the breaker; returns the outage duration if this ended one"""
+        with self.lock:
+            recovered = None
+            if self.outage_started is not None:
+                recovered = time.time() - self.outage_started
+                self.recovery_times.append(recovered)
+            self.state = self.CLOSED
+            self.failures = 0
+            self.outage_started = None
+            return recovered
+
+    def record_failure(self):
+        """Count a failure; returns True if this call tripped the breaker open"""
+        with self.lock:
+            now = time.time()
+            if self.outage_started is None:
+                self.outage_started = now
+            self.failures += 1
+
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and
+                                                 self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = now
+                self.trips += 1
+                return True
+            return False
+
+    def last_recovery(self):
+        """Duration of the most recent outage in seconds, or None"""
+        return self.recovery_times[-1] if self.recovery_times else None
+
+
+class StaleDataWatchdog:
+    """Age of the last good tick against a configurable limit"""
+
+    def __init__(self, max_age=10.0):
+        self.max_age = max_age
+        self.last_tick = None
+        self.stale_since = None
+        self.stale_periods = deque(maxlen=50)  # seconds each stale period lasted
+
+    def mark(self, timestamp=None):
+        """Record a good tick; returns how long the data had been stale, if it was"""
+        self.last_tick = timestamp or time.time()
+        if self.stale_since is not None:
+            stale_for = self.last_tick - self.stale_since
+            self.stale_since = None
+            self.stale_periods.append(stale_for)
+            return stale_for
+        return None
+
+    def age(self):
+        """Seconds since the last good tick (None before the first one)"""
+        if self.last_tick is None:
+            return None
+        return time.time() - self.last_tick
+
+    def is_stale(self):
+        """True once the last good tick is older than max_age (remembers when it went stale)"""
+        age = self.age()
+        if age is None or age <= self.max_age:
+            return False
+        if self.stale_since is None:
+            self.stale_since = self.last_tick + self.max_age
+        return True
+
+    def reset(self):
+        """Forget the last tick (monitoring stopped)"""
+        self.last_tick = None
+        self.stale_since = None
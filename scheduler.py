@@ -0,0 +1,181 @@
+"""
+Drift-free scheduling for the polling feed.
+
+AlignedScheduler fires on wall-clock boundaries that are multiples of the
+interval (every even second for 2 s), so request latency and UI dispatch never
+accumulate into drift. Slots that pass while a poll is still running are
+skipped rather than queued, and the achieved cadence, jitter, skipped slots
+and overruns are kept as metrics.
+
+AdaptiveCadence picks the next poll interval from how close each spread is
+to its entry/exit thresholds and how fast it has been moving: near a
+threshold or in a fast market it polls at the rate-limit floor, far away
+and quiet it backs off to the slow bound.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+
+class AlignedScheduler:
+    """Wait for the next interval-aligned wall-clock slot and record timing metrics"""
+
+    def __init__(self, interval=2.0, window=300):
+        self.interval = interval
+        self.wake_event = threading.Event()
+        self.last_slot = None
+        self.last_fire = None
+        self.fire_gaps = deque(maxlen=window)  # seconds between consecutive fires
+        self.jitters = deque(maxlen=window)    # seconds each fire landed after its slot
+        self.fires = 0
+        self.skipped = 0
+        self.overruns = 0
+
+    def set_interval(self, interval):
+        """Change the period; a sleeping wait_next() re-aligns immediately"""
+        if interval != self.interval:
+            self.interval = interval
+            self.last_slot = None
+            self.wake_event.set()
+
+    def wake(self):
+        """Interrupt a sleeping wait_next() (e.g. when the feed is stopping)"""
+        self.wake_event.set()
+
+    def wait_next(self):
+        """Sleep until the next aligned slot; returns the slot time, or None if woken early"""
+        now = time.time()
+        slot = math.floor(now / self.interval) * self.interval + self.interval
+
+        # Slots that went by while the previous poll ran are dropped, not replayed
+        if self.last_slot is not None:
+            missed = int(round((slot - self.last_slot) / self.interval)) - 1
+            if missed > 0:
+                self.skipped += missed
+
+        self.wake_event.clear()
+        if self.wake_event.wait(max(0.0, slot - time.time())):
+            return None
+
+        fired = time.time()
+        self.jitters.append(fired - slot)
+        if self.last_fire is not None:
+            self.fire_gaps.append(fired - self.last_fire)
+        self.last_fire = fired
+        self.last_slot = slot
+        self.fires += 1
+        return slot
+
+    def finish(self, slot):
+        """Mark the slot's work done; counts an overrun if it ran past the next slot"""
+        if slot is not None and time.time() > slot + self.interval:
+            self.overruns += 1
+
+    def cadence(self):
+        """Mean seconds between fires over the recent window"""
+        if not self.fire_gaps:
+            return None
+        return sum(self.fire_gaps) / len(self.fire_gaps)
+
+    def jitter_ms(self, pct=95):
+        """Jitter percentile in milliseconds over the recent window"""
+        if not self.jitters:
+            return None
+        ordered = sorted(self.jitters)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000
+
+    def summary(self):
+        """One-line metrics for display"""
+        cadence = self.cadence()
+        if cadence is None:
+            return f"Poll Cadence: -- (target {self.interval:g} s)"
+        return (f"Poll Cadence: {cadence:.3f} s (target {self.interval:g} s), "
+                f"jitter p50 {self.jitter_ms(50):.1f} / p95 {self.jitter_ms(95):.1f} ms, "
+                f"{self.skipped} skipped, {self.overruns} overruns")
+
+
+class AdaptiveCadence:
+    """Choose the poll interval from threshold proximity and realized spread volatility"""
+
+    def __init__(self, min_interval=1.0, max_interval=5.0, near_fraction=0.1, far_fraction=0.45,
+                 safety_polls=3, window=30, step=0.5):
+        self.min_interval = min_interval      # rate-limit floor
+        self.max_interval = max_interval      # quiet, far-from-threshold bound
+        self.near_fraction = near_fraction    # within this share of the entry/exit gap -> poll at the floor
+        self.far_fraction = far_fraction      # beyond this share (mid-band is 0.5) -> slow bound
+        self.safety_polls = safety_polls      # polls wanted before the spread can reach a threshold
+        self.step = step                      # intervals are rounded down to this step
+        self.history = {}                     # commodity -> deque of (timestamp, price_difference)
+        self.window = window
+        self.interval = max_interval
+        self.reason = "no data"
+
+    def observe(self, commodity, timestamp, price_difference):
+        """Record one tick of a commodity's spread"""
+        history = self.history.setdefault(commodity, deque(maxlen=self.window))
+        history.append((timestamp, price_difference))
+
+    def volatility(self, commodity):
+        """Mean absolute spread move in rupees per second over the recent window"""
+        history = self.history.get(commodity)
+        if not history or len(history) < 2:
+            return 0.0
+        elapsed = history[-1][0] - history[0][0]
+        if elapsed <= 0:
+            return 0.0
+        points = list(history)
+        moved = sum(abs(b[1] - a[1]) for a, b in zip(points, points[1:]))
+        return moved / elapsed
+
+    def interval_for(self, commodity, price_difference, entry_threshold, exit_threshold):
+        """(interval, distance to the nearest threshold, volatility) for one spread"""
+        if entry_threshold < price_difference < exit_threshold:
+            distance = min(price_difference - entry_threshold, exit_threshold - price_difference)
+        else:
+            distance = 0.0  # already in the signal zone
+
+        gap = max(exit_threshold - entry_threshold, 1e-9)
+        near, far = gap * self.near_fraction, gap * self.far_fraction
+        if distance <= near:
+            interval = self.min_interval
+        else:
+            share = min(1.0, (distance - near) / max(far - near, 1e-9))
+            interval = self.min_interval + (self.max_interval - self.min_interval) * share
+
+        # A fast-moving spread could cover the distance before the next few polls
+        volatility = self.volatility(commodity)
+        if volatility > 0:
+            interval = min(interval, distance / volatility / self.safety_polls)
+
+        interval = max(self.min_interval, min(self.max_interval, interval))
+        interval = max(self.min_interval, int(interval / self.step) * self.step)
+        return interval, distance, volatility
+
+    def update(self, spreads, thresholds, default_thresholds=(-2.0, 2.0)):
+        """
+        Observe a snapshot's spreads and return the interval for the next poll
+        (the fastest any watched commodity needs). A commodity whose thresholds
+        are None (bands not expressible in ₹) is polled at the floor.
+        """
+        chosen = None
+        for commodity, spread in spreads.items():
+            self.observe(commodity, spread.timestamp, spread.price_difference)
+            bands = thresholds.get(commodity, default_thresholds)
+            if bands is None:
+                # Distance to the signal is unknown, so never poll slower than the floor
+                interval, distance, volatility = self.min_interval, None, self.volatility(commodity)
+            else:
+                interval, distance, volatility = self.interval_for(commodity, spread.price_difference, *bands)
+            if chosen is None or interval < chosen[0]:
+                chosen = (interval, commodity, distance, volatility)
+
+        if chosen is None:
+            self.interval, self.reason = self.max_interval, "no data"
+        else:
+            self.interval = chosen[0]
+            if chosen[2] is None:
+                self.reason = f"{chosen[1]} thresholds not in ₹, polling at the floor"
+            else:
+                self.reason = f"{chosen[1]} ₹{chosen[2]:.2f} from threshold, moving ₹{chosen[3]:.3f}/s"
+        return self.interval
@@ -0,0 +1,531 @@
+"""
+Headless MCX spread signal daemon.
+
+Runs the month comparison monitor without Tkinter: one shared market data
+hub for every commodity, entry/exit and trigger signals from signal_engine, the same
+daily performance DB, intraday history and tick journal as the Tk app, and
+alerts to the log (plus an optional shell command). Suitable for a Linux
+server without a display; one process can watch many commodities.
+
+Examples:
+    python signal_daemon.py --commodity GOLD --commodity SILVER
+    python signal_daemon.py --commodity CRUDEOIL:-3:3:10 --source stream \\
+        --alert-command 'notify-send "$SIGNAL_TYPE $SIGNAL_COMMODITY"'
+
+Commodity specs are NAME[:ENTRY:EXIT[:COOLDOWN_MINUTES]]. Entry/exit is gated
+by the hysteresis state machine by default (--gating cooldown for the old
+behaviour); each commodity's state is saved in the signal_state table and
+resumed on restart. Contracts and previous closes are re-resolved when a
+new trading day starts, and a commodity whose pair rolled starts with a fresh
+engine. Credentials come from zerodha_credentials.json (written by the Tk
+app's login), or from --api-key/--access-token or KITE_API_KEY/KITE_ACCESS_TOKEN.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+try:
+    from kiteconnect import KiteConnect
+    from kiteconnect.exceptions import TokenException
+except ImportError:
+    print("Please install kiteconnect: pip install kiteconnect")
+    sys.exit(1)
+
+from instruments import InstrumentIndex, load_instrument_master
+from market_data import MarketDataHub, TickerStream, TieredQuoteFetcher
+from mcx_calendar import MCXCalendar
+from rate_limit import KiteRateLimiter, RateLimitedKite
+from resilience import Backoff, CircuitBreaker, StaleDataWatchdog
+from scheduler import AlignedScheduler
+from signal_engine import (DEFAULT_COOLDOWN, DEFAULT_DEBOUNCE, DEFAULT_ENTRY_THRESHOLD, DEFAULT_EXIT_THRESHOLD,
+                           DEFAULT_REARM_BAND, DEFAULT_TRIGGER_COOLDOWN, DEFAULT_TRIGGER_THRESHOLD, SIGNAL_GATINGS,
+                           SIGNAL_MODES, SignalConfig, SignalEngine, SignalState, smiley_status)
+from storage import (CREATE_DAILY_PERFORMANCE, CREATE_PREVIOUS_DAY_CLOSES, LATEST_PREVIOUS_CLOSE,
+                     SAVE_DAILY_PERFORMANCE, SAVE_PREVIOUS_CLOSE, TICK_JOURNAL_DIR, PerformanceStore,
+                     SignalStateStore, SpreadHistory, TickJournal)
+
+CREDENTIALS_FILE = 'zerodha_credentials.json'
+PREVIOUS_CLOSE_LOOKBACK_DAYS = 10  # daily candles searched back from the previous session
+
+log = logging.getLogger('signal_daemon')
+
+
+class SignalDaemon:
+    """Monitor current/next month spreads for several commodities and raise entry/exit alerts"""
+
+    def __init__(self, kite, engines, api_key=None, access_token=None, interval=2.0, stale_after=10.0,
+                 db_path="daily_performance.db", journal_dir=TICK_JOURNAL_DIR, alert_command=None,
+                 use_streaming=False, ticker_root=None):
+        self.kite = kite
+        self.engines = engines  # commodity -> SignalEngine
+        self.api_key = api_key
+        self.access_token = access_token
+        self.alert_command = alert_command
+        self.use_streaming = use_streaming
+        self.ticker_root = ticker_root  # WebSocket root override, e.g. a local fake_ticker.py
+
+        self.calendar = MCXCalendar()
+        self.store = PerformanceStore(db_path)
+        self.history = SpreadHistory(self.store)
+        self.signal_states = SignalStateStore(self.store, 'daemon')
+        self.journal = TickJournal(journal_dir)
+
+        self.session = None  # previous session the pairs and previous closes were resolved for
+        self.prev_closes = {}
+        self.fetcher = TieredQuoteFetcher(kite.ltp, kite.quote)
+        self.hub = MarketDataHub(fetch_quotes=self.fetcher, prev_closes=self.prev_closes)
+        self.index = None
+
+        self.scheduler = AlignedScheduler(interval)
+        self.backoff = Backoff(base=1.0, cap=60.0)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+        self.watchdog = StaleDataWatchdog(max_age=stale_after)
+
+        self.tick_stream = None
+        self.stream_lost = threading.Event()
+        self.stop_event = threading.Event()
+        self.stale_logged = False
+        self.tick_count = 0
+        self.signal_count = 0
+
+    def setup(self):
+        """Start storage, resolve contracts and previous closes, subscribe to the hub"""
+        self.store.start()
+        self.journal.start()
+        self.store.execute(CREATE_DAILY_PERFORMANCE)
+        self.store.execute(CREATE_PREVIOUS_DAY_CLOSES, wait=True)
+        self.history.create_tables()
+        self.signal_states.create_table()
+
+        self.session = self.calendar.previous_session(date.today())
+        self.load_instruments()
+        self.resolve_pairs()
+        self.load_previous_closes(self.hub.symbols())
+        self.hub.subscribe(self.on_snapshot)
+
+    def load_instruments(self):
+        instruments_df, from_cache = load_instrument_master(self.kite)
+        self.index = InstrumentIndex(instruments_df)
+        log.info("Loaded %d MCX instruments%s", len(instruments_df), " from cache" if from_cache else "")
+
+    def resolve_pairs(self):
+        """Current/next month futures per commodity; a commodity whose pair rolled starts a fresh engine"""
+        for commodity in list(self.engines):
+            futures = self.index.active_futures(commodity, date.today(), count=2)
+            if len(futures) < 2:
+                log.error("Skipping %s: need current and next month futures", commodity)
+                del self.engines[commodity]
+                self.hub.remove_pair(commodity)
+                continue
+            pair = (futures[0].tradingsymbol, futures[1].tradingsymbol)
+            previous = self.hub.pairs.get(commodity)
+            if pair == previous:
+                continue
+            if previous is not None:
+                # Hysteresis state, cooldowns and spread statistics belonged to the old contracts
+                log.info("%s rolled from %s vs %s", commodity, *previous)
+                self.engines[commodity] = SignalEngine(commodity, self.engines[commodity].config)
+            self.hub.set_pair(commodity, *pair)
+            log.info("%s: %s vs %s", commodity, *pair)
+            self.restore_signal_state(commodity, *pair)
+
+        if not self.engines:
+            raise RuntimeError("No commodity has a current/next month pair")
+
+    def session_changed(self):
+        """True once the previous session has moved on since pairs and closes were resolved"""
+        return self.calendar.previous_session(date.today()) != self.session
+
+    def roll_session(self):
+        """New trading day: re-resolve pairs and previous closes (only while no feed is running)"""
+        session = self.calendar.previous_session(date.today())
+        log.info("New session: previous closes move from %s to %s, re-resolving contracts", self.session, session)
+        try:
+            self.load_instruments()
+        except Exception as e:
+            log.error("Error reloading instruments, keeping the previous list: %s", e)
+        try:
+            self.resolve_pairs()
+            self.prev_closes.clear()
+            self.load_previous_closes(self.hub.symbols(), session)
+            # Price differences are now measured from new previous closes: re-warm the z-score / percentile
+            for engine in self.engines.values():
+                engine.statistics.reset()
+        except Exception as e:
+            log.error("Error rolling to the new session: %s", e)
+            return False
+        self.session = session
+        return True
+
+    def restore_signal_state(self, commodity, current_contract, next_contract):
+        """Resume a commodity's hysteresis state saved for the same contract pair"""
+        engine = self.engines[commodity]
+        if engine.config.gating != 'hysteresis':
+            return
+        try:
+            saved = self.signal_states.load(commodity, current_contract, next_contract)
+        except Exception as e:
+            log.error("Error loading %s signal state: %s", commodity, e)
+            return
+        if saved is not None:
+            state, armed, changed_at = saved
+            engine.state = SignalState(state=state, armed=armed, changed_at=changed_at)
+            log.info("%s: resuming signal state %s%s", commodity, state, "" if armed else " (disarmed)")
+
+    def load_previous_closes(self, symbols, session=None):
+        """Previous session closes: DB cache, then one quote (ohlc.close), then daily candles"""
+        session = session or self.session
+        today = date.today()
+
+        missing = []
+        for symbol in symbols:
+            rows = self.store.query(LATEST_PREVIOUS_CLOSE, (symbol, session.isoformat(), today.isoformat()))
+            if rows:
+                self.prev_closes[symbol] = rows[0][1]
+            else:
+                missing.append(symbol)
+
+        if missing:
+            quote_data = self.kite.quote([f"MCX:{symbol}" for symbol in missing])
+            still_missing = []
+            for symbol in missing:
+                close_price = ((quote_data.get(f"MCX:{symbol}") or {}).get('ohlc') or {}).get('close')
+                if close_price and close_price > 0:
+                    self.save_previous_close(symbol, session, close_price)
+                else:
+                    still_missing.append(symbol)
+            missing = still_missing
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(len(missing), 8)) as pool:
+                list(pool.map(lambda symbol: self.fetch_candle_close(symbol, session), missing))
+
+        for symbol in symbols:
+            if symbol not in self.prev_closes:
+                log.warning("No previous close for %s; its change will read as zero", symbol)
+
+    def fetch_candle_close(self, symbol, session):
+        """
+        Close of one contract's last daily candle on or before the previous session
+        (a ranged request, in case the holiday file is wrong or the leg did not trade that day)
+        """
+        try:
+            token = self.index.token(symbol)
+            from_date = session - timedelta(days=PREVIOUS_CLOSE_LOOKBACK_DAYS)
+            candles = self.kite.historical_data(instrument_token=token, from_date=from_date.strftime("%Y-%m-%d"),
+                                                to_date=session.strftime("%Y-%m-%d"), interval="day",
+                                                continuous=False)
+            for candle in reversed(candles or []):
+                candle_date = candle['date'].date() if isinstance(candle['date'], datetime) else candle['date']
+                if candle_date <= session:
+                    if candle_date != session:
+                        log.info("%s: no candle for %s, using the %s close", symbol, session, candle_date)
+                    self.save_previous_close(symbol, candle_date, candle['close'])
+                    break
+        except Exception as e:
+            log.error("Error fetching historical close for %s: %s", symbol, e)
+
+    def save_previous_close(self, symbol, session, close_price):
+        self.prev_closes[symbol] = close_price
+        self.store.execute(SAVE_PREVIOUS_CLOSE, (session, symbol, close_price))
+
+    def on_snapshot(self, snapshot):
+        """Persist every spread and evaluate its signal engine (feed thread)"""
+        stale_for = self.watchdog.mark(snapshot.timestamp)
+        if stale_for is not None:
+            log.info("Market data live again after %.1f s stale", stale_for)
+        self.tick_count += 1
+        poll_interval = self.scheduler.interval if self.tick_stream is None else None
+
+        for commodity, spread in snapshot.spreads.items():
+            try:
+                self.store.execute(SAVE_DAILY_PERFORMANCE, (
+                    date.today(), commodity, spread.current_contract, spread.next_contract,
+                    spread.current_price, spread.next_price, spread.current_change, spread.next_change,
+                    spread.relative_performance, smiley_status(spread.current_change, spread.next_change),
+                    spread.total_sum
+                ))
+                self.history.record(spread)
+                self.journal.append(spread, poll_interval)
+            except Exception as e:
+                log.error("Error persisting %s tick: %s", commodity, e)
+
+            engine = self.engines.get(commodity)
+            if engine is None:
+                continue
+            previous = engine.state
+            for fired in (engine.on_spread(spread), engine.on_trigger(spread)):
+                if fired is not None:
+                    self.alert(fired)
+            if (engine.state.state, engine.state.armed) != (previous.state, previous.armed):
+                self.signal_states.save(commodity, spread.current_contract, spread.next_contract,
+                                        engine.state.state, engine.state.armed, engine.state.changed_at)
+
+    def alert(self, fired):
+        """Log a signal and run the alert command with the signal in its environment"""
+        self.signal_count += 1
+        if fired.signal_type == "TRIGGER":
+            log.warning("%s TRIGGER: next month %+.2f%% vs current (threshold %s%%) %s vs %s",
+                        fired.commodity, fired.relative_performance, fired.threshold,
+                        fired.current_contract, fired.next_contract)
+        else:
+            log.warning("%s %s SIGNAL: price difference %+.2f (threshold %s) %s vs %s",
+                        fired.commodity, fired.signal_type, fired.price_difference, fired.threshold,
+                        fired.current_contract, fired.next_contract)
+
+        # Fetch depth on the next poll, as the Tk popup does
+        self.fetcher.request_full()
+
+        if self.alert_command:
+            env = dict(os.environ,
+                       SIGNAL_TYPE=fired.signal_type,
+                       SIGNAL_COMMODITY=fired.commodity,
+                       SIGNAL_PRICE_DIFFERENCE=f"{fired.price_difference:+.2f}",
+                       SIGNAL_RELATIVE_PERFORMANCE=f"{fired.relative_performance:+.2f}",
+                       SIGNAL_THRESHOLD=str(fired.threshold),
+                       SIGNAL_CURRENT_CONTRACT=fired.current_contract,
+                       SIGNAL_NEXT_CONTRACT=fired.next_contract,
+                       SIGNAL_TIME=datetime.fromtimestamp(fired.timestamp).isoformat(timespec='seconds'))
+            try:
+                subprocess.Popen(self.alert_command, shell=True, env=env)
+            except Exception as e:
+                log.error("Alert command failed: %s", e)
+
+    def run(self):
+        """Monitor until stop() (or a signal); streaming first when requested, polling otherwise"""
+        try:
+            self.setup()
+            while not self.stop_event.is_set():
+                if not self.wait_for_market_open():
+                    break
+                if self.session_changed() and not self.roll_session():
+                    self.stop_event.wait(self.backoff.next_delay())
+                    continue
+                if self.use_streaming and not self.stream_lost.is_set() and self.start_stream():
+                    while not self.stop_event.is_set() and not self.stream_lost.is_set():
+                        self.stop_event.wait(1.0)
+                        self.check_staleness()
+                        if self.session_changed():
+                            # Resubscribe with the new session's contracts after the roll
+                            self.stop_stream()
+                            break
+                    continue
+                self.poll()
+        finally:
+            self.shutdown()
+
+    def wait_for_market_open(self):
+        """Sleep through closed hours; returns False if stopped meanwhile"""
+        if not self.calendar.is_market_open():
+            log.info("MCX closed, sleeping until %s", f"{self.calendar.next_open():%a %d-%b %H:%M}")
+        while not self.stop_event.is_set():
+            wait = self.calendar.seconds_until_open()
+            if not wait:
+                return True
+            self.stop_event.wait(min(wait, 30))
+        return False
+
+    def start_stream(self):
+        symbol_tokens = {symbol: self.index.token(symbol) for symbol in self.hub.symbols()}
+        self.tick_stream = TickerStream(self.api_key, self.access_token, symbol_tokens,
+                                        on_prices=self.hub.publish, on_lost=self.on_stream_lost,
+                                        on_status=log.info, root=self.ticker_root)
+        if self.tick_stream.start():
+            return True
+        log.warning("Streaming unavailable, falling back to polling")
+        self.tick_stream = None
+        self.stream_lost.set()
+        return False
+
+    def stop_stream(self):
+        if self.tick_stream is not None:
+            self.tick_stream.stop()
+            self.tick_stream = None
+
+    def on_stream_lost(self):
+        log.warning("Tick stream lost, falling back to polling")
+        self.tick_stream = None
+        self.stream_lost.set()
+
+    def poll(self):
+        """Polling loop with aligned slots, backoff, circuit breaker and session re-validation"""
+        while not self.stop_event.is_set() and self.calendar.is_market_open() and not self.session_changed():
+            self.check_staleness()
+            if not self.breaker.allow():
+                self.stop_event.wait(min(1.0, self.breaker.seconds_until_retry()))
+                continue
+
+            slot = self.scheduler.wait_next()
+            if slot is None:
+                continue
+
+            try:
+                self.hub.poll(timestamp=slot)
+                self.scheduler.finish(slot)
+                recovered = self.breaker.record_success()
+                self.backoff.reset()
+                if recovered is not None:
+                    log.info("Broker feed recovered after %.1f s", recovered)
+            except Exception as e:
+                tripped = self.breaker.record_failure()
+                delay = self.backoff.next_delay()
+                log.error("Poll failed: %s (retry in %.1f s)", e, delay)
+                if tripped:
+                    log.error("Broker feed degraded, next trial in %.0f s", self.breaker.reset_timeout)
+                if tripped or isinstance(e, TokenException):
+                    self.revalidate_session()
+                self.stop_event.wait(delay)
+
+    def check_staleness(self):
+        """Log when the feed goes stale (signals only ever run on fresh snapshots)"""
+        stale = self.watchdog.is_stale()
+        if stale and not self.stale_logged:
+            log.warning("Market data stale (%.1f s old), no signals until it recovers", self.watchdog.age())
+        self.stale_logged = stale
+
+    def revalidate_session(self):
+        try:
+            self.kite.profile()
+            log.info("Session re-validated, broker reachable")
+        except TokenException as e:
+            log.error("Session expired or invalid: %s. Log in again from the Tk app.", e)
+        except Exception as e:
+            log.error("Session check failed: %s", e)
+
+    def stop(self):
+        """Ask run() to finish (safe from signal handlers)"""
+        self.stop_event.set()
+        self.scheduler.wake()
+
+    def shutdown(self):
+        self.stop_stream()
+        try:
+            self.journal.flush()
+            self.store.close()
+        except Exception as e:
+            log.error("Error closing storage: %s", e)
+        log.info("Stopped after %d ticks and %d signals", self.tick_count, self.signal_count)
+        for line in self.kite._limiter.summary_lines():
+            log.info("API %s", line)
+
+
+def parse_commodity(spec, defaults):
+    """NAME[:ENTRY:EXIT[:COOLDOWN_MINUTES]] -> SignalEngine (unspecified settings from defaults)"""
+    parts = spec.split(':')
+    commodity = parts[0].strip().upper()
+    config = defaults
+    if len(parts) > 1:
+        config = config._replace(entry_threshold=float(parts[1]))
+    if len(parts) > 2:
+        config = config._replace(exit_threshold=float(parts[2]))
+    if len(parts) > 3:
+        config = config._replace(cooldown=float(parts[3]) * 60)
+    return SignalEngine(commodity, config)
+
+
+def load_credentials(args):
+    """api_key / access_token from arguments, the environment or the Tk app's credentials file"""
+    api_key = args.api_key or os.environ.get('KITE_API_KEY')
+    access_token = args.access_token or os.environ.get('KITE_ACCESS_TOKEN')
+    if (not api_key or not access_token) and os.path.exists(args.credentials):
+        with open(args.credentials, 'r') as f:
+            creds = json.load(f)
+        api_key = api_key or creds.get('api_key')
+        access_token = access_token or creds.get('access_token')
+    return api_key, access_token
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless MCX current vs next month spread signal daemon")
+    parser.add_argument('--commodity', action='append', required=True, metavar='SPEC',
+                        help="NAME[:ENTRY:EXIT[:COOLDOWN_MINUTES]], repeat for more commodities")
+    parser.add_argument('--entry', type=float, default=DEFAULT_ENTRY_THRESHOLD, help="default entry threshold (₹)")
+    parser.add_argument('--exit', type=float, default=DEFAULT_EXIT_THRESHOLD, help="default exit threshold (₹)")
+    parser.add_argument('--cooldown', type=float, default=DEFAULT_COOLDOWN / 60, help="default cooldown (minutes)")
+    parser.add_argument('--trigger-threshold', type=float, default=DEFAULT_TRIGGER_THRESHOLD,
+                        help="performance trigger: next month better than current by this many %%")
+    parser.add_argument('--trigger-cooldown', type=float, default=DEFAULT_TRIGGER_COOLDOWN,
+                        help="performance trigger cooldown (seconds)")
+    parser.add_argument('--mode', choices=SIGNAL_MODES, default='rupees', help="signal on ₹, z-score or percentile bands")
+    parser.add_argument('--entry-z', type=float, default=-2.0, help="entry z-score band (zscore mode)")
+    parser.add_argument('--exit-z', type=float, default=2.0, help="exit z-score band (zscore mode)")
+    parser.add_argument('--entry-percentile', type=float, default=5.0, help="entry percentile band (percentile mode)")
+    parser.add_argument('--exit-percentile', type=float, default=95.0, help="exit percentile band (percentile mode)")
+    parser.add_argument('--gating', choices=SIGNAL_GATINGS, default='hysteresis',
+                        help="entry/exit gating: hysteresis state machine or wall-clock cooldown")
+    parser.add_argument('--rearm-band', type=float, default=DEFAULT_REARM_BAND,
+                        help="distance back past a band before the opposite signal arms (units of --mode)")
+    parser.add_argument('--debounce', type=int, default=DEFAULT_DEBOUNCE, help="consecutive ticks beyond a band")
+    parser.add_argument('--interval', type=float, default=2.0, help="poll interval in seconds (min 1)")
+    parser.add_argument('--source', choices=['poll', 'stream'], default='poll', help="market data source")
+    parser.add_argument('--ticker-root', default=os.environ.get('KITE_TICKER_ROOT'),
+                        help="WebSocket root for --source stream, e.g. ws://127.0.0.1:9000 (fake_ticker.py)")
+    parser.add_argument('--stale-after', type=float, default=10.0, help="seconds before data counts as stale")
+    parser.add_argument('--db', default="daily_performance.db", help="daily performance SQLite file")
+    parser.add_argument('--journal-dir', default=TICK_JOURNAL_DIR, help="tick journal directory")
+    parser.add_argument('--alert-command', help="shell command run on each signal (SIGNAL_* env vars)")
+    parser.add_argument('--credentials', default=CREDENTIALS_FILE, help="credentials JSON file")
+    parser.add_argument('--api-key', help="Kite API key")
+    parser.add_argument('--access-token', help="Kite access token")
+    parser.add_argument('--log-file', help="also log to this file")
+    parser.add_argument('--verbose', action='store_true', help="debug logging")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    handlers = [logging.StreamHandler()]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file))
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s", handlers=handlers)
+
+    api_key, access_token = load_credentials(args)
+    if not api_key or not access_token:
+        log.error("No Kite credentials: log in once from the Tk app or pass --api-key/--access-token")
+        return 2
+
+    defaults = SignalConfig(args.entry, args.exit, args.cooldown * 60, args.trigger_threshold, args.trigger_cooldown,
+                            args.mode, args.entry_z, args.exit_z, args.entry_percentile, args.exit_percentile,
+                            args.gating, args.rearm_band, max(1, args.debounce))
+    try:
+        engines = {}
+        for spec in args.commodity:
+            engine = parse_commodity(spec, defaults)
+            engines[engine.commodity] = engine
+    except ValueError as e:
+        log.error("Invalid commodity spec: %s", e)
+        return 2
+
+    kite = RateLimitedKite(KiteConnect(api_key=api_key), KiteRateLimiter())
+    kite.set_access_token(access_token)
+    try:
+        profile = kite.profile()
+        log.info("Logged in as %s", profile.get('user_name'))
+    except Exception as e:
+        log.error("Login check failed: %s", e)
+        return 2
+
+    daemon = SignalDaemon(kite, engines, api_key=api_key, access_token=access_token,
+                          interval=max(1.0, args.interval), stale_after=args.stale_after,
+                          db_path=args.db, journal_dir=args.journal_dir,
+                          alert_command=args.alert_command, use_streaming=args.source == 'stream',
+                          ticker_root=args.ticker_root)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+
+    daemon.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
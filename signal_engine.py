@@ -0,0 +1,450 @@
+"""
+GUI-free entry/exit and performance-trigger signal logic for current vs next
+month spreads.
+
+The Tk app, the headless signal daemon and offline replays share these
+rules:
+- ENTRY when the price difference drops below the entry threshold and EXIT
+  when it rises above the exit threshold. A fired signal suppresses new ones
+  while less than `cooldown` seconds have elapsed.
+- TRIGGER when next month's % change beats current month's by more than
+  `trigger_threshold`. A fired trigger suppresses new ones until more than
+  `trigger_cooldown` seconds have elapsed.
+
+Entry/exit can also fire on bands of the spread's own statistics (see
+spread_stats): mode "zscore" compares the EWMA z-score with entry_z/exit_z,
+and mode "percentile" compares the rolling-window percentile rank with
+entry_percentile/exit_percentile. Unlike fixed rupees, both adapt to the
+spread's regime and price level.
+
+Instead of the wall-clock cooldown, entry/exit can be gated by a hysteresis
+state machine (gating "hysteresis"): FLAT -> ENTERED on an ENTRY, ENTERED ->
+EXITED on an EXIT. A signal needs `debounce` consecutive ticks beyond its
+band, and after firing the machine only arms for the opposite signal once
+the measure has moved back `rearm_band` past the band it just fired on. So
+an EXIT right after an ENTRY is never swallowed, and a spread oscillating
+around a band signals once.
+
+Every function takes its settings as a SignalConfig and its clock as an
+explicit timestamp. So one tick can be evaluated incrementally, or a whole
+NumPy array of ticks in one call, with identical decisions.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from spread_stats import SpreadStatistics
+
+DEFAULT_ENTRY_THRESHOLD = -2.0
+DEFAULT_EXIT_THRESHOLD = 2.0
+DEFAULT_COOLDOWN = 300  # seconds
+DEFAULT_TRIGGER_THRESHOLD = 0.5  # % next month better than current month
+DEFAULT_TRIGGER_COOLDOWN = 60  # seconds
+
+SIGNAL_MODES = ('rupees', 'zscore', 'percentile')
+SIGNAL_GATINGS = ('cooldown', 'hysteresis')
+DEFAULT_REARM_BAND = 0.5  # in the units of the mode
+DEFAULT_DEBOUNCE = 3      # consecutive ticks
+
+# Hysteresis states
+FLAT, ENTERED, EXITED = 'FLAT', 'ENTERED', 'EXITED'
+SIGNAL_STATES = (FLAT, ENTERED, EXITED)
+
+# Hysteresis position: armed for the next signal, consecutive ticks beyond each band, last transition time
+SignalState = namedtuple('SignalState', ['state', 'armed', 'entry_streak', 'exit_streak', 'changed_at'],
+                         defaults=[FLAT, True, 0, 0, None])
+
+# One fired signal, with the spread that produced it
+Signal = namedtuple('Signal', [
+    'timestamp', 'commodity', 'signal_type', 'price_difference', 'threshold',
+    'current_contract', 'next_contract', 'relative_performance',
+])
+
+
+class SignalConfig(namedtuple('SignalConfig', [
+        'entry_threshold', 'exit_threshold', 'cooldown', 'trigger_threshold', 'trigger_cooldown',
+        'mode', 'entry_z', 'exit_z', 'entry_percentile', 'exit_percentile',
+        'gating', 'rearm_band', 'debounce'],
+        defaults=[DEFAULT_ENTRY_THRESHOLD, DEFAULT_EXIT_THRESHOLD, DEFAULT_COOLDOWN,
+                  DEFAULT_TRIGGER_THRESHOLD, DEFAULT_TRIGGER_COOLDOWN,
+                  'rupees', -2.0, 2.0, 5.0, 95.0,
+                  'cooldown', DEFAULT_REARM_BAND, DEFAULT_DEBOUNCE])):
+    """Thresholds (₹ for entry/exit, % for the trigger), cooldowns in seconds, the entry/exit mode and gating"""
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, entry_threshold=None, exit_threshold=None, cooldown_minutes=None,
+              trigger_threshold=None, trigger_cooldown=None, mode=None, entry_z=None, exit_z=None,
+              entry_percentile=None, exit_percentile=None, gating=None, rearm_band=None, debounce=None):
+        """
+        Build from settings text (GUI fields, CLI arguments); omitted fields keep
+        their defaults. Raises ValueError if a given field does not parse.
+        """
+        config = cls()
+        if entry_threshold is not None:
+            config = config._replace(entry_threshold=float(entry_threshold))
+        if exit_threshold is not None:
+            config = config._replace(exit_threshold=float(exit_threshold))
+        if cooldown_minutes is not None:
+            config = config._replace(cooldown=int(cooldown_minutes) * 60)
+        if trigger_threshold is not None:
+            config = config._replace(trigger_threshold=float(trigger_threshold))
+        if trigger_cooldown is not None:
+            config = config._replace(trigger_cooldown=int(trigger_cooldown))
+        if mode is not None:
+            if mode not in SIGNAL_MODES:
+                raise ValueError(f"Unknown signal mode {mode}")
+            config = config._replace(mode=mode)
+        if entry_z is not None:
+            config = config._replace(entry_z=float(entry_z))
+        if exit_z is not None:
+            config = config._replace(exit_z=float(exit_z))
+        if entry_percentile is not None:
+            config = config._replace(entry_percentile=float(entry_percentile))
+        if exit_percentile is not None:
+            config = config._replace(exit_percentile=float(exit_percentile))
+        if gating is not None:
+            if gating not in SIGNAL_GATINGS:
+                raise ValueError(f"Unknown signal gating {gating}")
+            config = config._replace(gating=gating)
+        if rearm_band is not None:
+            config = config._replace(rearm_band=float(rearm_band))
+        if debounce is not None:
+            if int(debounce) < 1:
+                raise ValueError("Debounce must be at least 1 tick")
+            config = config._replace(debounce=int(debounce))
+        return config
+
+    def bands(self):
+        """(entry, exit) bands in the units of the mode"""
+        if self.mode == 'zscore':
+            return self.entry_z, self.exit_z
+        if self.mode == 'percentile':
+            return self.entry_percentile, self.exit_percentile
+        return self.entry_threshold, self.exit_threshold
+
+    def describe_band(self, signal_type):
+        """Human-readable condition for an ENTRY or EXIT in this mode"""
+        entry_band, exit_band = self.bands()
+        side, band = ("Less than", entry_band) if signal_type == "ENTRY" else ("More than", exit_band)
+        if self.mode == 'zscore':
+            return f"z-score {side.lower()} {band:+g}"
+        if self.mode == 'percentile':
+            return f"percentile {side.lower()} {band:g}"
+        return f"{side} {band}"
+
+
+def smiley_status(current_change, next_change):
+    """Classify next vs current month performance as POSITIVE/NEGATIVE/NEUTRAL"""
+    relative_performance = next_change - current_change
+    if next_change > 0 and current_change < 0:
+        return "POSITIVE"
+    elif relative_performance > 0.5:
+        return "POSITIVE"
+    elif relative_performance < -0.5:
+        return "NEGATIVE"
+    return "NEUTRAL"
+
+
+def evaluate_signal(price_difference, entry_threshold, exit_threshold):
+    """ENTRY below the entry threshold, EXIT above the exit threshold, otherwise None"""
+    if price_difference < entry_threshold:
+        return "ENTRY"
+    elif price_difference > exit_threshold:
+        return "EXIT"
+    return None
+
+
+def cooldown_active(last_trigger_time, cooldown, now, inclusive=False):
+    """
+    True while a previous signal still suppresses new ones: elapsed < cooldown,
+    or elapsed <= cooldown with inclusive (the performance trigger's rule)
+    """
+    if last_trigger_time is None:
+        return False
+    elapsed = now - last_trigger_time
+    return elapsed <= cooldown if inclusive else elapsed < cooldown
+
+
+def signal_measure(price_difference, config, stats=None):
+    """The value the mode compares with its bands: rupees, z-score or percentile (None before warm-up)"""
+    if config.mode == 'zscore':
+        return stats.zscore if stats is not None else None
+    if config.mode == 'percentile':
+        return stats.percentile if stats is not None else None
+    return price_difference
+
+
+def check_entry_exit(price_difference, config, last_trigger_time, now, stats=None):
+    """
+    Entry/exit decision for one tick at time now
+    stats is the tick's spread_stats.SpreadStats (needed by the zscore / percentile modes).
+    Returns: (should_trigger, signal_type, price_difference)
+    """
+    if cooldown_active(last_trigger_time, config.cooldown, now):
+        return False, None, price_difference
+    measure = signal_measure(price_difference, config, stats)
+    if measure is None:
+        return False, None, price_difference
+    signal_type = evaluate_signal(measure, *config.bands())
+    return signal_type is not None, signal_type, price_difference
+
+
+def advance_state(price_difference, config, state, now, stats=None):
+    """
+    One tick of the hysteresis state machine at time now, O(1)
+    Ticks without a measure (statistics not warmed up) leave the state untouched.
+    Returns: (new SignalState, "ENTRY"/"EXIT" or None)
+    """
+    state = state or SignalState()
+    measure = signal_measure(price_difference, config, stats)
+    if measure is None:
+        return state, None
+
+    entry_band, exit_band = config.bands()
+    entry_streak = state.entry_streak + 1 if measure < entry_band else 0
+    exit_streak = state.exit_streak + 1 if measure > exit_band else 0
+    status, armed, changed_at = state.state, state.armed, state.changed_at
+    signal_type = None
+
+    if status == ENTERED:
+        armed = armed or measure >= entry_band + config.rearm_band
+        if armed and exit_streak >= config.debounce:
+            status, armed, changed_at, signal_type = EXITED, False, now, "EXIT"
+    else:
+        armed = armed or measure <= exit_band - config.rearm_band
+        if armed and entry_streak >= config.debounce:
+            status, armed, changed_at, signal_type = ENTERED, False, now, "ENTRY"
+
+    return SignalState(status, armed, entry_streak, exit_streak, changed_at), signal_type
+
+
+def check_trigger(current_change, next_change, config, last_trigger_time, now):
+    """
+    Performance trigger for one tick: next month better than current by more than the threshold
+    Returns: (should_trigger, difference)
+    """
+    difference = next_change - current_change
+    if difference > config.trigger_threshold:
+        if not cooldown_active(last_trigger_time, config.trigger_cooldown, now, inclusive=True):
+            return True, difference
+    return False, difference
+
+
+def _first_ready(times, start, last_trigger_time, cooldown, inclusive):
+    """First position >= start whose time is out of cooldown (binary search, then the exact rule)"""
+    position = max(start, int(np.searchsorted(times, last_trigger_time + cooldown,
+                                              side='right' if inclusive else 'left')))
+    # Float rounding can put the search one tick off the exact elapsed comparison
+    while position > start and not cooldown_active(last_trigger_time, cooldown, times[position - 1], inclusive):
+        position -= 1
+    while position < len(times) and cooldown_active(last_trigger_time, cooldown, times[position], inclusive):
+        position += 1
+    return position
+
+
+def apply_cooldown(timestamps, candidates, cooldown, last_trigger_time=None, inclusive=False):
+    """
+    Which candidate ticks fire once every fired tick restarts the cooldown
+    timestamps must be non-decreasing; candidates is a boolean mask of the same length.
+    Jumps from one fired tick to the next with a binary search, so the cost
+    grows with the number of signals rather than the number of ticks.
+    Returns: (fired mask, last_trigger_time)
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    fired = np.zeros(len(timestamps), dtype=bool)
+    index = np.flatnonzero(candidates)
+    times = timestamps[index]
+
+    position = 0
+    if last_trigger_time is not None:
+        position = _first_ready(times, 0, last_trigger_time, cooldown, inclusive)
+    while position < len(index):
+        fired[index[position]] = True
+        last_trigger_time = float(times[position])
+        position = _first_ready(times, position + 1, last_trigger_time, cooldown, inclusive)
+    return fired, last_trigger_time
+
+
+def _streaks(zone, initial):
+    """Consecutive True ticks up to each position of zone, the first run continuing initial"""
+    positions = np.arange(len(zone))
+    last_break = np.maximum.accumulate(np.where(zone, -1, positions)) if len(zone) else positions
+    return np.where(zone, np.where(last_break < 0, positions + 1 + initial, positions - last_break), 0)
+
+
+def _first_at(indices, start):
+    """First of the sorted indices >= start, or None"""
+    position = int(np.searchsorted(indices, start))
+    return int(indices[position]) if position < len(indices) else None
+
+
+def apply_hysteresis(measures, timestamps, config, state=None, confirm_entries=None):
+    """
+    Vectorized advance_state over a series of measures (NaN where there is none)
+    Debounce streaks and re-arm levels are masks computed in one pass; the state
+    machine then jumps between transitions with binary searches, so the cost
+    grows with the number of signals rather than the number of ticks.
+    Returns: (fired mask, signal types, final SignalState)
+    """
+    state = state or SignalState()
+    measures = np.asarray(measures, dtype=float)
+    fired = np.zeros(len(measures), dtype=bool)
+    signal_types = np.full(len(measures), None, dtype=object)
+
+    # Ticks without a measure do not exist for the state machine
+    valid = np.flatnonzero(~np.isnan(measures))
+    values = measures[valid]
+    entry_band, exit_band = config.bands()
+    entry_zone = values < entry_band
+    if confirm_entries is not None:
+        entry_zone &= np.asarray(confirm_entries, dtype=bool)[valid]
+    entry_streaks = _streaks(entry_zone, state.entry_streak)
+    exit_streaks = _streaks(values > exit_band, state.exit_streak)
+    entry_ready = np.flatnonzero(entry_streaks >= config.debounce)
+    exit_ready = np.flatnonzero(exit_streaks >= config.debounce)
+    rearm_exit = np.flatnonzero(values >= entry_band + config.rearm_band)
+    rearm_entry = np.flatnonzero(values <= exit_band - config.rearm_band)
+
+    status, armed, changed_at = state.state, state.armed, state.changed_at
+    position = 0
+    while True:
+        entered = status == ENTERED
+        if not armed:
+            position = _first_at(rearm_exit if entered else rearm_entry, position)
+            if position is None:
+                break
+            armed = True
+        position = _first_at(exit_ready if entered else entry_ready, position)
+        if position is None:
+            break
+        tick = valid[position]
+        fired[tick] = True
+        signal_types[tick] = "EXIT" if entered else "ENTRY"
+        status, armed, changed_at = (EXITED if entered else ENTERED), False, float(timestamps[tick])
+        position += 1
+
+    if len(values):
+        state = SignalState(status, armed, int(entry_streaks[-1]), int(exit_streaks[-1]), changed_at)
+    return fired, signal_types, state
+
+
+def evaluate_signals(price_differences, timestamps, config, last_trigger_time=None, confirm_entries=None,
+                     stats=None, state=None):
+    """
+    Vectorized check_entry_exit over a series of ticks, each fired signal starting the cooldown
+    (or advance_state when config.gating is "hysteresis", continuing from state)
+    confirm_entries optionally masks which ticks may raise an ENTRY (others are not signals at all).
+    stats holds per-tick arrays from spread_stats.replay_statistics for the zscore / percentile modes.
+    Returns: (fired mask, signal types as an object array of "ENTRY"/"EXIT"/None,
+              last_trigger_time, or the final SignalState under hysteresis)
+    """
+    if config.mode != 'rupees' and stats is None:
+        raise ValueError(f"{config.mode} mode needs per-tick statistics (spread_stats.replay_statistics)")
+    measures = np.asarray(signal_measure(price_differences, config, stats), dtype=float)
+    if config.gating == 'hysteresis':
+        return apply_hysteresis(measures, timestamps, config, state, confirm_entries)
+
+    entry_band, exit_band = config.bands()
+    # NaN (not warmed up) compares False, like None in the scalar path
+    entries = measures < entry_band
+    if confirm_entries is not None:
+        entries &= confirm_entries
+    exits = measures > exit_band
+    fired, last_trigger_time = apply_cooldown(timestamps, entries | exits, config.cooldown, last_trigger_time)
+    signal_types = np.where(fired & entries, "ENTRY", np.where(fired & exits, "EXIT", None))
+    return fired, signal_types, last_trigger_time
+
+
+def evaluate_triggers(current_changes, next_changes, timestamps, config, last_trigger_time=None):
+    """
+    Vectorized check_trigger over a series of ticks, each fired trigger starting its cooldown
+    Returns: (fired mask, differences, last_trigger_time)
+    """
+    differences = np.asarray(next_changes, dtype=float) - np.asarray(current_changes, dtype=float)
+    fired, last_trigger_time = apply_cooldown(timestamps, differences > config.trigger_threshold,
+                                              config.trigger_cooldown, last_trigger_time, inclusive=True)
+    return fired, differences, last_trigger_time
+
+
+class SignalEngine:
+    """Per-commodity signal state: the last entry/exit and trigger times (or hysteresis state) under one SignalConfig"""
+
+    def __init__(self, commodity, config=None, statistics=None, state=None):
+        self.commodity = commodity
+        self.config = config or SignalConfig()
+        self.statistics = statistics or SpreadStatistics()
+        self.state = state or SignalState()
+        self.last_trigger_time = None
+        self.last_performance_trigger_time = None
+        self.last_signal = None
+
+    def check(self, price_difference, now, stats=None):
+        """(should_trigger, signal_type, price_difference) without recording a trigger"""
+        if self.config.gating == 'hysteresis':
+            _, signal_type = advance_state(price_difference, self.config, self.state, now, stats)
+            return signal_type is not None, signal_type, price_difference
+        return check_entry_exit(price_difference, self.config, self.last_trigger_time, now, stats)
+
+    def check_trigger(self, current_change, next_change, now):
+        """(should_trigger, difference) without recording a trigger"""
+        return check_trigger(current_change, next_change, self.config, self.last_performance_trigger_time, now)
+
+    def mute(self, now):
+        """Restart the entry/exit cooldown without a signal"""
+        self.last_trigger_time = now
+
+    def on_spread(self, spread):
+        """Entry/exit for one SpreadSnapshot; returns a Signal (and starts the cooldown) or None"""
+        stats = self.statistics.update(spread.timestamp, spread.price_difference)
+        if self.config.gating == 'hysteresis':
+            self.state, signal_type = advance_state(spread.price_difference, self.config, self.state,
+                                                    spread.timestamp, stats)
+            should_trigger = signal_type is not None
+        else:
+            should_trigger, signal_type, _ = self.check(spread.price_difference, spread.timestamp, stats)
+        if not should_trigger:
+            return None
+
+        self.last_trigger_time = spread.timestamp
+        entry_band, exit_band = self.config.bands()
+        threshold = entry_band if signal_type == "ENTRY" else exit_band
+        self.last_signal = self._signal(spread, signal_type, threshold)
+        return self.last_signal
+
+    def on_trigger(self, spread):
+        """Performance trigger for one SpreadSnapshot; returns a TRIGGER Signal or None"""
+        should_trigger, _ = self.check_trigger(spread.current_change, spread.next_change, spread.timestamp)
+        if not should_trigger:
+            return None
+
+        self.last_performance_trigger_time = spread.timestamp
+        return self._signal(spread, "TRIGGER", self.config.trigger_threshold)
+
+    def evaluate(self, price_differences, timestamps, stats=None):
+        """Vectorized on_spread over arrays of ticks (continues from and updates the cooldown or hysteresis state)"""
+        if self.config.gating == 'hysteresis':
+            fired, signal_types, self.state = evaluate_signals(
+                price_differences, timestamps, self.config, stats=stats, state=self.state)
+        else:
+            fired, signal_types, self.last_trigger_time = evaluate_signals(
+                price_differences, timestamps, self.config, self.last_trigger_time, stats=stats)
+        return fired, signal_types
+
+    def evaluate_triggers(self, current_changes, next_changes, timestamps):
+        """Vectorized on_trigger over arrays of ticks"""
+        fired, differences, self.last_performance_trigger_time = evaluate_triggers(
+            current_changes, next_changes, timestamps, self.config, self.last_performance_trigger_time)
+        return fired, differences
+
+    def _signal(self, spread, signal_type, threshold):
+        return Signal(
+            timestamp=spread.timestamp,
+            commodity=self.commodity,
+            signal_type=signal_type,
+            price_difference=spread.price_difference,
+            threshold=threshold,
+            current_contract=spread.current_contract,
+            next_contract=spread.next_contract,
+            relative_performance=spread.relative_performance,
+        )
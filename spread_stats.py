@@ -0,0 +1,278 @@
+"""
+Streaming statistics for the calendar spread (price difference).
+
+SpreadStatistics updates per tick without rescanning history:
+- EWMA mean and variance with a half-life in seconds, so irregular poll
+  intervals (adaptive cadence, streaming) weight ticks by elapsed time.
+- Rolling-window minimum and maximum from monotonic deques: amortized O(1).
+- Rolling median and the percentile rank of each new value from a sorted
+  container: O(log n). It is sortedcontainers.SortedList when installed,
+  otherwise a bisect-maintained list.
+
+The z-score and percentile of a tick are measured against the statistics
+before that tick is added, so a value never dilutes its own signal.
+
+A gap of more than max_gap seconds (a few half-lives by default: overnight,
+or a feed outage) starts the statistics afresh, as does reset() on a new
+session: the pre-gap mean is decayed to nothing and measured from other
+previous closes, so z-scores and percentiles wait for min_samples new ticks.
+
+replay_statistics computes the same per-tick values for a whole series at
+once (backtests and sweeps) without the per-tick Python loop.
+"""
+import bisect
+import math
+import threading
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:
+    SortedList = None
+
+DEFAULT_HALFLIFE = 900.0  # seconds
+DEFAULT_WINDOW = 1800.0   # seconds
+DEFAULT_MIN_SAMPLES = 30
+DEFAULT_MAX_GAP_HALFLIVES = 4.0  # a longer gap between ticks re-warms the statistics
+_DECAY_BLOCK = 256  # half-lives per rescaling block in replay_statistics (2 ** 256 stays finite)
+
+# Statistics after one tick (count is ticks since the last re-warm; z-score / percentile are None until warmed up)
+SpreadStats = namedtuple('SpreadStats', [
+    'timestamp', 'value', 'count', 'mean', 'std', 'zscore',
+    'minimum', 'maximum', 'median', 'percentile',
+])
+
+
+class _BisectList:
+    """Minimal SortedList stand-in (O(n) insert/remove, fine for a few thousand values)"""
+
+    def __init__(self):
+        self.values = []
+
+    def add(self, value):
+        bisect.insort(self.values, value)
+
+    def remove(self, value):
+        del self.values[bisect.bisect_left(self.values, value)]
+
+    def bisect_left(self, value):
+        return bisect.bisect_left(self.values, value)
+
+    def bisect_right(self, value):
+        return bisect.bisect_right(self.values, value)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class SpreadStatistics:
+    """EWMA mean/variance plus time-window min/max/median/percentile for one spread"""
+
+    def __init__(self, halflife=DEFAULT_HALFLIFE, window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES,
+                 max_gap=None):
+        self.halflife = halflife
+        self.window = window
+        self.min_samples = min_samples
+        self.max_gap = max_gap if max_gap is not None else DEFAULT_MAX_GAP_HALFLIVES * halflife
+        self.lock = threading.Lock()
+        self._clear()
+
+    def reset(self):
+        """Forget all history (e.g. on a new session); the next min_samples ticks warm up again"""
+        with self.lock:
+            self._clear()
+
+    def _clear(self):
+        self.count = 0
+        self.mean = None
+        self.variance = 0.0
+        self.last_timestamp = None
+        self.values = deque()       # (timestamp, value) inside the window
+        self.minima = deque()       # increasing values: front is the window minimum
+        self.maxima = deque()       # decreasing values: front is the window maximum
+        self.ordered = SortedList() if SortedList is not None else _BisectList()
+        self.latest = None
+
+    def update(self, timestamp, value):
+        """Add one tick; returns its SpreadStats"""
+        with self.lock:
+            if self.last_timestamp is not None and timestamp - self.last_timestamp > self.max_gap:
+                self._clear()
+            self._expire(timestamp - self.window)
+            zscore = self._zscore(value)
+            percentile = self._percentile(value)
+            self._update_ewma(timestamp, value)
+            self._add(timestamp, value)
+            self.count += 1
+
+            std = math.sqrt(self.variance)
+            size = len(self.ordered)
+            median = (self.ordered[size // 2] if size % 2
+                      else (self.ordered[size // 2 - 1] + self.ordered[size // 2]) / 2)
+            self.latest = SpreadStats(
+                timestamp=timestamp,
+                value=value,
+                count=self.count,
+                mean=self.mean,
+                std=std,
+                zscore=zscore,
+                minimum=self.minima[0][1],
+                maximum=self.maxima[0][1],
+                median=median,
+                percentile=percentile,
+            )
+            return self.latest
+
+    def _zscore(self, value):
+        if self.count < self.min_samples or self.variance <= 0:
+            return None
+        return (value - self.mean) / math.sqrt(self.variance)
+
+    def _percentile(self, value):
+        """Mid-rank of value among the window's values, 0-100"""
+        size = len(self.ordered)
+        if size < self.min_samples:
+            return None
+        below = self.ordered.bisect_left(value)
+        at_or_below = self.ordered.bisect_right(value)
+        return (below + at_or_below) / 2 / size * 100
+
+    def _update_ewma(self, timestamp, value):
+        if self.mean is None:
+            self.mean = value
+        else:
+            elapsed = max(0.0, timestamp - self.last_timestamp)
+            alpha = 1 - math.exp(-math.log(2) * elapsed / self.halflife)
+            delta = value - self.mean
+            self.mean += alpha * delta
+            self.variance = (1 - alpha) * (self.variance + alpha * delta * delta)
+        self.last_timestamp = timestamp
+
+    def _expire(self, cutoff):
+        """Drop values at or before cutoff from the window"""
+        while self.values and self.values[0][0] <= cutoff:
+            _, expired = self.values.popleft()
+            self.ordered.remove(expired)
+        while self.minima and self.minima[0][0] <= cutoff:
+            self.minima.popleft()
+        while self.maxima and self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+
+    def _add(self, timestamp, value):
+        self.values.append((timestamp, value))
+        self.ordered.add(value)
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((timestamp, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((timestamp, value))
+
+
+class _WindowIndexer(BaseIndexer):
+    """Rolling bounds given as arrays: row i aggregates values[start[i]:end[i]]"""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        return self.start, self.end
+
+
+def _decaying_sums(decays, inputs):
+    """
+    y[i] = y[i - 1] * 2 ** -decays[i] + inputs[i] (y[-1] = 0) with cumulative sums instead of a tick loop
+    Each y[i] is sum(inputs[k] * 2 ** -(elapsed[i] - elapsed[k])); the weights are rescaled per block of
+    _DECAY_BLOCK half-lives so 2 ** elapsed never overflows.
+    """
+    elapsed = np.cumsum(decays)
+    blocks = np.floor(elapsed / _DECAY_BLOCK)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(blocks)) + 1, [len(inputs)]))
+    sums = np.empty(len(inputs))
+    carry = 0.0
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        reference = elapsed[start]
+        carry *= np.exp2(-decays[start])
+        growth = np.exp2(elapsed[start:end] - reference)
+        sums[start:end] = (carry + np.cumsum(inputs[start:end] * growth)) / growth
+        carry = sums[end - 1]
+    return sums
+
+
+def replay_statistics(timestamps, values, halflife=DEFAULT_HALFLIFE, window=DEFAULT_WINDOW,
+                      min_samples=DEFAULT_MIN_SAMPLES, max_gap=None):
+    """
+    SpreadStatistics over arrays of ticks for offline evaluation, vectorized: the EWMA recurrences
+    as decaying cumulative sums, the window min/max/median/percentile as pandas rolling aggregations
+    over the same time windows, each stretch between re-warming gaps on its own. Matches
+    SpreadStatistics.update tick by tick (to float rounding); timestamps out of order replay
+    through SpreadStatistics itself.
+    Returns: SpreadStats whose fields are arrays (NaN where the live value is None)
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    values = np.asarray(values, dtype=float)
+    max_gap = max_gap if max_gap is not None else DEFAULT_MAX_GAP_HALFLIVES * halflife
+    if len(values) == 0 or np.any(np.diff(timestamps) < 0):
+        return _replay_ticks(timestamps, values, halflife, window, min_samples, max_gap)
+
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(timestamps) > max_gap) + 1, [len(values)]))
+    segments = [_replay_segment(timestamps[start:end], values[start:end], halflife, window, min_samples)
+                for start, end in zip(bounds[:-1], bounds[1:])]
+    return SpreadStats(*(np.concatenate(columns) for columns in zip(*segments)))
+
+
+def _replay_segment(timestamps, values, halflife, window, min_samples):
+    """replay_statistics for ticks with no re-warming gap between them"""
+    size = len(values)
+
+    # EWMA mean and variance after each tick, measured from the first value so that a spread
+    # that has not moved yet keeps exactly zero deltas and variance (as the live recurrence does)
+    decays = np.concatenate(([0.0], np.diff(timestamps) / halflife))
+    retained = np.exp(-math.log(2) * decays)
+    alpha = 1 - retained
+    offsets = values - values[0]
+    mean_offset = _decaying_sums(decays, alpha * offsets)
+    mean = values[0] + mean_offset
+    deltas = offsets - np.concatenate(([0.0], mean_offset[:-1]))
+    variance = _decaying_sums(decays, retained * alpha * deltas * deltas)
+    variance_before = np.concatenate(([0.0], variance[:-1]))
+
+    counts_before = np.arange(size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = np.where((counts_before >= min_samples) & (variance_before > 0),
+                          deltas / np.sqrt(variance_before), np.nan)
+
+    # Window of tick i: ticks after timestamps[i] - window, up to and including i
+    starts = np.searchsorted(timestamps, timestamps - window, side='right')
+    rolling = pd.Series(values).rolling(_WindowIndexer(start=starts, end=np.arange(1, size + 1)), min_periods=1)
+    in_window_before = counts_before - starts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Average rank among the window including the tick, less one: the mid-rank among the ticks before it
+        percentile = np.where(in_window_before >= min_samples,
+                              (rolling.rank(method='average').to_numpy() - 1) / in_window_before * 100, np.nan)
+
+    return SpreadStats(
+        timestamp=timestamps,
+        value=values,
+        count=np.arange(1, size + 1, dtype=float),
+        mean=mean,
+        std=np.sqrt(variance),
+        zscore=zscore,
+        minimum=rolling.min().to_numpy(),
+        maximum=rolling.max().to_numpy(),
+        median=rolling.median().to_numpy(),
+        percentile=percentile,
+    )
+
+
+def _replay_ticks(timestamps, values, halflife, window, min_samples, max_gap):
+    """replay_statistics one SpreadStatistics.update at a time"""
+    statistics = SpreadStatistics(halflife, window, min_samples, max_gap)
+    rows = [statistics.update(timestamp, value) for timestamp, value in zip(timestamps, values)]
+    columns = zip(*rows) if rows else [[] for _ in SpreadStats._fields]
+    return SpreadStats(*(np.array([np.nan if item is None else item for item in column], dtype=float)
+                         for column in columns))
@@ -0,0 +1,458 @@
+"""
+Persistence for the MCX month comparison monitor.
+
+TickJournal is an append-only CSV journal (one file per trading day under
+tick_journal/) of every spread tick. Rows are buffered in memory and written
+by a background thread, each stamped with the tick's own timestamp.
+
+PerformanceStore owns the daily performance SQLite database: one long-lived
+writer thread (WAL mode, cached prepared statements, commits batched by time
+or row count) and one shared read connection, so ticks never open, fsync and
+close the DB themselves.
+
+SpreadHistory keeps the intraday path in the same database: every raw tick
+(both legs and the price difference) plus 1/5/15-minute OHLC bars of the
+price difference, upserted per tick so a day's bars are a single indexed
+range query.
+
+SignalStateStore persists each monitor's entry/exit hysteresis state per
+commodity (FLAT/ENTERED/EXITED and whether it is armed) in the same
+database, so a restart resumes the position instead of starting FLAT.
+"""
+import csv
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+
+TICK_JOURNAL_DIR = 'tick_journal'
+
+JOURNAL_FIELDS = [
+    'timestamp', 'date', 'time', 'commodity', 'current_contract', 'next_contract',
+    'current_price', 'next_price', 'current_prev_close', 'next_prev_close', 'price_difference',
+    'poll_interval',
+]
+
+
+# Daily performance database schema and statements (shared by the Tk app and the signal daemon)
+CREATE_DAILY_PERFORMANCE = '''
+    CREATE TABLE IF NOT EXISTS daily_performance (
+        date DATE,
+        commodity TEXT,
+        current_month_contract TEXT,
+        next_month_contract TEXT,
+        current_month_close REAL,
+        next_month_close REAL,
+        current_performance REAL,
+        next_performance REAL,
+        relative_performance REAL,
+        smiley_status TEXT,
+        total_sum REAL,
+        PRIMARY KEY (date, commodity)
+    )
+'''
+
+CREATE_PREVIOUS_DAY_CLOSES = '''
+    CREATE TABLE IF NOT EXISTS previous_day_closes (
+        date DATE,
+        contract_symbol TEXT,
+        close_price REAL,
+        volume INTEGER,
+        PRIMARY KEY (date, contract_symbol)
+    )
+'''
+
+SAVE_DAILY_PERFORMANCE = '''
+    INSERT OR REPLACE INTO daily_performance
+    (date, commodity, current_month_contract, next_month_contract,
+     current_month_close, next_month_close, current_performance,
+     next_performance, relative_performance, smiley_status, total_sum)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SAVE_PREVIOUS_CLOSE = '''
+    INSERT OR REPLACE INTO previous_day_closes
+    (date, contract_symbol, close_price)
+    VALUES (?, ?, ?)
+'''
+
+# (contract, not_before, before) -> latest (date, close_price)
+LATEST_PREVIOUS_CLOSE = '''
+    SELECT date, close_price FROM previous_day_closes
+    WHERE contract_symbol = ? AND date >= ? AND date < ?
+    ORDER BY date DESC
+    LIMIT 1
+'''
+
+
+class TickJournal:
+    """Append-only, buffered CSV journal of spread ticks written from a background thread"""
+
+    def __init__(self, directory=TICK_JOURNAL_DIR, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.rows_written = 0
+        self.thread = None
+        self.file = None
+        self.file_day = None
+        self.writer = None
+
+    def start(self):
+        """Start the writer thread"""
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="tick-journal", daemon=True)
+            self.thread.start()
+
+    def append(self, spread, poll_interval=None):
+        """Queue one SpreadSnapshot with the poll interval that produced it (never blocks on disk I/O)"""
+        self.queue.put((spread, poll_interval))
+
+    def flush(self, timeout=5.0):
+        """Block until every queued row has been written and flushed"""
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def journal_path(self, day):
+        """Journal file for a trading day"""
+        return os.path.join(self.directory, f"ticks_{day:%Y-%m-%d}.csv")
+
+    def read_rows(self, day=None):
+        """Rows journaled for a day (today by default) as dicts"""
+        path = self.journal_path(day or date.today())
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', newline='') as f:
+            return list(csv.DictReader(f))
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            try:
+                if isinstance(item, threading.Event):
+                    self._flush_file()
+                    item.set()
+                    continue
+                if item is not None:
+                    self._write(*item)
+                if self.file and time.time() - last_flush >= self.flush_interval:
+                    self._flush_file()
+                    last_flush = time.time()
+            except Exception as e:
+                print(f"Error writing tick journal: {e}")
+
+    def _write(self, spread, poll_interval):
+        tick_time = datetime.fromtimestamp(spread.timestamp)
+        self._open_for(tick_time.date())
+        self.writer.writerow([
+            f"{spread.timestamp:.3f}", tick_time.date().isoformat(), tick_time.strftime('%H:%M:%S.%f')[:-3],
+            spread.commodity, spread.current_contract, spread.next_contract,
+            spread.current_price, spread.next_price, spread.current_prev_close, spread.next_prev_close,
+            round(spread.price_difference, 4), '' if poll_interval is None else poll_interval,
+        ])
+        self.rows_written += 1
+
+    def _open_for(self, day):
+        """Roll over to the day's journal file, writing a header for new files"""
+        if self.file_day == day and self.file is not None:
+            return
+        self._close_file()
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.journal_path(day)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='', buffering=64 * 1024)
+        self.writer = csv.writer(self.file)
+        self.file_day = day
+        if is_new:
+            self.writer.writerow(JOURNAL_FIELDS)
+
+    def _flush_file(self):
+        if self.file:
+            self.file.flush()
+
+    def _close_file(self):
+        if self.file:
+            self.file.close()
+        self.file = None
+        self.writer = None
+        self.file_day = None
+
+
+class PerformanceStore:
+    """Single-writer SQLite store with batched commits and a shared read connection"""
+
+    _STOP = object()
+
+    def __init__(self, path, commit_interval=2.0, commit_every=100):
+        self.path = path
+        self.commit_interval = commit_interval  # seconds a write may wait for its commit
+        self.commit_every = commit_every        # or commit once this many writes are pending
+        self.queue = queue.Queue()
+        self.thread = None
+        self.read_conn = None
+        self.read_lock = threading.Lock()
+        self.rows_written = 0
+        self.commit_count = 0
+
+    def start(self):
+        """Start the writer thread (opens the write connection on that thread)"""
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="performance-db", daemon=True)
+            self.thread.start()
+
+    def execute(self, sql, params=(), wait=False):
+        """
+        Queue one write. Returns a Future resolved once the write is committed,
+        and blocks on it (raising any DB error) when wait=True.
+        """
+        future = Future()
+        self.queue.put((sql, params, future))
+        if wait:
+            self.sync()
+            future.result()
+        return future
+
+    def sync(self, timeout=5.0):
+        """Commit everything queued so far and wait for it"""
+        future = Future()
+        self.queue.put((None, None, future))
+        future.result(timeout)
+
+    def query(self, sql, params=()):
+        """Run a read on the shared read connection (sees committed rows only)"""
+        with self.read_lock:
+            if self.read_conn is None:
+                self.read_conn = self._connect()
+            return self.read_conn.execute(sql, params).fetchall()
+
+    def close(self, timeout=5.0):
+        """Commit pending writes and stop the writer thread"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join(timeout)
+        with self.read_lock:
+            if self.read_conn is not None:
+                self.read_conn.close()
+                self.read_conn = None
+
+    def _connect(self):
+        # Constant SQL strings hit the connection's prepared statement cache
+        return sqlite3.connect(self.path, timeout=10, check_same_thread=False, cached_statements=64)
+
+    def _run(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        waiting = []  # futures resolved by the next commit
+        first_write = None
+        while True:
+            timeout = None
+            if waiting:
+                timeout = max(0.0, self.commit_interval - (time.time() - first_write))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self._commit(conn, waiting)
+                conn.close()
+                return
+
+            force_commit = False
+            if item is not None:
+                sql, params, future = item
+                if sql is None:
+                    force_commit = True
+                    waiting.append(future)
+                else:
+                    try:
+                        conn.execute(sql, params)
+                        self.rows_written += 1
+                        waiting.append(future)
+                    except Exception as e:
+                        print(f"Error writing to {self.path}: {e}")
+                        future.set_exception(e)
+                if waiting and first_write is None:
+                    first_write = time.time()
+
+            if waiting and (force_commit or len(waiting) >= self.commit_every
+                            or time.time() - first_write >= self.commit_interval):
+                self._commit(conn, waiting)
+                waiting = []
+                first_write = None
+
+    def _commit(self, conn, waiting):
+        try:
+            conn.commit()
+            self.commit_count += 1
+        except Exception as e:
+            print(f"Error committing {self.path}: {e}")
+            for future in waiting:
+                future.set_exception(e)
+            return
+        for future in waiting:
+            future.set_result(None)
+
+
+BAR_RESOLUTIONS = (1, 5, 15)  # minutes
+
+
+class SpreadHistory:
+    """Raw spread ticks and incrementally maintained OHLC bars stored through a PerformanceStore"""
+
+    INSERT_TICK = '''
+        INSERT INTO spread_ticks
+        (timestamp, commodity, current_contract, next_contract,
+         current_price, next_price, price_difference)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    UPSERT_BAR = '''
+        INSERT INTO spread_bars
+        (commodity, resolution, bar_start, open, high, low, close, tick_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT (commodity, resolution, bar_start) DO UPDATE SET
+            high = MAX(high, excluded.high),
+            low = MIN(low, excluded.low),
+            close = excluded.close,
+            tick_count = tick_count + 1
+    '''
+
+    def __init__(self, store, resolutions=BAR_RESOLUTIONS):
+        self.store = store
+        self.resolutions = resolutions
+
+    def create_tables(self):
+        """Create the tick and bar tables (blocks until committed)"""
+        self.store.execute('''
+            CREATE TABLE IF NOT EXISTS spread_ticks (
+                timestamp REAL,
+                commodity TEXT,
+                current_contract TEXT,
+                next_contract TEXT,
+                current_price REAL,
+                next_price REAL,
+                price_difference REAL
+            )
+        ''')
+        self.store.execute('''
+            CREATE INDEX IF NOT EXISTS idx_spread_ticks_commodity_time
+            ON spread_ticks (commodity, timestamp)
+        ''')
+        self.store.execute('''
+            CREATE TABLE IF NOT EXISTS spread_bars (
+                commodity TEXT,
+                resolution INTEGER,
+                bar_start REAL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                tick_count INTEGER,
+                PRIMARY KEY (commodity, resolution, bar_start)
+            )
+        ''', wait=True)
+
+    def record(self, spread):
+        """Queue one SpreadSnapshot: the raw tick plus an upsert into each bar resolution"""
+        value = spread.price_difference
+        self.store.execute(self.INSERT_TICK, (
+            spread.timestamp, spread.commodity, spread.current_contract, spread.next_contract,
+            spread.current_price, spread.next_price, value,
+        ))
+        for minutes in self.resolutions:
+            bar_seconds = minutes * 60
+            bar_start = spread.timestamp - (spread.timestamp % bar_seconds)
+            self.store.execute(self.UPSERT_BAR, (
+                spread.commodity, minutes, bar_start, value, value, value, value,
+            ))
+
+    def ticks(self, commodity, day=None):
+        """Raw ticks for one commodity and day, oldest first"""
+        start, end = self._day_range(day)
+        return self.store.query('''
+            SELECT timestamp, current_contract, next_contract,
+                   current_price, next_price, price_difference
+            FROM spread_ticks
+            WHERE commodity = ? AND timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp
+        ''', (commodity, start, end))
+
+    def bars(self, commodity, resolution=1, day=None):
+        """OHLC bars of the price difference for one commodity, resolution (minutes) and day"""
+        start, end = self._day_range(day)
+        return self.store.query('''
+            SELECT bar_start, open, high, low, close, tick_count
+            FROM spread_bars
+            WHERE commodity = ? AND resolution = ? AND bar_start >= ? AND bar_start < ?
+            ORDER BY bar_start
+        ''', (commodity, resolution, start, end))
+
+    def _day_range(self, day):
+        """Local-midnight epoch bounds of a day"""
+        day = day or date.today()
+        start = datetime.combine(day, datetime.min.time())
+        return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+
+class SignalStateStore:
+    """Latest entry/exit hysteresis state per commodity for one monitor, written through a PerformanceStore"""
+
+    SAVE_STATE = '''
+        INSERT OR REPLACE INTO signal_state
+        (monitor, commodity, current_contract, next_contract, state, armed, changed_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, store, monitor):
+        self.store = store
+        self.monitor = monitor  # e.g. 'main', 'multi', 'daemon': monitors with their own thresholds
+
+    def create_table(self):
+        """Create the signal_state table (blocks until committed)"""
+        self.store.execute('''
+            CREATE TABLE IF NOT EXISTS signal_state (
+                monitor TEXT,
+                commodity TEXT,
+                current_contract TEXT,
+                next_contract TEXT,
+                state TEXT,
+                armed INTEGER,
+                changed_at REAL,
+                updated_at REAL,
+                PRIMARY KEY (monitor, commodity)
+            )
+        ''', wait=True)
+
+    def save(self, commodity, current_contract, next_contract, state, armed, changed_at):
+        """Queue the commodity's state (only worth calling when state or armed changes)"""
+        self.store.execute(self.SAVE_STATE, (
+            self.monitor, commodity, current_contract, next_contract, state, int(bool(armed)),
+            changed_at, time.time(),
+        ))
+
+    def load(self, commodity, current_contract, next_contract):
+        """
+        Saved (state, armed, changed_at) for the commodity, or None if there is
+        none or it was saved for another contract pair (a roll starts FLAT)
+        """
+        rows = self.store.query('''
+            SELECT state, armed, changed_at FROM signal_state
+            WHERE monitor = ? AND commodity = ? AND current_contract = ? AND next_contract = ?
+        ''', (self.monitor, commodity, current_contract, next_contract))
+        if not rows:
+            return None
+        state, armed, changed_at = rows[0]
+        return state, bool(armed), changed_at